@@ -1,88 +1,299 @@
 import pandas as pd
-from fuzzywuzzy import process
-from datetime import datetime
+import numpy as np
+from agents.country_cache import get_country_cache
+from agents.fuzzy_index import edit_distance, get_fuzzy_index, lowercase_processor
+from agents.issue_set import IssueSet
+from agents.logger import AgentLogger
+from agents.phone_numbers import parse_phone_column
+from agents.reference_data import get_reference_data
+from itertools import islice
 import re
+from fuzzywuzzy import fuzz
 
-def log_entry(message, level="INFO"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    return f"[{timestamp}] [{level}] {message}"
+# Compiled so the vectorized string methods use the same re semantics as the
+# scalar reference functions (e.g. Unicode digits and whitespace)
+NON_DIGIT_PATTERN = re.compile(r'[^\d]')
+INVALID_NAME_CHARS_PATTERN = re.compile(r'[^a-zA-Z\s\.\-]')
 
-def correct_issues(df, issues):
+# An unknown email domain is only replaced with a known one that is at least this
+# fuzz.ratio similar, at most DOMAIN_MAX_EDITS edits away and has the same top-level domain
+DOMAIN_MATCH_THRESHOLD = 85
+DOMAIN_MAX_EDITS = 1
+
+def correct_issues(df, issues, log_mode="w", masks=None, log_dir="logs", logger=None, phone_format="national",
+                   fix_email_domains=False):
     """
-    Correction Agent: Fixes detected issues using various correction strategies
+    Correction Agent: Fixes detected issues using various correction strategies.
+    
+    issues is the IssueSet returned by detect_issues, or a dict of row-label
+    lists in the older format.
+    When a ValidityMasks object is passed, every cell that actually changes
+    is recorded in it so later agents only re-check those rows.
+    
+    Each fix is logged per row up to the logger's detail limit and counted
+    after that. Without a shared logger, correction_log.txt in log_dir is
+    written with log_mode.
+    
+    With phone_format 'e164' every phone number is normalized to E.164 with
+    the numbering plan of its row's country instead of being reformatted as
+    XXX-XXX-XXXX; numbers that cannot be parsed are kept as they are.
+    
+    With fix_email_domains, email domains missing from the known domains
+    are replaced with a known one a single typo away (gmial.com -> gmail.com);
+    see correct_email_domains.
     """
-    log_entries = []
-    log_entries.append(log_entry("Correction Agent Started"))
+    own_logger = logger is None
+    if own_logger:
+        logger = AgentLogger("correction", log_dir, mode=log_mode)
+    logger.info("Correction Agent Started")
     corrections_made = 0
     
+    # Issue masks are aligned to row position, so they follow the rows kept below
+    issues = IssueSet.from_mapping(issues, df.index)
+    
     # 1. Remove duplicates
     original_count = len(df)
-    df = df.drop_duplicates(keep='first')
+    duplicated = df.duplicated(keep='first').to_numpy()
+    df = df[~duplicated].copy()
+    issues = issues.take(~duplicated)
     duplicates_removed = original_count - len(df)
     if duplicates_removed > 0:
-        log_entries.append(log_entry(f"Removed {duplicates_removed} duplicate rows"))
+        logger.info(f"Removed {duplicates_removed} duplicate rows")
         corrections_made += duplicates_removed
     
     # 2. Fix malformed emails
-    for idx in issues.get('malformed_emails', []):
-        if idx in df.index:
-            original_email = df.at[idx, 'email']
-            fixed_email = fix_email(original_email)
-            df.at[idx, 'email'] = fixed_email
-            log_entries.append(log_entry(f"Fixed email at row {idx}: '{original_email}' -> '{fixed_email}'"))
-            corrections_made += 1
-    
-    # 3. Fix invalid countries using fuzzy matching
+    rows = issues.mask('malformed_emails')
+    if rows.any():
+        original_emails = df.loc[rows, 'email']
+        fixed_emails = fix_email_column(original_emails)
+        set_column_values(df, rows, 'email', fixed_emails)
+        if masks is not None:
+            masks.mark_changed_values('email', original_emails, fixed_emails)
+        shown = logger.detail_budget("fixed emails", len(fixed_emails))
+        for idx, original_email, fixed_email in islice(zip(original_emails.index, original_emails, fixed_emails), shown):
+            logger.info(f"Fixed email at row {idx}: '{original_email}' -> '{fixed_email}'", event="fixed emails")
+        corrections_made += len(fixed_emails)
+    
+    # 3. Fix misspelled email domains (e.g. gmial.com -> gmail.com) against the known domains, when asked to
+    try:
+        if fix_email_domains:
+            domain_index = load_email_domain_index()
+            original_emails, fixed_emails = correct_email_domains(df['email'], domain_index)
+            if len(fixed_emails) > 0:
+                set_column_values(df, fixed_emails.index, 'email', fixed_emails)
+                if masks is not None:
+                    masks.mark_changed_values('email', original_emails, fixed_emails)
+            shown = logger.detail_budget("fixed email domains", len(fixed_emails))
+            for idx, original_email, fixed_email in islice(zip(fixed_emails.index, original_emails, fixed_emails), shown):
+                logger.info(f"Fixed email domain at row {idx}: '{original_email}' -> '{fixed_email}'", event="fixed email domains")
+            corrections_made += len(fixed_emails)
+    except FileNotFoundError:
+        logger.warning("Warning: email_domains.txt not found - skipping email domain corrections")
+    
+    # 4. Fix invalid countries using fuzzy matching
     try:
-        with open("data/valid_countries.txt") as f:
-            valid_countries = [line.strip() for line in f if line.strip()]
+        # Each distinct value is fuzzy-matched at most once, through the persistent cache;
+        # aliases (e.g. 'Deutschland') resolve to their country
+        cache = load_country_cache()
+        fuzzy_matches_before = cache.misses
+        rows = issues.mask('invalid_countries')
+        original_countries = df.loc[rows, 'country']
+        codes, distinct_countries = pd.factorize(original_countries.astype(str).fillna('nan'))
+        resolutions = [cache.resolve(country) for country in distinct_countries]
+        cache.save()
+        
+        best_matches = np.array([best_match for best_match, _ in resolutions], dtype=object)[codes]
+        confidences = np.array([confidence for _, confidence in resolutions], dtype=int)[codes]
+        accepted = confidences > 70
+        if accepted.any():
+            set_column_values(df, original_countries.index[accepted], 'country', best_matches[accepted])
+            if masks is not None:
+                masks.mark_changed_values('country', original_countries[accepted], df.loc[original_countries.index[accepted], 'country'])
         
-        for idx in issues.get('invalid_countries', []):
-            if idx in df.index:
-                original_country = df.at[idx, 'country']
-                best_match, confidence = process.extractOne(str(original_country), valid_countries)
-                if confidence > 70:
-                    df.at[idx, 'country'] = best_match
-                    log_entries.append(log_entry(f"Fixed country at row {idx}: '{original_country}' -> '{best_match}' (confidence: {confidence}%)"))
-                    corrections_made += 1
-                else:
-                    log_entries.append(log_entry(f"Could not find good match for country '{original_country}' at row {idx} (best: '{best_match}', confidence: {confidence}%)", level="WARNING"))
+        # Only the rows within the detail limit of each event type are formatted
+        fixed_shown = logger.detail_budget("fixed countries", int(accepted.sum()))
+        unmatched_shown = logger.detail_budget("unmatched countries", int((~accepted).sum()), level="WARNING")
+        logged = np.sort(np.concatenate([np.flatnonzero(accepted)[:fixed_shown], np.flatnonzero(~accepted)[:unmatched_shown]]))
+        for position in logged.tolist():
+            idx, original_country = original_countries.index[position], original_countries.iloc[position]
+            best_match, confidence = best_matches[position], confidences[position]
+            if confidence > 70:
+                logger.info(f"Fixed country at row {idx}: '{original_country}' -> '{best_match}' (confidence: {confidence}%)", event="fixed countries")
+            else:
+                logger.warning(f"Could not find good match for country '{original_country}' at row {idx} (best: '{best_match}', confidence: {confidence}%)", event="unmatched countries")
+        corrections_made += int(accepted.sum())
+        logger.info(f"Resolved {len(distinct_countries)} distinct countries with {cache.misses - fuzzy_matches_before} fuzzy matches (rest from cache)")
     except FileNotFoundError:
-        log_entries.append(log_entry("Warning: valid_countries.txt not found - skipping country corrections", level="WARNING"))
-    
-    # 4. Fix invalid phone numbers
-    for idx in issues.get('invalid_phones', []):
-        if idx in df.index:
-            original_phone = df.at[idx, 'phone']
-            fixed_phone = fix_phone_number(original_phone)
-            df.at[idx, 'phone'] = fixed_phone
-            log_entries.append(log_entry(f"Fixed phone at row {idx}: '{original_phone}' -> '{fixed_phone}'"))
-            corrections_made += 1
-    
-    # 5. Fix missing names
-    for idx in issues.get('missing_names', []):
-        if idx in df.index:
-            df.at[idx, 'name'] = 'Unknown'
-            log_entries.append(log_entry(f"Fixed missing name at row {idx}: set to 'Unknown'"))
-            corrections_made += 1
-    
-    # 6. Fix malformed names
-    for idx in issues.get('malformed_names', []):
-        if idx in df.index:
-            original_name = df.at[idx, 'name']
-            fixed_name = fix_name(original_name)
-            df.at[idx, 'name'] = fixed_name
-            log_entries.append(log_entry(f"Fixed name at row {idx}: '{original_name}' -> '{fixed_name}'"))
-            corrections_made += 1
-    
-    log_entries.append(log_entry(f"Total corrections made: {corrections_made}"))
-    log_entries.append(log_entry("Correction Agent Completed"))
-    
-    with open("logs/correction_log.txt", "w") as f:
-        f.write("\n".join(log_entries))
+        logger.warning("Warning: valid_countries.txt not found - skipping country corrections")
+    
+    # 5. Fix invalid phone numbers, or normalize all of them to E.164
+    rows = issues.mask('invalid_phones')
+    if phone_format == 'e164':
+        corrections_made += normalize_phones(df, masks, logger)
+    elif rows.any():
+        original_phones = df.loc[rows, 'phone']
+        fixed_phones = fix_phone_column(original_phones)
+        set_column_values(df, rows, 'phone', fixed_phones)
+        if masks is not None:
+            masks.mark_changed_values('phone', original_phones, fixed_phones)
+        shown = logger.detail_budget("fixed phones", len(fixed_phones))
+        for idx, original_phone, fixed_phone in islice(zip(original_phones.index, original_phones, fixed_phones), shown):
+            logger.info(f"Fixed phone at row {idx}: '{original_phone}' -> '{fixed_phone}'", event="fixed phones")
+        corrections_made += len(fixed_phones)
+    
+    # 6. Fix missing names
+    rows = issues.mask('missing_names')
+    if rows.any():
+        original_names = df.loc[rows, 'name']
+        set_column_values(df, rows, 'name', 'Unknown')
+        if masks is not None:
+            masks.mark_changed_values('name', original_names, df.loc[rows, 'name'])
+        shown = logger.detail_budget("fixed missing names", int(rows.sum()))
+        for idx in df.index[rows][:shown]:
+            logger.info(f"Fixed missing name at row {idx}: set to 'Unknown'", event="fixed missing names")
+        corrections_made += int(rows.sum())
+    
+    # 7. Fix malformed names
+    rows = issues.mask('malformed_names')
+    if rows.any():
+        original_names = df.loc[rows, 'name']
+        fixed_names = fix_name_column(original_names)
+        set_column_values(df, rows, 'name', fixed_names)
+        if masks is not None:
+            masks.mark_changed_values('name', original_names, fixed_names)
+        shown = logger.detail_budget("fixed names", len(fixed_names))
+        for idx, original_name, fixed_name in islice(zip(original_names.index, original_names, fixed_names), shown):
+            logger.info(f"Fixed name at row {idx}: '{original_name}' -> '{fixed_name}'", event="fixed names")
+        corrections_made += len(fixed_names)
+    
+    logger.info(f"Total corrections made: {corrections_made}")
+    if masks is not None:
+        changed_cells = ", ".join(f"{column}: {count}" for column, count in masks.changed_counts().items())
+        logger.info(f"Cells changed: {changed_cells or 'none'}")
+    logger.info("Correction Agent Completed")
+    
+    if own_logger:
+        logger.close()
     
     return df
 
+def normalize_phones(df, masks, logger):
+    """
+    Rewrite the phone column of df in place as E.164, using the corrected
+    countries; returns the number of changed phones
+    """
+    original_phones = df['phone']
+    normalized = parse_phone_column(original_phones, df['country'])['e164']
+    changed = normalized.notna() & (normalized != original_phones.astype(str))
+    fixed_phones = normalized[changed]
+    if len(fixed_phones) > 0:
+        original_phones = original_phones[changed]
+        set_column_values(df, fixed_phones.index, 'phone', fixed_phones)
+        if masks is not None:
+            masks.mark_changed_values('phone', original_phones, fixed_phones)
+        shown = logger.detail_budget("normalized phones", len(fixed_phones))
+        for idx, original_phone, fixed_phone in islice(zip(fixed_phones.index, original_phones, fixed_phones), shown):
+            logger.info(f"Normalized phone at row {idx}: '{original_phone}' -> '{fixed_phone}'", event="normalized phones")
+    
+    # Placeholders such as 000-000-0000 are left alone without a warning
+    unparsed = int((normalized.isna() & df['phone'].astype(str).str.contains('[1-9]', na=False)).sum())
+    if unparsed > 0:
+        logger.warning(f"Warning: {unparsed} phone numbers do not fit the numbering plan of their country - kept as they are")
+    return len(fixed_phones)
+
+def load_email_domain_index():
+    """Fuzzy index of the known email domains, built once per process while the file is unchanged"""
+    return get_fuzzy_index("email_domains", get_reference_data().get('email_domains'),
+                           scorer=fuzz.ratio, processor=lowercase_processor)
+
+def load_country_cache():
+    """Country resolution cache over the valid countries and their aliases, loaded once per process"""
+    reference = get_reference_data()
+    return get_country_cache(reference.get('valid_countries'), aliases=reference.get('country_aliases'))
+
+def set_column_values(df, rows, column, values):
+    """Write corrected values into the selected rows, upcasting numeric columns first"""
+    if not (pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(df[column])):
+        df[column] = df[column].astype(object)
+    df.loc[rows, column] = values
+
+def fix_email_column(emails):
+    """
+    Vectorized fix_email: applies the same corrections to a whole Series of
+    emails at once. fix_email remains the reference implementation.
+    """
+    missing = emails.isna() | (emails == '')
+    
+    # Replace [at] with @ and remove spaces
+    fixed = emails.astype(str).str.replace('[at]', '@', regex=False).str.replace(' ', '', regex=False)
+    
+    # Basic validation: the part after the first @ must contain a dot
+    valid = fixed.str.contains(r'^[^@]*@[^@]*\.', regex=True, na=False)
+    
+    return fixed.where(valid, 'invalid@domain.com').mask(missing, 'unknown@domain.com')
+
+def correct_email_domains(emails, domain_index, threshold=DOMAIN_MATCH_THRESHOLD, max_edits=DOMAIN_MAX_EDITS):
+    """
+    Replace email domains that are not in domain_index with the closest known
+    domain when it is at least threshold similar, at most max_edits edits
+    away and under the same top-level domain. A valid domain that is merely
+    unknown (acme.com, mail.co) is left alone. Returns (original, fixed)
+    Series holding only the changed rows; each distinct unknown domain is
+    looked up once.
+    """
+    emails = emails.astype(str).where(emails.notna())
+    # Regex replace runs in Arrow, unlike splitting, which matters on large columns
+    domains = emails.str.replace(r'^.*@', '', regex=True).str.lower()
+    has_domain = emails.str.contains('@', regex=False, na=False).to_numpy()
+    unknown = has_domain & ~domains.isin(list(domain_index.exact)).to_numpy()
+    
+    codes, distinct_domains = pd.factorize(domains[unknown])
+    replacements = []
+    for domain in distinct_domains:
+        match, score = domain_index.lookup(domain)
+        close = (score >= threshold and match.rsplit('.', 1)[-1] == domain.rsplit('.', 1)[-1]
+                 and edit_distance(domain, match) <= max_edits)
+        replacements.append(match if close else None)
+    fixed_domains = np.array(replacements + [None], dtype=object)[codes]
+    
+    accepted = pd.notna(fixed_domains)
+    rows = emails.index[unknown][accepted]
+    local = emails.loc[rows].str.replace(r'@[^@]*$', '', regex=True)
+    fixed = local.astype(object) + '@' + pd.Series(fixed_domains[accepted], index=rows, dtype=object)
+    return emails.loc[rows], fixed
+
+def fix_phone_column(phones):
+    """
+    Vectorized fix_phone_number: formats a whole Series of phone numbers as
+    XXX-XXX-XXXX. fix_phone_number remains the reference implementation.
+    """
+    missing = phones.isna() | (phones == '')
+    
+    # Remove all non-digit characters
+    digits = phones.astype(str).str.replace(NON_DIGIT_PATTERN, '', regex=True)
+    length = digits.str.len()
+    
+    # Drop the leading 1 of 11-digit numbers, then format as XXX-XXX-XXXX
+    ten_digits = length == 10
+    eleven_digits = (length == 11) & digits.str.startswith('1', na=False)
+    national = digits.where(ten_digits, digits.str[1:])
+    formatted = national.str[:3] + '-' + national.str[3:6] + '-' + national.str[6:]
+    
+    return formatted.where(~missing & (ten_digits | eleven_digits), '000-000-0000')
+
+def fix_name_column(names):
+    """
+    Vectorized fix_name: normalizes spacing, capitalization and characters of
+    a whole Series of names. fix_name remains the reference implementation.
+    """
+    missing = names.isna() | (names == '')
+    
+    # Remove extra spaces, capitalize properly and remove invalid characters
+    fixed = names.astype(str).str.split().str.join(' ').str.title()
+    fixed = fixed.str.replace(INVALID_NAME_CHARS_PATTERN, '', regex=True).str.strip()
+    
+    return fixed.mask(missing | (fixed.str.len() < 2), 'Unknown')
+
 def fix_email(email):
     """Fix common email formatting issues"""
     if pd.isna(email) or email == '':
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from fuzzywuzzy import utils
+from agents.fuzzy_index import get_fuzzy_index, vocabulary_version
+
+DEFAULT_CACHE_PATH = "data/country_cache.json"
+DEFAULT_MAX_ENTRIES = 10000
+
+# Caches already loaded in this process, keyed by file path
+_loaded_caches = {}
+_loaded_caches_lock = threading.Lock()
+
+def normalize_country(value):
+    """
+    Normalize a raw country value the same way process.extractOne does before
+    scoring, so values with the same key always resolve to the same match
+    """
+    return utils.full_process(str(value), force_ascii=True)
+
+class CountryResolutionCache:
+    """
+    Bounded LRU cache of fuzzy country matches, persisted to disk.
+    
+    Entries map a normalized raw country to its (best_match, confidence) and
+    are only valid for the vocabulary version (countries plus aliases) they
+    were computed against. Misses are looked up in a FuzzyIndex, where an
+    alias such as 'Deutschland' resolves to its country. Safe to share
+    between threads, e.g. concurrent web jobs.
+    """
+
+    def __init__(self, valid_countries, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, aliases=None):
+        self.valid_countries = list(valid_countries)
+        self.index = get_fuzzy_index("countries", self.valid_countries, aliases)
+        self.version = self.index.version
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def resolve(self, value):
+        """Return (best_match, confidence) for a raw country value"""
+        key = normalize_country(value)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        
+        best_match, confidence = self.index.lookup(value)
+        with self.lock:
+            self.entries[key] = (best_match, confidence)
+            self.dirty = True
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return best_match, confidence
+
+    def load(self):
+        """Load entries from disk, ignoring files written for another vocabulary"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return self
+        
+        if data.get("version") != self.version:
+            return self
+        
+        for key, best_match, confidence in data.get("entries", [])[-self.max_entries:]:
+            self.entries[key] = (best_match, confidence)
+        return self
+
+    def save(self):
+        """Write the cache to disk if it changed since it was loaded"""
+        with self.lock:
+            if not self.dirty:
+                return
+            
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            data = {
+                "version": self.version,
+                "entries": [[key, best_match, confidence] for key, (best_match, confidence) in self.entries.items()]
+            }
+            temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+
+def get_country_cache(valid_countries, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, aliases=None):
+    """
+    Return the cache for this vocabulary, reusing the one already loaded in
+    this process when the vocabulary has not changed
+    """
+    with _loaded_caches_lock:
+        cache = _loaded_caches.get(path)
+        if cache is None or cache.version != vocabulary_version(valid_countries, aliases):
+            cache = CountryResolutionCache(valid_countries, path, max_entries, aliases).load()
+            _loaded_caches[path] = cache
+        return cache
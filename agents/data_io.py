@@ -0,0 +1,547 @@
+import os
+import re
+import threading
+
+# Supported output formats and their file extensions
+OUTPUT_FORMATS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'feather': '.feather',
+    'sqlite': '.db'
+}
+# Every extension of a SQLite database; these are read and written table by table
+SQLITE_EXTENSIONS = ['.db', '.sqlite', '.sqlite3']
+# Table of a SQLite output when none is named
+DEFAULT_TABLE = "cleaned"
+# Rows per cursor fetch and per executemany call
+SQLITE_BATCH_SIZE = 50000
+
+# Parsers for CSV input and writers for CSV output
+CSV_ENGINES = ['pandas', 'pyarrow']
+# Bytes of a CSV the pyarrow engine infers column types from, as its reader does
+SNIFF_BLOCK_SIZE = 1 << 20
+# Arrow types the pyarrow engine keeps; other inferred types (dates, times) are read as text like read_csv does
+ARROW_KEPT_TYPES = ['is_integer', 'is_floating', 'is_boolean', 'is_string', 'is_large_string']
+# Characters that make the csv module quote a value
+CSV_QUOTED_CHARACTERS = r'[",\r\n]'
+# Extensions pyarrow's input streams decompress
+COMPRESSED_CSV_EXTENSIONS = ['.gz', '.bz2', '.zst', '.lz4', '.br']
+
+# Compression used when none is requested
+DEFAULT_COMPRESSION = {
+    'parquet': 'snappy',
+    'feather': 'lz4'
+}
+
+# Rows per Parquet row group / Feather record batch; small enough that one
+# page of results only decodes a little of the file
+ROW_GROUP_SIZE = 65536
+
+# Open SQLite connections by absolute path, with how many readers and writers use each
+_sqlite_connections = {}
+_sqlite_lock = threading.Lock()
+
+def format_for_path(path):
+    """Output format implied by a file extension, defaulting to CSV"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in SQLITE_EXTENSIONS:
+        return 'sqlite'
+    for output_format, format_extension in OUTPUT_FORMATS.items():
+        if extension == format_extension:
+            return output_format
+    return 'csv'
+
+def resolve_output(output_file, output_format=None):
+    """
+    Return (output_file, output_format). Without an explicit format it is
+    taken from the extension; with one, a known extension of another format
+    is swapped so the file name matches its contents.
+    """
+    if output_format is None:
+        return output_file, format_for_path(output_file)
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {', '.join(OUTPUT_FORMATS)}")
+    
+    base, extension = os.path.splitext(output_file)
+    known = extension.lower() in OUTPUT_FORMATS.values() or extension.lower() in SQLITE_EXTENSIONS
+    if known and format_for_path(output_file) != output_format:
+        output_file = base + OUTPUT_FORMATS[output_format]
+    return output_file, output_format
+
+def open_sqlite(path):
+    """
+    Connection to a SQLite database, shared by every reader and writer of
+    the file in this process; release it with close_sqlite. One connection
+    can insert into a table while its own cursor is still reading another,
+    whereas a second connection would wait for the reader's lock, so
+    streaming from one table into another of the same database needs them
+    to share it.
+    """
+    import sqlite3
+    
+    key = os.path.abspath(path)
+    with _sqlite_lock:
+        entry = _sqlite_connections.get(key)
+        if entry is None:
+            entry = _sqlite_connections[key] = [sqlite3.connect(key, check_same_thread=False), 0]
+        entry[1] += 1
+        return entry[0]
+
+def close_sqlite(path):
+    key = os.path.abspath(path)
+    with _sqlite_lock:
+        entry = _sqlite_connections[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            entry[0].close()
+            del _sqlite_connections[key]
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def is_query(source):
+    """Whether a SQLite source is a SELECT (or WITH) query rather than a table name"""
+    return re.match(r"\s*(select|with)\b", source, re.IGNORECASE) is not None
+
+def source_query(source, columns=None):
+    """SELECT for a table name or query, narrowed to columns when given"""
+    if is_query(source):
+        query = source.strip().rstrip(";")
+        if columns is None:
+            return query
+        relation = f"({query})"
+    else:
+        relation = quote_identifier(source)
+    selected = "*" if columns is None else ", ".join(quote_identifier(column) for column in columns)
+    return f"SELECT {selected} FROM {relation}"
+
+def sqlite_frame(rows, names, dtype=None, start=0):
+    """
+    DataFrame of fetched rows, indexed from start. Columns with a declared
+    dtype are converted from the raw values, so a phone stored as INTEGER
+    becomes '5551234567' rather than going through float when a row is NULL.
+    """
+    import numpy as np
+    import pandas as pd
+    
+    dtype = dtype or {}
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    index = pd.RangeIndex(start, start + len(rows))
+    columns = {}
+    for name, column in zip(names, values):
+        if name in dtype:
+            columns[name] = pd.Series(np.array(column, dtype=object), index=index, dtype=object).astype(dtype[name])
+        else:
+            columns[name] = pd.Series(list(column), index=index, dtype=None if rows else object)
+    return pd.DataFrame(columns, index=index, columns=names)
+
+def sqlite_batches(path, cursor, batch_size=SQLITE_BATCH_SIZE, dtype=None, keep_empty=False):
+    """
+    Yield the rows of an executed cursor as DataFrames of up to batch_size
+    rows, one fetch each, then release the cursor and its connection. With
+    keep_empty, an empty result still yields one empty frame with its columns.
+    """
+    try:
+        names = [description[0] for description in cursor.description]
+        start = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                if start == 0 and keep_empty:
+                    yield sqlite_frame(rows, names, dtype)
+                break
+            yield sqlite_frame(rows, names, dtype, start)
+            start += len(rows)
+    finally:
+        cursor.close()
+        close_sqlite(path)
+
+def read_sqlite(path, source, chunksize=None, columns=None, dtype=None):
+    """
+    Read a table or SELECT query of a SQLite database in cursor batches:
+    a DataFrame, or an iterator of chunksize-row DataFrames when chunksize
+    is given, like read_csv. Only columns are selected when given.
+    """
+    import pandas as pd
+    
+    if not os.path.exists(path):
+        # sqlite3 would create an empty database instead
+        raise FileNotFoundError(path)
+    if not source:
+        raise ValueError("A table or query is required to read a SQLite database")
+    # The query runs here, so an unknown table fails before the first chunk is requested
+    connection = open_sqlite(path)
+    try:
+        cursor = connection.execute(source_query(source, columns))
+    except Exception:
+        close_sqlite(path)
+        raise
+    if chunksize:
+        return sqlite_batches(path, cursor, chunksize, dtype)
+    frames = list(sqlite_batches(path, cursor, SQLITE_BATCH_SIZE, dtype, keep_empty=True))
+    return frames[0] if len(frames) == 1 else pd.concat(frames)
+
+def csv_source(path, memory_map=False):
+    """
+    What pyarrow reads a CSV from: a memory map of the file, or a stream
+    that also decompresses it. Compressed files are never mapped, as in
+    read_csv, since the parser needs the decompressed bytes.
+    """
+    import pyarrow as pa
+    
+    compressed = os.path.splitext(str(path))[1].lower() in COMPRESSED_CSV_EXTENSIONS
+    return pa.memory_map(path) if memory_map and not compressed else pa.input_stream(path)
+
+def arrow_convert_options(path, usecols=None, dtype=None, memory_map=False, streaming=False):
+    """
+    Column types for reading a CSV with pyarrow. Declared text columns stay
+    text, and the other columns keep the type pyarrow infers from the first
+    block unless read_csv would not give it (e.g. a date, which read_csv
+    leaves as text). Columns without values in the first block are left to
+    the whole-file reader, which widens them later; the streaming reader
+    cannot, so they are read as text there.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    
+    column_types = {column: pa.large_string() for column, column_dtype in (dtype or {}).items() if column_dtype == 'str'}
+    options = pv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+    with csv_source(path, memory_map) as source, pv.open_csv(source, convert_options=options,
+                                                            read_options=pv.ReadOptions(block_size=SNIFF_BLOCK_SIZE)) as reader:
+        schema = reader.schema
+    for field in schema:
+        if pa.types.is_null(field.type) and not streaming:
+            continue
+        kept = any(getattr(pa.types, check)(field.type) for check in ARROW_KEPT_TYPES)
+        column_types[field.name] = field.type if kept else pa.large_string()
+    
+    include_columns = None
+    if usecols is not None:
+        missing = [column for column in usecols if column not in schema.names]
+        if missing:
+            raise ValueError(f"Usecols do not match columns, columns expected but not found: {missing}")
+        # In file order, as read_csv returns them
+        include_columns = [column for column in schema.names if column in usecols]
+    return pv.ConvertOptions(column_types=column_types, include_columns=include_columns, strings_can_be_null=True)
+
+def read_csv_missing_values(df, schema):
+    """Missing values as read_csv gives them: NaN in boolean columns with gaps and float NaN columns when a column has no values"""
+    import numpy as np
+    import pyarrow as pa
+    
+    updates = {}
+    for field in schema:
+        if pa.types.is_null(field.type):
+            updates[field.name] = np.full(len(df), np.nan)
+        elif pa.types.is_boolean(field.type) and df[field.name].dtype == object:
+            updates[field.name] = df[field.name].where(df[field.name].notna(), np.nan)
+    return df.assign(**updates) if updates else df
+
+def arrow_frame(table, start=0):
+    """DataFrame of an Arrow table, indexed from start like a read_csv chunk"""
+    import pandas as pd
+    
+    df = table.to_pandas(split_blocks=True)
+    df.index = pd.RangeIndex(start, start + len(df))
+    return read_csv_missing_values(df, table.schema)
+
+def arrow_chunks(path, chunksize, convert_options, memory_map=False):
+    """Regroup the record batches of pyarrow's streaming reader into chunksize-row DataFrames"""
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    
+    with csv_source(path, memory_map) as source, pv.open_csv(source, convert_options=convert_options) as reader:
+        pending = []
+        pending_rows = 0
+        start = 0
+        for batch in reader:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= chunksize:
+                table = pa.Table.from_batches(pending, schema=reader.schema)
+                yield arrow_frame(table.slice(0, chunksize), start)
+                rest = table.slice(chunksize)
+                pending = rest.to_batches()
+                pending_rows = rest.num_rows
+                start += chunksize
+        if pending_rows:
+            yield arrow_frame(pa.Table.from_batches(pending, schema=reader.schema), start)
+
+def read_csv_arrow(path, chunksize=None, usecols=None, dtype=None, memory_map=False):
+    """
+    Read a CSV with pyarrow's multi-threaded parser: a DataFrame, or an
+    iterator of chunksize-row DataFrames, with the dtypes, missing values
+    and index read_csv gives. The whole-file read hands the Arrow buffers to
+    pandas without keeping a second copy; the streaming reader parses on one
+    thread, as pyarrow's open_csv always does.
+    """
+    import pyarrow.csv as pv
+    
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    convert_options = arrow_convert_options(path, usecols, dtype, memory_map, streaming=bool(chunksize))
+    if chunksize:
+        return arrow_chunks(path, chunksize, convert_options, memory_map)
+    with csv_source(path, memory_map) as source:
+        table = pv.read_csv(source, read_options=pv.ReadOptions(use_threads=True), convert_options=convert_options)
+    schema = table.schema
+    # Frees each column's Arrow memory as soon as it is converted
+    return read_csv_missing_values(table.to_pandas(split_blocks=True, self_destruct=True), schema)
+
+def csv_arrow_table(df):
+    """
+    Arrow table that pyarrow's CSV writer turns into the bytes df.to_csv
+    writes: booleans as True/False and floats in repr form (5.0). None when
+    a value would need quoting, a case pandas handles differently, or when
+    a column has a type this does not format.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    if len(df.columns) < 2:
+        # The csv module quotes an empty value when it is a row's only field
+        return None
+    try:
+        table = arrow_table(df)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            if pc.any(pc.match_substring_regex(column, CSV_QUOTED_CHARACTERS)).as_py():
+                return None
+        elif pa.types.is_boolean(field.type):
+            table = table.set_column(i, field.name, pc.if_else(column, "True", "False"))
+        elif pa.types.is_floating(field.type):
+            values = column.to_numpy()
+            text = np.where(np.isnan(values), None, values.astype(str))
+            table = table.set_column(i, field.name, pa.array(text, type=pa.large_string()))
+        elif not (pa.types.is_integer(field.type) or pa.types.is_null(field.type)):
+            return None
+    return table
+
+def write_csv(df, path, header=True, append=False, engine="pandas"):
+    """
+    Write df as CSV. The pyarrow engine formats the columns with Arrow and
+    writes them with its multi-threaded writer; a frame csv_arrow_table
+    cannot take goes through pandas, so both engines write the same bytes.
+    """
+    if engine == "pyarrow":
+        import pyarrow.csv as pv
+        
+        table = csv_arrow_table(df)
+        if table is not None:
+            with open(path, "ab" if append else "wb") as f:
+                if header:
+                    # Column names are quoted like values, only when they need it
+                    f.write(df.head(0).to_csv(index=False).encode("utf-8"))
+                pv.write_csv(table, f, pv.WriteOptions(include_header=False, quoting_style="none"))
+            return
+    df.to_csv(path, index=False, mode="a" if append else "w", header=header)
+
+def sqlite_type(dtype):
+    """Declared type of a column, which only sets the column's affinity in SQLite"""
+    import pandas as pd
+    
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+def arrow_table(df, schema=None):
+    """Convert a DataFrame to an Arrow table, conforming to schema if given"""
+    import pandas as pd
+    import pyarrow as pa
+    from agents.schema import expand_dtypes
+    
+    # Categories and integer widths differ from chunk to chunk, so they are written as plain values
+    df = expand_dtypes(df)
+    
+    # An all-missing column carries no type information (pandas reads it as float)
+    missing = [column for column in df.columns if len(df) > 0 and df[column].isna().all()]
+    if missing:
+        df = df.assign(**{column: pd.Series(None, index=df.index, dtype=object) for column in missing})
+    
+    if schema is not None:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Store untyped columns as text so later chunks with values still fit
+    for i, field in enumerate(table.schema):
+        if pa.types.is_null(field.type):
+            table = table.set_column(i, pa.field(field.name, pa.large_string()), table.column(i).cast(pa.large_string()))
+    return table
+
+def write_table(df, path, output_format=None, compression=None, table=None, csv_engine="pandas"):
+    """Write a whole DataFrame in the given format (into table for SQLite)"""
+    writer = TableWriter(path, output_format, compression, table, csv_engine)
+    writer.write(df)
+    writer.close()
+
+class TableWriter:
+    """
+    Writes DataFrames to one output file chunk by chunk.
+    
+    CSV chunks are appended as text. Parquet and Feather chunks are appended
+    as Arrow record batches with the schema of the first chunk, so column
+    dtypes survive the round trip. SQLite chunks are inserted into table
+    with executemany, one transaction per chunk; the first one replaces the
+    table, so a failed run leaves the previous table or a prefix of the
+    chunks, never a half-written chunk.
+    """
+
+    def __init__(self, path, output_format=None, compression=None, table=None, csv_engine="pandas"):
+        self.path = path
+        self.output_format = output_format or format_for_path(path)
+        self.compression = compression or DEFAULT_COMPRESSION.get(self.output_format)
+        self.table = table or DEFAULT_TABLE
+        self.csv_engine = csv_engine
+        self.schema = None
+        self.writer = None
+        self.connection = None
+        self.rows = 0
+        self.chunks = 0
+
+    def write(self, df):
+        if self.output_format == 'csv':
+            write_csv(df, self.path, header=(self.chunks == 0), append=(self.chunks > 0), engine=self.csv_engine)
+        elif self.output_format == 'sqlite':
+            self._insert(df)
+        else:
+            table = arrow_table(df, self.schema)
+            if self.writer is None:
+                self.schema = table.schema
+                self.writer = self._open_writer(table.schema)
+            if self.output_format == 'parquet':
+                self.writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+            else:
+                self.writer.write_table(table, max_chunksize=ROW_GROUP_SIZE)
+        self.rows += len(df)
+        self.chunks += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.connection is not None:
+            close_sqlite(self.path)
+            self.connection = None
+
+    def _insert(self, df):
+        from agents.schema import expand_dtypes
+        
+        df = expand_dtypes(df)
+        if self.connection is None:
+            self.connection = open_sqlite(self.path)
+        table = quote_identifier(self.table)
+        # Python values with None for missing ones, column by column
+        values = [df[column].to_numpy(dtype=object, na_value=None).tolist() for column in df.columns]
+        insert = f"INSERT INTO {table} VALUES ({', '.join(['?'] * len(df.columns))})"
+        
+        with self.connection:
+            self.connection.execute("BEGIN")
+            if self.chunks == 0:
+                # Columns without any value get no declared type, so later chunks are stored as they come
+                definitions = [quote_identifier(column) + (f" {sqlite_type(df[column].dtype)}" if df[column].notna().any() else "")
+                               for column in df.columns]
+                self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+                self.connection.execute(f"CREATE TABLE {table} ({', '.join(definitions)})")
+            for start in range(0, len(df), SQLITE_BATCH_SIZE):
+                self.connection.executemany(insert, zip(*(column[start:start + SQLITE_BATCH_SIZE] for column in values)))
+
+    def _open_writer(self, schema):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        if self.output_format == 'parquet':
+            return pq.ParquetWriter(self.path, schema, compression=self.compression)
+        options = pa.ipc.IpcWriteOptions(compression=None if self.compression == 'uncompressed' else self.compression)
+        return pa.ipc.new_file(self.path, schema, options=options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_table(path, columns=None, nrows=None, table=None, dtype=None):
+    """
+    Read an output file of any supported format, loading only the requested
+    columns (and only the first nrows rows when given). For SQLite, table
+    is the table or query to read. dtype declares the types of columns of
+    CSV and SQLite files, which do not store them; other columns are inferred.
+    """
+    import pandas as pd
+    
+    output_format = format_for_path(path)
+    if dtype is not None and columns is not None:
+        dtype = {column: column_dtype for column, column_dtype in dtype.items() if column in columns}
+    if output_format == 'csv':
+        return pd.read_csv(path, usecols=columns, nrows=nrows, dtype=dtype)
+    if output_format == 'sqlite':
+        query = source_query(table or DEFAULT_TABLE, columns)
+        if nrows is not None:
+            query = f"SELECT * FROM ({query}) LIMIT {int(nrows)}"
+        return read_sqlite(path, query, dtype=dtype)
+    
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+    
+    if output_format == 'parquet':
+        if nrows is None:
+            return pd.read_parquet(path, columns=columns)
+        parquet_file = pq.ParquetFile(path)
+        batch = next(parquet_file.iter_batches(batch_size=max(nrows, 1), columns=columns), None)
+        if batch is None:
+            return parquet_file.schema_arrow.empty_table().select(columns or parquet_file.schema_arrow.names).to_pandas()
+        return batch.to_pandas().head(nrows)
+    
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    if nrows is not None:
+        table = table.slice(0, nrows)
+    return table.to_pandas()
+
+def table_info(path, table=None):
+    """Return (row_count, columns) of an output file, reading as little as possible"""
+    import pandas as pd
+    
+    output_format = format_for_path(path)
+    if output_format == 'sqlite':
+        columns = list(read_table(path, nrows=0, table=table).columns)
+        connection = open_sqlite(path)
+        try:
+            rows = connection.execute(f"SELECT COUNT(*) FROM ({source_query(table or DEFAULT_TABLE)})").fetchone()[0]
+        finally:
+            close_sqlite(path)
+        return rows, columns
+    if output_format == 'csv':
+        columns = list(pd.read_csv(path, nrows=0).columns)
+        rows = 0
+        for chunk in pd.read_csv(path, usecols=columns[:1], chunksize=1000000):
+            rows += len(chunk)
+        return rows, columns
+    
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    if output_format == 'parquet':
+        metadata = pq.ParquetFile(path).metadata
+        return metadata.num_rows, list(metadata.schema.to_arrow_schema().names)
+    
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        return rows, list(reader.schema.names)
+
+def find_output(base_path):
+    """
+    Most recently written output for a path without extension, e.g.
+    data/cleaned -> data/cleaned.parquet, or None if there is none
+    """
+    candidates = [base_path + extension for extension in OUTPUT_FORMATS.values()]
+    candidates = [path for path in candidates if os.path.exists(path)]
+    if not candidates:
+        return None
+    return max(candidates, key=os.path.getmtime)
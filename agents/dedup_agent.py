@@ -0,0 +1,245 @@
+import pandas as pd
+import numpy as np
+from itertools import combinations, islice
+from fuzzywuzzy import fuzz
+from agents.correction_agent import set_column_values
+from agents.job_options import DEDUP_MODES
+from agents.logger import AgentLogger
+
+# Minimum weighted similarity (0-100) for two rows to be the same record
+DEFAULT_THRESHOLD = 90
+# Neighbours compared after sorting rows by their normalized name
+DEFAULT_WINDOW = 4
+# Blocks sharing a key with more rows than this are too generic to compare (e.g. an office phone)
+DEFAULT_MAX_BLOCK_SIZE = 50
+
+# Weight of each field in the similarity score; fields missing in either row are left out
+DEFAULT_FIELD_WEIGHTS = {
+    'name': 0.4,
+    'email': 0.4,
+    'phone': 0.2
+}
+
+# Values the correction and enrichment agents use for missing data
+PLACEHOLDER_VALUES = {
+    'name': ['Unknown'],
+    'email': ['unknown@domain.com', 'invalid@domain.com'],
+    'phone': ['000-000-0000']
+}
+
+# Plain strings rather than compiled patterns, so pandas can run them on Arrow strings
+NON_LETTER_PATTERN = r'[^a-z\s]'
+NON_DIGIT_PATTERN = r'[^0-9]'
+
+def deduplicate_records(df, mode="flag", threshold=DEFAULT_THRESHOLD, window=DEFAULT_WINDOW,
+                        max_block_size=DEFAULT_MAX_BLOCK_SIZE, weights=None, masks=None,
+                        log_mode="w", log_dir="logs", logger=None):
+    """
+    Deduplication Agent: Finds records that describe the same person without
+    being exact duplicates, e.g. the same name and email under two ids.
+    
+    In 'flag' mode a duplicate_of column holds the id of the first record of
+    each cluster for its other members. In 'merge' mode the other members are
+    dropped and their values fill the missing or placeholder fields of the
+    first record. Filled cells are recorded in masks when one is passed.
+    
+    Without a shared logger, dedup_log.txt in log_dir is written with log_mode.
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode '{mode}', expected one of {', '.join(DEDUP_MODES)}")
+    own_logger = logger is None
+    if own_logger:
+        logger = AgentLogger("dedup", log_dir, mode=log_mode)
+    logger.info("Deduplication Agent Started")
+    
+    # 1. Find clusters of near-duplicate rows
+    representatives, stats = find_near_duplicates(df, threshold, window, max_block_size, weights)
+    logger.info(f"Compared {stats['candidate_pairs']} candidate pairs ({stats['scored_pairs']} fuzzy scored), "
+                f"{stats['matched_pairs']} above threshold {threshold}")
+    for key, size in stats['skipped_blocks']:
+        logger.warning(f"Skipped {key} block of {size} rows (larger than {max_block_size})", event="skipped blocks")
+    
+    positions = np.arange(len(df))
+    duplicates = np.flatnonzero(representatives != positions)
+    logger.info(f"Found {len(duplicates)} near-duplicate rows in {len(np.unique(representatives[duplicates]))} clusters")
+    
+    ids = df['id'].to_numpy() if 'id' in df.columns else df.index.to_numpy()
+    shown = logger.detail_budget("near duplicates", len(duplicates))
+    for position in islice(duplicates.tolist(), shown):
+        logger.info(f"Row {df.index[position]} (id {ids[position]}) duplicates id {ids[representatives[position]]}",
+                    event="near duplicates")
+    
+    # 2. Flag or merge the clusters
+    if mode == "flag":
+        df = df.copy()
+        duplicate_of = np.full(len(df), None, dtype=object)
+        # Stored as text so chunks with and without duplicates share one column type
+        duplicate_of[duplicates] = ids[representatives[duplicates]].astype(str)
+        df['duplicate_of'] = duplicate_of
+        logger.info("Added duplicate_of column")
+    elif len(duplicates) > 0:
+        df = merge_clusters(df, representatives, duplicates, masks)
+        logger.info(f"Merged {len(duplicates)} rows into their cluster's first record")
+    
+    logger.info("Deduplication Agent Completed")
+    
+    if own_logger:
+        logger.close()
+    
+    return df
+
+def find_near_duplicates(df, threshold=DEFAULT_THRESHOLD, window=DEFAULT_WINDOW,
+                         max_block_size=DEFAULT_MAX_BLOCK_SIZE, weights=None):
+    """
+    Cluster rows that are likely the same record.
+    
+    Only rows sharing a blocking key are compared: the normalized email, the
+    phone digits, or a neighbouring position when rows are sorted by their
+    normalized name. Candidate pairs grow roughly linearly with the rows
+    instead of quadratically. Each pair is scored by the weighted similarity
+    of name (fuzzy), email and phone (exact after normalization), and pairs
+    at or above threshold are joined into clusters.
+    
+    Returns (representatives, stats): representatives[i] is the position of
+    the first row of row i's cluster (i itself for unique rows).
+    """
+    weights = {**DEFAULT_FIELD_WEIGHTS, **(weights or {})}
+    keys = {
+        'name': normalize_names(df['name']),
+        'email': normalize_emails(df['email']),
+        'phone': normalize_phones(df['phone'])
+    }
+    stats = {'candidate_pairs': 0, 'scored_pairs': 0, 'matched_pairs': 0, 'skipped_blocks': []}
+    
+    # 1. Blocking: candidate pairs from shared keys and sorted neighbourhoods
+    blocks = [block_pairs(keys[field], max_block_size, field, stats['skipped_blocks']) for field in ['email', 'phone']]
+    blocks.append(sorted_neighbourhood_pairs(keys['name'], window))
+    pairs = np.concatenate(blocks)
+    if len(pairs) > 0:
+        # Each pair once, encoded as one integer so the dedup is a flat sort
+        codes = np.sort(pairs.min(axis=1) * len(df) + pairs.max(axis=1))
+        codes = codes[np.concatenate([[True], codes[1:] != codes[:-1]])]
+        pairs = np.column_stack([codes // len(df), codes % len(df)])
+    stats['candidate_pairs'] = len(pairs)
+    
+    # 2. Scoring: exact fields first, fuzzy names only where the pair can still reach threshold
+    left, right = pairs[:, 0], pairs[:, 1]
+    present = {field: keys[field].notna().to_numpy() for field in keys}
+    values = {field: keys[field].to_numpy(dtype=object) for field in keys}
+    total_weight = np.zeros(len(pairs))
+    score = np.zeros(len(pairs))
+    for field in ['email', 'phone']:
+        both = present[field][left] & present[field][right]
+        total_weight += weights[field] * both
+        score += weights[field] * 100 * (both & (values[field][left] == values[field][right]))
+    
+    names = present['name'][left] & present['name'][right]
+    total_weight += weights['name'] * names
+    best_case = np.divide(score + weights['name'] * 100 * names, total_weight,
+                          out=np.zeros(len(pairs)), where=total_weight > 0)
+    scored = np.flatnonzero(names & (best_case >= threshold))
+    name_values = values['name']
+    similarities = [fuzz.ratio(name_values[a], name_values[b]) for a, b in zip(left[scored].tolist(), right[scored].tolist())]
+    score[scored] += weights['name'] * np.array(similarities, dtype=float)
+    stats['scored_pairs'] = len(scored)
+    
+    similarity = np.divide(score, total_weight, out=np.zeros(len(pairs)), where=total_weight > 0)
+    matched = pairs[similarity >= threshold]
+    stats['matched_pairs'] = len(matched)
+    
+    # 3. Clustering: union-find over the matched pairs, rooted at the lowest position
+    return cluster_pairs(len(df), matched), stats
+
+def normalize_names(names):
+    """Lowercase letters only with the words sorted, so 'Smith, Alice' matches 'alice smith'"""
+    # Names repeat a lot, so each distinct name is normalized once
+    codes, distinct = pd.factorize(names)
+    normalized = pd.Series(distinct, dtype=str).str.lower().str.replace(NON_LETTER_PATTERN, '', regex=True)
+    normalized = normalized.str.split().map(lambda words: ' '.join(sorted(words)), na_action='ignore')
+    normalized = normalized.mask(pd.Series(distinct).isin(PLACEHOLDER_VALUES['name']) | (normalized == ''))
+    return pd.Series(normalized.to_numpy(dtype=object)[codes], index=names.index).mask(codes < 0)
+
+def normalize_emails(emails):
+    """Lowercased emails without spaces and with [at] as @"""
+    normalized = emails.astype(str).str.lower().str.replace(' ', '', regex=False).str.replace('[at]', '@', regex=False)
+    return normalized.mask(emails.isna() | emails.isin(PLACEHOLDER_VALUES['email']) | ~normalized.str.contains('@', regex=False))
+
+def normalize_phones(phones):
+    """Last ten digits of a phone number, ignoring formatting and a country prefix"""
+    digits = phones.astype(str).str.replace(NON_DIGIT_PATTERN, '', regex=True).str[-10:]
+    return digits.mask(phones.isna() | phones.isin(PLACEHOLDER_VALUES['phone']) | (digits.str.len() < 7) | (digits.str.strip('0') == ''))
+
+def block_pairs(keys, max_block_size, key_name, skipped_blocks):
+    """All pairs of row positions sharing a key, skipping blocks larger than max_block_size"""
+    positions = np.flatnonzero(keys.notna().to_numpy())
+    codes, uniques = pd.factorize(keys.iloc[positions])
+    order = np.argsort(codes, kind="stable")
+    sizes = np.bincount(codes, minlength=len(uniques))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    
+    pairs = []
+    for code in np.flatnonzero(sizes > 1).tolist():
+        if sizes[code] > max_block_size:
+            skipped_blocks.append((f"{key_name} '{uniques[code]}'", int(sizes[code])))
+            continue
+        members = positions[order[starts[code]:starts[code] + sizes[code]]]
+        pairs.extend(combinations(members.tolist(), 2))
+    return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+def sorted_neighbourhood_pairs(keys, window):
+    """Pairs of rows within window positions of each other when sorted by key"""
+    positions = np.flatnonzero(keys.notna().to_numpy())
+    order = positions[np.argsort(keys.iloc[positions].to_numpy(dtype=str), kind="stable")]
+    pairs = [np.column_stack([order[:-offset], order[offset:]]) for offset in range(1, min(window, len(order)))]
+    return np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+
+def cluster_pairs(row_count, pairs):
+    """Union-find over matched pairs; returns the lowest position in each row's cluster"""
+    parent = np.arange(row_count)
+
+    def find(position):
+        root = position
+        while parent[root] != root:
+            root = parent[root]
+        while parent[position] != root:
+            parent[position], position = root, parent[position]
+        return root
+    
+    for a, b in pairs.tolist():
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    
+    touched = np.unique(pairs) if len(pairs) > 0 else np.array([], dtype=np.int64)
+    for position in touched.tolist():
+        parent[position] = find(position)
+    return parent
+
+def merge_clusters(df, representatives, duplicates, masks=None):
+    """
+    Drop the duplicate rows, filling missing or placeholder fields of each
+    cluster's first row with the first real value among its members
+    """
+    df = df.copy()
+    for column in ['name', 'email', 'phone', 'country']:
+        if column not in df.columns:
+            continue
+        values = df[column]
+        usable = values.notna() & ~values.isin(PLACEHOLDER_VALUES.get(column, []))
+        donors = duplicates[usable.to_numpy()[duplicates]]
+        needs_value = ~usable.to_numpy()[representatives[donors]]
+        donors = donors[needs_value]
+        if len(donors) == 0:
+            continue
+        
+        # First donor per representative, in row order
+        targets, first = np.unique(representatives[donors], return_index=True)
+        target_labels = df.index[targets]
+        before = df.loc[target_labels, column]
+        set_column_values(df, target_labels, column, values.iloc[donors[first]].to_numpy())
+        if masks is not None:
+            masks.mark_changed_values(column, before, df.loc[target_labels, column])
+    
+    keep = np.ones(len(df), dtype=bool)
+    keep[duplicates] = False
+    return df[keep]
@@ -1,74 +1,93 @@
+import numpy as np
 import pandas as pd
 import re
-from datetime import datetime
+from agents.issue_set import IssueSet
+from agents.logger import AgentLogger
+from agents.reference_data import get_reference_data
+from agents.stage_graph import DEFAULT_THREADS, Node, NodeResult, StageGraph
 
-def log_entry(message, level="INFO"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    return f"[{timestamp}] [{level}] {message}"
-
-def detect_issues(df):
-    """
-    Detection Agent: Scans data for common issues and returns detailed analysis
+def detect_issues(df, log_mode="w", masks=None, log_dir="logs", logger=None, checks=None, threads=DEFAULT_THREADS):
     """
-    log_entries = []
-    log_entries.append(log_entry("Detection Agent Started"))
-    
-    # Initialize issue tracking
-    issues = {
-        'malformed_emails': [],
-        'duplicates': [],
-        'invalid_countries': [],
-        'invalid_phones': [],
-        'missing_names': [],
-        'malformed_names': []
-    }
+    Detection Agent: Scans data for common issues and returns detailed analysis.
     
-    # 1. Email validation
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}$'
-    malformed_emails = df[~df['email'].astype(str).str.match(email_pattern, na=False)]
-    issues['malformed_emails'] = malformed_emails.index.tolist()
-    log_entries.append(log_entry(f"Found {len(malformed_emails)} malformed emails"))
+    Every check is a node of DETECTION_GRAPH; checks limits the work to
+    those issue types (all of them when None) and independent checks run
+    concurrently on up to threads threads.
     
-    # 2. Duplicate detection (considering all columns)
-    duplicates = df[df.duplicated(keep='first')]
-    issues['duplicates'] = duplicates.index.tolist()
-    log_entries.append(log_entry(f"Found {len(duplicates)} duplicate rows"))
+    When a ValidityMasks object is passed, the final email and phone format
+    masks are computed here once and carried through the later agents.
     
-    # 3. Country validation
-    try:
-        with open("data/valid_countries.txt") as f:
-            valid_countries = [line.strip().lower() for line in f if line.strip()]
-        
-        invalid_countries = df[~df['country'].astype(str).str.lower().isin(valid_countries)]
-        issues['invalid_countries'] = invalid_countries.index.tolist()
-        log_entries.append(log_entry(f"Found {len(invalid_countries)} invalid countries"))
-    except FileNotFoundError:
-        log_entries.append(log_entry("Warning: valid_countries.txt not found", level="WARNING"))
+    Log lines go to logger when the caller passes a shared AgentLogger,
+    otherwise to detection_log.txt in log_dir (opened with log_mode).
+    """
+    own_logger = logger is None
+    if own_logger:
+        logger = AgentLogger("detection", log_dir, mode=log_mode)
+    logger.info("Detection Agent Started")
     
-    # 4. Phone number validation
-    phone_pattern = r'^[\\d\\-\\(\\)\\s\\+]+$'
-    invalid_phones = df[~df['phone'].astype(str).str.match(phone_pattern, na=False)]
-    issues['invalid_phones'] = invalid_phones.index.tolist()
-    log_entries.append(log_entry(f"Found {len(invalid_phones)} invalid phone numbers"))
+    # Initialize issue tracking: one boolean mask per issue type
+    issues = IssueSet(df.index)
     
-    # 5. Name validation
-    missing_names = df[df['name'].isna() | (df['name'].astype(str).str.strip() == '')]
-    issues['missing_names'] = missing_names.index.tolist()
-    log_entries.append(log_entry(f"Found {len(missing_names)} missing names"))
+    # 1. Run the checks
+    _, results = DETECTION_GRAPH.run(df, checks, threads=threads, assign=False)
+    for node, result in results:
+        for name, mask in result.outputs.items():
+            issues.set(name, mask)
+        logger.log(result.message, result.level)
     
-    # Check for names that are too short or contain invalid characters
-    name_pattern = r'^[a-zA-Z\\s\\.\\-]+$'
-    malformed_names = df[~df['name'].astype(str).str.match(name_pattern, na=False)]
-    issues['malformed_names'] = malformed_names.index.tolist()
-    log_entries.append(log_entry(f"Found {len(malformed_names)} malformed names"))
+    # 2. Format masks reused by the enrichment and validation agents
+    if masks is not None:
+        masks.compute(df, 'email')
+        masks.compute(df, 'phone')
     
     # Summary
-    total_issues = sum(len(v) for v in issues.values())
-    log_entries.append(log_entry(f"Total issues detected: {total_issues}"))
-    log_entries.append(log_entry("Detection Agent Completed"))
+    total_issues = issues.total()
+    logger.info(f"Total issues detected: {total_issues}")
+    logger.info("Detection Agent Completed")
     
-    # Write detailed log
-    with open("logs/detection_log.txt", "w") as f:
-        f.write("\n".join(log_entries))
+    if own_logger:
+        logger.close()
     
     return issues
+
+def found(name, mask, description):
+    """NodeResult of a check that flagged the rows in mask"""
+    mask = np.asarray(mask, dtype=bool)
+    return NodeResult({name: mask}, f"Found {int(np.count_nonzero(mask))} {description}")
+
+def check_emails(df, context):
+    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}$'
+    return found('malformed_emails', ~df['email'].astype(str).str.match(email_pattern, na=False), "malformed emails")
+
+def check_duplicates(df, context):
+    # Considering all columns
+    return found('duplicates', df.duplicated(keep='first'), "duplicate rows")
+
+def check_countries(df, context):
+    try:
+        valid_countries = get_reference_data().get('valid_countries')
+    except FileNotFoundError:
+        return NodeResult({}, "Warning: valid_countries.txt not found", level="WARNING")
+    return found('invalid_countries', ~df['country'].astype(str).str.lower().isin(valid_countries.lowercase), "invalid countries")
+
+def check_phones(df, context):
+    phone_pattern = r'^[\\d\\-\\(\\)\\s\\+]+$'
+    return found('invalid_phones', ~df['phone'].astype(str).str.match(phone_pattern, na=False), "invalid phone numbers")
+
+def check_missing_names(df, context):
+    return found('missing_names', df['name'].isna() | (df['name'].astype(str).str.strip() == ''), "missing names")
+
+def check_malformed_names(df, context):
+    # Names that contain invalid characters
+    name_pattern = r'^[a-zA-Z\\s\\.\\-]+$'
+    return found('malformed_names', ~df['name'].astype(str).str.match(name_pattern, na=False), "malformed names")
+
+# The checks in the order they are logged; each output is an issue type
+DETECTION_GRAPH = StageGraph([
+    Node('emails', ['email'], ['malformed_emails'], check_emails),
+    Node('duplicates', [], ['duplicates'], check_duplicates),
+    Node('countries', ['country'], ['invalid_countries'], check_countries),
+    Node('phones', ['phone'], ['invalid_phones'], check_phones),
+    Node('missing_names', ['name'], ['missing_names'], check_missing_names),
+    Node('malformed_names', ['name'], ['malformed_names'], check_malformed_names)
+])
@@ -1,85 +1,175 @@
 import pandas as pd
+import numpy as np
 import re
-from datetime import datetime
-import requests
-import json
+from agents.validity_masks import VALIDATION_PATTERNS, match_format, validation_patterns
+from agents.logger import AgentLogger
+from agents.correction_agent import NON_DIGIT_PATTERN
+from agents.phone_numbers import classify_phone_column, extract_digits
+from agents.reference_data import get_reference_data, lookup_values
+from agents.schema import compact_dtypes
+from agents.stage_graph import DEFAULT_THREADS, Node, NodeResult, StageGraph
 
-def log_entry(message, level="INFO"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    return f"[{timestamp}] [{level}] {message}"
+# Points deducted from a row's data_quality_score for each problem found
+QUALITY_SCORE_WEIGHTS = {
+    'missing_name': 30,
+    'missing_email': 25,
+    'missing_phone': 20,
+    'missing_country': 15,
+    'invalid_email': 10,
+    'invalid_phone': 10
+}
 
-def enrich_data(df):
+def enrich_data(df, log_mode="w", quality_weights=None, masks=None, log_dir="logs", logger=None,
+                columns=None, threads=DEFAULT_THREADS, phone_format="national"):
     """
-    Enrichment Agent: Adds new useful attributes and enhances existing data
+    Enrichment Agent: Adds new useful attributes and enhances existing data.
+    
+    Every enrichment is a node of ENRICHMENT_GRAPH with declared input and
+    output columns. columns limits the work to the nodes those output
+    columns need (e.g. ['email_domain', 'country_code'] skips name
+    splitting and quality scoring); all enrichments run when it is None.
+    Independent nodes run concurrently on up to threads threads.
+    
+    quality_weights overrides entries of QUALITY_SCORE_WEIGHTS for the
+    data_quality_score column. When a ValidityMasks object is passed, the
+    email_valid and phone_valid flags are taken from it instead of being
+    re-checked over every row. Low-cardinality columns are returned as
+    Categorical to keep the frame small. logger is an optional shared AgentLogger;
+    without one the agent writes enrichment_log.txt in log_dir itself.
+    
+    phone_format is the format correction left the phones in: 'national'
+    (XXX-XXX-XXXX) or 'e164', where phone_type is classified with the
+    numbering plan of each number (mobile, fixed, ...) and phone_valid and
+    the quality score check for E.164 numbers.
     """
-    log_entries = []
-    log_entries.append(log_entry("Enrichment Agent Started"))
+    own_logger = logger is None
+    if own_logger:
+        logger = AgentLogger("enrichment", log_dir, mode=log_mode)
+    logger.info("Enrichment Agent Started")
     enrichments_made = 0
     
-    # 1. Extract email domain
-    df["email_domain"] = df["email"].str.extract(r'@(\S+)$')
-    log_entries.append(log_entry("Added email_domain column"))
-    enrichments_made += 1
-    
-    # 2. Fill missing phone numbers with placeholder
-    missing_phones = df['phone'].isna().sum()
-    df = df.copy()
-    df['phone'] = df['phone'].fillna('000-000-0000')
-    log_entries.append(log_entry(f"Filled {missing_phones} missing phone numbers"))
-    enrichments_made += missing_phones
-    
-    # 3. Add phone number type classification
-    df['phone_type'] = df['phone'].apply(classify_phone_type)
-    log_entries.append(log_entry("Added phone_type classification"))
-    enrichments_made += 1
-    
-    # 4. Add name length and word count
-    df['name_length'] = df['name'].str.len()
-    df['name_word_count'] = df['name'].str.split().str.len()
-    log_entries.append(log_entry("Added name analysis columns"))
-    enrichments_made += 2
-    
-    # 5. Add country code based on country name
-    df['country_code'] = df['country'].apply(get_country_code)
-    log_entries.append(log_entry("Added country_code column"))
-    enrichments_made += 1
-    
-    # 6. Add data quality score
-    df['data_quality_score'] = df.apply(calculate_quality_score, axis=1)
-    log_entries.append(log_entry("Added data_quality_score column"))
-    enrichments_made += 1
-    
-    # 7. Add email validity flag
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    df['email_valid'] = df['email'].astype(str).str.match(email_pattern, na=False)
-    log_entries.append(log_entry("Added email_valid flag"))
-    enrichments_made += 1
-    
-    # 8. Add phone validity flag
-    phone_pattern = r'^\d{3}-\d{3}-\d{4}$'
-    df['phone_valid'] = df['phone'].astype(str).str.match(phone_pattern, na=False)
-    log_entries.append(log_entry("Added phone_valid flag"))
-    enrichments_made += 1
+    # 1. Run the enrichment nodes the requested columns need
+    original_columns = list(df.columns)
+    context = {'masks': masks, 'quality_weights': quality_weights, 'phone_format': phone_format}
+    df, results = ENRICHMENT_GRAPH.run(df, columns, context, threads)
+    for node, result in results:
+        if result.message:
+            logger.log(result.message, result.level)
+        enrichments_made += result.count
+    computed = {node.name for node, _ in results}
+    skipped = [node.name for node in ENRICHMENT_GRAPH.nodes if node.name not in computed]
+    if skipped:
+        logger.info(f"Skipped enrichments not needed for {', '.join(columns)}: {', '.join(skipped)}")
     
-    # 9. Add full name (first + last) extraction
-    df['first_name'] = df['name'].str.split().str[0]
-    df['last_name'] = df['name'].str.split().str[-1]
-    log_entries.append(log_entry("Added first_name and last_name columns"))
-    enrichments_made += 2
+    # Added columns in declaration order, whichever wave computed them
+    added = [column for column in ENRICHMENT_GRAPH.outputs() if column in df.columns and column not in original_columns]
+    df = df[original_columns + added]
     
-    # 10. Add email provider classification
-    df['email_provider'] = df['email_domain'].apply(classify_email_provider)
-    log_entries.append(log_entry("Added email_provider classification"))
-    enrichments_made += 1
+    # 2. Store low-cardinality and small integer columns compactly
+    df, converted = compact_dtypes(df)
+    logger.info(f"Compacted columns: {', '.join(converted) or 'none'}")
     
-    log_entries.append(log_entry(f"Total enrichments made: {enrichments_made}"))
-    log_entries.append(log_entry("Enrichment Agent Completed"))
+    logger.info(f"Total enrichments made: {enrichments_made}")
+    logger.info("Enrichment Agent Completed")
     
-    with open("logs/enrichment_log.txt", "w") as f:
-        f.write("\n".join(log_entries))
+    if own_logger:
+        logger.close()
     
     return df
 
+def add_email_domain(df, context):
+    domains = df['email'].str.extract(r'@(\S+)$', expand=False)
+    return NodeResult({'email_domain': domains}, "Added email_domain column", 1)
+
+def fill_missing_phones(df, context):
+    """Missing phone numbers get the 000-000-0000 placeholder"""
+    missing_phone_rows = df['phone'].isna()
+    missing_phones = missing_phone_rows.sum()
+    if context['masks'] is not None:
+        context['masks'].mark_changed('phone', df.index[missing_phone_rows.to_numpy()])
+    return NodeResult({'phone': df['phone'].fillna('000-000-0000')}, f"Filled {missing_phones} missing phone numbers", missing_phones)
+
+def add_phone_type(df, context):
+    if context['phone_format'] == 'e164':
+        types = classify_phone_column(df['phone'], df['country'])
+    else:
+        types = classify_phone_types(df['phone'])
+    return NodeResult({'phone_type': types}, "Added phone_type classification", 1)
+
+def add_name_analysis(df, context):
+    columns = {
+        'name_length': df['name'].str.len(),
+        'name_word_count': df['name'].str.split().str.len()
+    }
+    return NodeResult(columns, "Added name analysis columns", 2)
+
+def add_country_code(df, context):
+    codes = lookup_values(df['country'], get_reference_data().get('country_codes'), 'UNKNOWN')
+    return NodeResult({'country_code': codes}, "Added country_code column", 1)
+
+def add_quality_score(df, context):
+    scores = calculate_quality_scores(df, context['quality_weights'], validation_patterns(context['phone_format']))
+    return NodeResult({'data_quality_score': scores}, "Added data_quality_score column", 1)
+
+def add_email_valid(df, context):
+    if context['masks'] is not None:
+        valid = context['masks'].get(df, 'email')
+    else:
+        valid = match_format(df['email'], VALIDATION_PATTERNS['email'])
+    return NodeResult({'email_valid': valid}, "Added email_valid flag", 1)
+
+def add_phone_valid(df, context):
+    if context['masks'] is not None:
+        valid = context['masks'].get(df, 'phone')
+    else:
+        valid = match_format(df['phone'], validation_patterns(context['phone_format'])['phone'])
+    return NodeResult({'phone_valid': valid}, "Added phone_valid flag", 1)
+
+def add_name_parts(df, context):
+    words = df['name'].str.split()
+    columns = {
+        'first_name': words.str[0],
+        'last_name': words.str[-1]
+    }
+    return NodeResult(columns, "Added first_name and last_name columns", 2)
+
+def add_email_provider(df, context):
+    providers = lookup_values(df['email_domain'], get_reference_data().get('email_providers'), 'Other', missing='unknown')
+    return NodeResult({'email_provider': providers}, "Added email_provider classification", 1)
+
+# The enrichments in the order they are logged and their columns are added
+ENRICHMENT_GRAPH = StageGraph([
+    Node('email_domain', ['email'], ['email_domain'], add_email_domain),
+    Node('fill_phones', ['phone'], ['phone'], fill_missing_phones),
+    Node('phone_type', ['phone', 'country'], ['phone_type'], add_phone_type),
+    Node('name_analysis', ['name'], ['name_length', 'name_word_count'], add_name_analysis),
+    Node('country_code', ['country'], ['country_code'], add_country_code),
+    Node('quality_score', ['name', 'email', 'phone', 'country'], ['data_quality_score'], add_quality_score),
+    Node('email_valid', ['email'], ['email_valid'], add_email_valid),
+    Node('phone_valid', ['phone'], ['phone_valid'], add_phone_valid),
+    Node('name_parts', ['name'], ['first_name', 'last_name'], add_name_parts),
+    Node('email_provider', ['email_domain'], ['email_provider'], add_email_provider)
+])
+
+def classify_phone_types(phones):
+    """
+    Vectorized classify_phone_type: classifies a whole Series of national
+    phone numbers at once. classify_phone_type remains the reference
+    implementation.
+    """
+    missing = (phones.isna() | (phones == '')).to_numpy(dtype=bool)
+    text = phones.astype(str).fillna('')
+    digits, _, _ = extract_digits(text)
+    # Digits of other scripts count as digits too, as in re.sub
+    other_scripts = text.str.contains(r'[^\x00-\x7f]').to_numpy(dtype=bool)
+    if other_scripts.any():
+        digits = digits.mask(other_scripts, text[other_scripts].str.replace(NON_DIGIT_PATTERN, '', regex=True))
+    length = digits.str.len().to_numpy(dtype=np.int64)
+    leading_one = digits.str.startswith('1').to_numpy(dtype=bool)
+    types = np.select([missing, length == 10, (length == 11) & leading_one, length == 0],
+                      ['unknown', 'standard', 'international', 'missing'], 'invalid')
+    return pd.Series(types, index=phones.index, dtype=str)
+
 def classify_phone_type(phone):
     """Classify phone number type"""
     if pd.isna(phone) or phone == '':
@@ -99,28 +189,45 @@ def classify_phone_type(phone):
 
 def get_country_code(country):
     """Get country code from country name"""
-    country_mapping = {
-        'united states': 'US',
-        'usa': 'US',
-        'u.s.a': 'US',
-        'us': 'US',
-        'india': 'IN',
-        'canada': 'CA',
-        'mexico': 'MX',
-        'france': 'FR',
-        'germany': 'DE',
-        'brazil': 'BR',
-        'united kingdom': 'UK',
-        'uk': 'UK',
-        'australia': 'AU',
-        'japan': 'JP',
-        'china': 'CN'
-    }
-    
     if pd.isna(country):
         return 'UNKNOWN'
     
-    return country_mapping.get(str(country).lower(), 'UNKNOWN')
+    return get_reference_data().get('country_codes').get(str(country).lower(), 'UNKNOWN')
+
+def calculate_quality_scores(df, weights=None, patterns=None):
+    """
+    Vectorized data quality score for every row: each penalty is a boolean
+    mask, multiplied by its weight and subtracted from 100. With the default
+    weights and patterns this matches calculate_quality_score, the row-wise
+    reference.
+    """
+    weights = {**QUALITY_SCORE_WEIGHTS, **(weights or {})}
+    patterns = patterns or VALIDATION_PATTERNS
+
+    def is_missing(column):
+        return (df[column].isna() | (df[column] == '')).to_numpy()
+
+    def is_invalid(column, pattern):
+        # Matched as object dtype so pandas uses Python's re engine and "$"
+        # and "\d" behave exactly as in re.match (pyarrow-backed strings
+        # would otherwise be matched with RE2)
+        values = df[column]
+        return (values.notna() & ~values.astype(str).astype(object).str.match(pattern, na=False)).to_numpy()
+    
+    penalties = {
+        'missing_name': is_missing('name'),
+        'missing_email': is_missing('email'),
+        'missing_phone': is_missing('phone'),
+        'missing_country': is_missing('country'),
+        'invalid_email': is_invalid('email', patterns['email']),
+        'invalid_phone': is_invalid('phone', patterns['phone'])
+    }
+    
+    score = np.full(len(df), 100, dtype='int64')
+    for penalty, mask in penalties.items():
+        score -= weights[penalty] * mask.astype('int64')
+    
+    return pd.Series(np.maximum(score, 0), index=df.index)
 
 def calculate_quality_score(row):
     """Calculate data quality score for a row"""
@@ -154,14 +261,4 @@ def classify_email_provider(domain):
     
     domain = str(domain).lower()
     
-    providers = {
-        'gmail.com': 'Google',
-        'yahoo.com': 'Yahoo',
-        'outlook.com': 'Microsoft',
-        'hotmail.com': 'Microsoft',
-        'icloud.com': 'Apple',
-        'aol.com': 'AOL',
-        'protonmail.com': 'ProtonMail'
-    }
-    
-    return providers.get(domain, 'Other')
+    return get_reference_data().get('email_providers').get(domain, 'Other')
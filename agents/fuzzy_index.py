@@ -0,0 +1,154 @@
+import hashlib
+import threading
+from functools import partial
+import numpy as np
+from fuzzywuzzy import fuzz, utils
+
+# Entries compared with the scorer per lookup; smaller vocabularies are scanned in full
+DEFAULT_CANDIDATE_LIMIT = 25
+NGRAM_SIZE = 3
+# Grams in more entries than this (e.g. 'com' among email domains) are too
+# common to find candidates by and are skipped unless a key has no other gram
+DEFAULT_MAX_POSTINGS = 1000
+
+# Indexes already built in this process, keyed by name
+_loaded_indexes = {}
+_loaded_indexes_lock = threading.Lock()
+
+def default_processor(value):
+    """
+    The normalization process.extractOne applies before scoring: with the
+    WRatio scorer it replaces its full_process processor by full_process
+    with force_ascii=True, so non-ASCII characters are dropped there too
+    """
+    return utils.full_process(str(value), force_ascii=True)
+
+def lowercase_processor(value):
+    """Lowercase and strip only, for values whose punctuation matters (e.g. domains)"""
+    return str(value).strip().lower()
+
+def ngrams(text, size=NGRAM_SIZE):
+    """
+    Distinct character n-grams of text without its inner spaces (so 'u s a'
+    shares grams with 'usa'), padded so short strings still have some
+    """
+    padded = f" {text.replace(' ', '')} "
+    return {padded[i:i + size] for i in range(max(1, len(padded) - size + 1))}
+
+def edit_distance(a, b):
+    """
+    Optimal string alignment distance: insertions, deletions, substitutions
+    and swaps of adjacent characters each count as one edit ('gmial' -> 'gmail' is 1)
+    """
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+def vocabulary_version(vocabulary, aliases=None):
+    """Fingerprint of a vocabulary and its aliases, used to invalidate stale caches"""
+    text = "\n".join(vocabulary)
+    if aliases:
+        text += "\n" + "\n".join(f"{alias}\t{target}" for alias, target in aliases.items())
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class FuzzyIndex:
+    """
+    Approximate lookup of values in a vocabulary.
+    
+    Vocabulary values are indexed by character trigrams. A lookup only scores
+    the entries sharing the most trigrams with the value. Trigrams found in
+    more than max_postings entries are left out of that ranking, so a lookup
+    reads at most max_postings entries per trigram of the value, however
+    large the vocabulary; a value made only of such trigrams falls back to
+    its least common one. Vocabularies up to candidate_limit entries are
+    scanned in full, which gives exactly the result of process.extractOne
+    with the same scorer and processor (default_processor for WRatio).
+    
+    Aliases (e.g. 'Deutschland' -> 'Germany') only match exactly after
+    processing; scoring them fuzzily would let a foreign name capture an
+    unrelated value (e.g. 'Romania' -> 'Germania').
+    """
+
+    def __init__(self, vocabulary, aliases=None, scorer=None, processor=default_processor,
+                 candidate_limit=DEFAULT_CANDIDATE_LIMIT, max_postings=DEFAULT_MAX_POSTINGS):
+        self.vocabulary = list(vocabulary)
+        self.aliases = dict(aliases or {})
+        self.version = vocabulary_version(self.vocabulary, self.aliases)
+        # WRatio on already processed strings, as process.extractOne does
+        self.scorer = scorer or partial(fuzz.WRatio, full_process=False)
+        self.processor = processor
+        self.candidate_limit = candidate_limit
+        self.max_postings = max(max_postings, candidate_limit)
+        
+        self.keys = [processor(value) for value in self.vocabulary]
+        self.targets = list(self.vocabulary)
+        self.exact = {}
+        for key, target in list(zip(self.keys, self.targets)) + [(processor(alias), target) for alias, target in self.aliases.items()]:
+            self.exact.setdefault(key, target)
+        
+        postings = {}
+        for entry, key in enumerate(self.keys):
+            for gram in ngrams(key):
+                postings.setdefault(gram, []).append(entry)
+        self.postings = {gram: np.array(entries, dtype=np.int64) for gram, entries in postings.items()}
+        self.gram_counts = np.array([len(ngrams(key)) for key in self.keys], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, value):
+        """Return (best_match, score 0-100); exact and alias hits score 100"""
+        key = self.processor(value)
+        if key in self.exact:
+            return self.exact[key], 100
+        if not self.keys:
+            return None, 0
+        if not key:
+            return self.targets[0], 0
+        
+        best_entry, best_score = None, -1
+        for entry in self.candidates(key).tolist():
+            score = self.scorer(key, self.keys[entry])
+            if score > best_score:
+                best_entry, best_score = entry, score
+        if best_entry is None:
+            return self.targets[0], 0
+        return self.targets[best_entry], best_score
+
+    def candidates(self, key):
+        """Entry numbers worth scoring for key, in vocabulary order"""
+        if len(self.keys) <= self.candidate_limit:
+            return np.arange(len(self.keys))
+        
+        grams = ngrams(key)
+        hits = sorted((self.postings[gram] for gram in grams if gram in self.postings), key=len)
+        if not hits:
+            return np.array([], dtype=np.int64)
+        hits = [entries for entries in hits if len(entries) <= self.max_postings] or hits[:1]
+        entries, shared = np.unique(np.concatenate(hits), return_counts=True)
+        
+        # Rank by Dice similarity of the trigram sets and keep the best few
+        dice = 2 * shared / (len(grams) + self.gram_counts[entries])
+        if len(entries) > self.candidate_limit:
+            keep = np.argpartition(-dice, self.candidate_limit - 1)[:self.candidate_limit]
+            entries = np.sort(entries[keep])
+        return entries
+
+def get_fuzzy_index(name, vocabulary, aliases=None, **options):
+    """
+    Return the index for this vocabulary, reusing the one already built in
+    this process under name when the vocabulary has not changed
+    """
+    version = vocabulary_version(vocabulary, aliases)
+    with _loaded_indexes_lock:
+        index = _loaded_indexes.get(name)
+        if index is None or index.version != version:
+            index = FuzzyIndex(vocabulary, aliases, **options)
+            _loaded_indexes[name] = index
+        return index
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from agents.row_hashing import hash_rows
+from agents.results_index import save_array
+
+# Column that identifies a record across runs
+KEY_COLUMN = 'id'
+
+def fingerprint_rows(df, key_column=KEY_COLUMN):
+    """
+    Return (hashes, keys) for every row: a hash of the whole row (id plus
+    content) and a hash of its key column alone
+    """
+    hashes = hash_rows(df)
+    if key_column not in df.columns:
+        return hashes, hashes
+    return hashes, hash_rows(df[[key_column]])
+
+def options_fingerprint(options):
+    """sha256 of the cleaning options behind an output, as a uint8 array"""
+    text = json.dumps(options or {}, sort_keys=True, default=str)
+    return np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest(), dtype=np.uint8)
+
+class RowManifest:
+    """
+    Fingerprints of the input rows behind a cleaned output file.
+    
+    hashes[i] is the fingerprint of the input row that became row i of the
+    output and keys[i] the hash of its id. The manifest is stored next to the
+    output in <file>.manifest/ together with the output's size and mtime, so
+    it is ignored once the output is rewritten by a non-incremental run, and
+    with a fingerprint of options, the cleaning options the output was made
+    with, so it is ignored once they change.
+    """
+
+    def __init__(self, output_file, options=None):
+        self.output_file = output_file
+        self.manifest_dir = f"{output_file}.manifest"
+        self.options = options_fingerprint(options)
+        self.hashes = None
+        self.keys = None
+
+    def load(self):
+        """Load the manifest of the previous run; returns False if there is no usable one"""
+        try:
+            signature = np.load(os.path.join(self.manifest_dir, "source.npy"))
+            hashes = np.load(os.path.join(self.manifest_dir, "hashes.npy"))
+            keys = np.load(os.path.join(self.manifest_dir, "keys.npy"))
+            options = np.load(os.path.join(self.manifest_dir, "options.npy"))
+        except (FileNotFoundError, ValueError):
+            return False
+        if not os.path.exists(self.output_file) or not np.array_equal(signature, self._source_signature()):
+            return False
+        if not np.array_equal(options, self.options):
+            return False
+        self.hashes = hashes
+        self.keys = keys
+        return True
+
+    def save(self, hashes, keys):
+        """Store the fingerprints of the rows just written to the output file"""
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        save_array(os.path.join(self.manifest_dir, "hashes.npy"), hashes)
+        save_array(os.path.join(self.manifest_dir, "keys.npy"), keys)
+        save_array(os.path.join(self.manifest_dir, "options.npy"), self.options)
+        save_array(os.path.join(self.manifest_dir, "source.npy"), self._source_signature())
+        self.hashes = hashes
+        self.keys = keys
+
+    def match(self, hashes, keys):
+        """
+        Compare input fingerprints against the previous run.
+        
+        Returns (previous_positions, changes): previous_positions[i] is the
+        output row that can be reused for input row i, or -1 if the row is
+        inserted or modified and has to be cleaned. changes counts the
+        unchanged, inserted, modified and deleted rows.
+        """
+        previous_positions = np.full(len(hashes), -1, dtype=np.int64)
+        previous_hashes = self.hashes if self.hashes is not None else np.array([], dtype='uint64')
+        previous_keys = self.keys if self.keys is not None else np.array([], dtype='uint64')
+        
+        if len(previous_hashes) > 0 and len(hashes) > 0:
+            sorter = np.argsort(previous_hashes)
+            found = np.minimum(np.searchsorted(previous_hashes, hashes, sorter=sorter), len(sorter) - 1)
+            unchanged = previous_hashes[sorter[found]] == hashes
+            previous_positions[unchanged] = sorter[found[unchanged]]
+        
+        changed = previous_positions < 0
+        modified = np.isin(keys[changed], previous_keys)
+        changes = {
+            'unchanged': int((~changed).sum()),
+            'inserted': int((~modified).sum()),
+            'modified': int(modified.sum()),
+            'deleted': int((~np.isin(np.unique(previous_keys), keys)).sum())
+        }
+        return previous_positions, changes
+
+    def _source_signature(self):
+        stat = os.stat(self.output_file)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+def merge_rows(previous, previous_positions, cleaned):
+    """
+    Build the new output in input order from the reused rows of the previous
+    output and the freshly cleaned rows (in the order of the -1 positions)
+    """
+    reused = previous_positions >= 0
+    if not reused.any():
+        return cleaned.reset_index(drop=True)
+    kept = previous.iloc[previous_positions[reused]]
+    if len(cleaned) == 0:
+        return kept.reset_index(drop=True)
+    
+    merged = pd.concat([kept, cleaned], ignore_index=True)
+    input_order = np.concatenate([np.flatnonzero(reused), np.flatnonzero(~reused)])
+    return merged.iloc[np.argsort(input_order, kind="stable")].reset_index(drop=True)
@@ -0,0 +1,121 @@
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+
+ISSUE_TYPES = [
+    'malformed_emails',
+    'duplicates',
+    'invalid_countries',
+    'invalid_phones',
+    'missing_names',
+    'malformed_names'
+]
+
+class IssueSet(Mapping):
+    """
+    Issues found by the detection agent, stored as one boolean NumPy column per
+    issue type aligned to row position.
+    
+    For existing callers it still reads like the old dict of row-index lists:
+    issues['malformed_emails'] returns the row labels of the flagged rows.
+    """
+
+    def __init__(self, index, issue_types=ISSUE_TYPES):
+        self.index = pd.Index(index)
+        self.masks = {name: np.zeros(len(self.index), dtype=bool) for name in issue_types}
+
+    @classmethod
+    def from_mapping(cls, issues, index):
+        """Build an IssueSet from a dict of row-label lists aligned to index"""
+        if isinstance(issues, IssueSet):
+            if len(issues.index) != len(index):
+                raise ValueError(f"IssueSet has {len(issues.index)} rows but the frame has {len(index)}")
+            return issues
+        issue_set = cls(index, issue_types=list(issues.keys()))
+        for name, rows in issues.items():
+            issue_set.set(name, issue_set.index.isin(rows))
+        return issue_set
+
+    def set(self, name, mask):
+        """Store the flagged rows of an issue type as a boolean mask"""
+        mask = np.asarray(mask, dtype=bool)
+        if len(mask) != len(self.index):
+            raise ValueError(f"Mask for '{name}' has {len(mask)} rows, expected {len(self.index)}")
+        self.masks[name] = mask
+
+    def mask(self, name):
+        """Boolean mask of the rows flagged for an issue type"""
+        if name not in self.masks:
+            return np.zeros(len(self.index), dtype=bool)
+        return self.masks[name]
+
+    def positions(self, name):
+        """Row positions flagged for an issue type"""
+        return np.flatnonzero(self.mask(name))
+
+    def count(self, name):
+        return int(np.count_nonzero(self.mask(name)))
+
+    def counts(self):
+        return {name: self.count(name) for name in self.masks}
+
+    def total(self):
+        return sum(self.counts().values())
+
+    def union(self, *names):
+        """Rows flagged for any of the given issue types (all types if none given)"""
+        result = np.zeros(len(self.index), dtype=bool)
+        for name in names or self.masks:
+            result |= self.mask(name)
+        return result
+
+    def take(self, keep):
+        """New IssueSet restricted to the rows selected by a boolean mask"""
+        keep = np.asarray(keep, dtype=bool)
+        subset = IssueSet(self.index[keep], issue_types=[])
+        subset.masks = {name: mask[keep] for name, mask in self.masks.items()}
+        return subset
+
+    def to_dict(self):
+        """The old dict of row-label lists"""
+        return {name: self[name] for name in self.masks}
+
+    def save(self, path):
+        """Write the issue masks to disk as packed bits (one bit per row and issue type)"""
+        arrays = {f"issue_{name}": np.packbits(mask) for name, mask in self.masks.items()}
+        if isinstance(self.index, pd.RangeIndex):
+            arrays['range_index'] = np.array([self.index.start, self.index.stop, self.index.step])
+        else:
+            arrays['index'] = self.index.to_numpy()
+        np.savez_compressed(path, rows=np.array([len(self.index)]), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Read an IssueSet written by save"""
+        with np.load(path, allow_pickle=True) as data:
+            rows = int(data['rows'][0])
+            if 'range_index' in data:
+                start, stop, step = data['range_index'].tolist()
+                index = pd.RangeIndex(start, stop, step)
+            else:
+                index = pd.Index(data['index'])
+            issue_set = cls(index, issue_types=[])
+            for key in data.files:
+                if key.startswith("issue_"):
+                    issue_set.masks[key[len("issue_"):]] = np.unpackbits(data[key], count=rows).astype(bool)
+        return issue_set
+
+    def __getitem__(self, name):
+        if name not in self.masks:
+            raise KeyError(name)
+        return self.index[self.masks[name]].tolist()
+
+    def __iter__(self):
+        return iter(self.masks)
+
+    def __len__(self):
+        return len(self.masks)
+
+    def __repr__(self):
+        counts = ", ".join(f"{name}={count}" for name, count in self.counts().items())
+        return f"IssueSet(rows={len(self.index)}, {counts})"
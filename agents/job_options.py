@@ -0,0 +1,78 @@
+from agents.data_io import CSV_ENGINES, DEFAULT_TABLE, OUTPUT_FORMATS
+from agents.logger import LOG_FORMATS, LOG_LEVELS
+
+# Choices of options whose agents import pandas, declared here so parsing the
+# options of a job (e.g. in the worker's client) does not import them
+DEDUP_MODES = ['flag', 'merge']
+PHONE_FORMATS = ['national', 'e164']
+
+# main() arguments taken as they are parsed, when given
+VALUE_OPTIONS = ['chunksize', 'workers', 'output_format', 'compression', 'input_table', 'output_table',
+                 'csv_engine', 'usecols', 'enrich_columns', 'phone_format']
+FLAG_OPTIONS = ['memory_map', 'incremental', 'fix_email_domains']
+
+def add_job_arguments(parser):
+    """
+    Add the pipeline options of main() to an argparse parser. Every option
+    defaults to None (or False), so options left out keep the defaults of
+    main() and its agents; job_options turns the parsed values into
+    main() arguments.
+    """
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream the input in chunks of this many rows")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Clean row partitions in this many worker processes")
+    parser.add_argument("--output-format", choices=list(OUTPUT_FORMATS), default=None,
+                        help="Output file format (default: from the output file extension, else csv)")
+    parser.add_argument("--compression", default=None,
+                        help="Compression codec for parquet/feather output, e.g. snappy, zstd, lz4")
+    parser.add_argument("--input-table", default=None,
+                        help="Table or SELECT query to read when the input is a SQLite database")
+    parser.add_argument("--output-table", default=None,
+                        help=f"Table to write when the output is a SQLite database (default: {DEFAULT_TABLE})")
+    parser.add_argument("--csv-engine", choices=CSV_ENGINES, default=None,
+                        help="Parse and write CSV with pandas (default) or with pyarrow's multi-threaded reader and writer")
+    parser.add_argument("--memory-map", action="store_true",
+                        help="Memory-map the input CSV instead of reading it into a buffer")
+    parser.add_argument("--usecols", type=lambda value: value.split(","), default=None,
+                        help="Comma-separated input columns to read (default: all)")
+    parser.add_argument("--enrich-columns", type=lambda value: value.split(","), default=None,
+                        help="Comma-separated enrichment columns to add (default: all), e.g. email_domain,country_code")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only clean rows that are new or changed since the last incremental run")
+    parser.add_argument("--fix-email-domains", action="store_true",
+                        help="Replace unknown email domains a single typo away from a known one, e.g. gmial.com -> gmail.com")
+    parser.add_argument("--near-duplicates", choices=DEDUP_MODES, default=None,
+                        help="Flag or merge records that are near duplicates after correction")
+    parser.add_argument("--duplicate-threshold", type=int, default=None,
+                        help="Similarity (0-100) at which two records count as near duplicates (default: 90)")
+    parser.add_argument("--phone-format", choices=PHONE_FORMATS, default=None,
+                        help="Correct phone numbers to XXX-XXX-XXXX (national, default) or to E.164 by each row's country")
+    parser.add_argument("--sketch-distributions", action="store_true",
+                        help="Report value distributions as bounded top-value and distinct-count sketches")
+    parser.add_argument("--sketch-capacity", type=int, default=None,
+                        help="Top values tracked per distribution in sketch mode (default: 100)")
+    parser.add_argument("--log-level", choices=list(LOG_LEVELS), default=None,
+                        help="Drop agent log lines below this level (default: INFO)")
+    parser.add_argument("--log-format", choices=list(LOG_FORMATS), default=None,
+                        help="Write agent logs as text (default) or JSON lines")
+    parser.add_argument("--log-detail-limit", type=int, default=None,
+                        help="Per-row log lines kept for each event type before they are only counted (default: 100)")
+    return parser
+
+def job_options(args):
+    """The main() arguments of options parsed by add_job_arguments, leaving out those not given"""
+    options = {option: getattr(args, option) for option in VALUE_OPTIONS if getattr(args, option) is not None}
+    options.update({option: True for option in FLAG_OPTIONS if getattr(args, option)})
+    
+    log_options = {key: value for key, value in [('level', args.log_level), ('log_format', args.log_format),
+                                                 ('detail_limit', args.log_detail_limit)] if value is not None}
+    if log_options:
+        options['log_options'] = log_options
+    if args.near_duplicates:
+        options['dedup_options'] = {'mode': args.near_duplicates}
+        if args.duplicate_threshold is not None:
+            options['dedup_options']['threshold'] = args.duplicate_threshold
+    if args.sketch_distributions:
+        options['sketch_options'] = {} if args.sketch_capacity is None else {'capacity': args.sketch_capacity}
+    return options
@@ -0,0 +1,150 @@
+import json
+import os
+import time
+
+LOG_LEVELS = {
+    'DEBUG': 10,
+    'INFO': 20,
+    'WARNING': 30,
+    'ERROR': 40
+}
+
+LOG_FORMATS = {
+    'text': '.txt',
+    'jsonl': '.jsonl'
+}
+
+# Per-row detail lines kept for each event type before they are only counted
+DEFAULT_DETAIL_LIMIT = 100
+# Lines held in memory before they are written out
+DEFAULT_BUFFER_LINES = 1000
+# Size at which a log file is rotated (None keeps a single file)
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+def log_file_name(agent, log_format='text'):
+    """File name of an agent's log, e.g. detection -> detection_log.txt"""
+    return f"{agent}_log{LOG_FORMATS[log_format]}"
+
+def rotated_log_files(path):
+    """The files of a log rotated by AgentLogger, oldest first: <file>.N, ..., <file>.1, <file>"""
+    backups = []
+    while os.path.exists(f"{path}.{len(backups) + 1}"):
+        backups.append(f"{path}.{len(backups) + 1}")
+    return backups[::-1] + [path]
+
+class AgentLogger:
+    """
+    Buffered log writer shared by the agents.
+    
+    Lines below level are dropped before they are formatted. Per-row detail
+    events (e.g. every fixed phone) are written for the first detail_limit
+    occurrences of each event type and only counted after that; close()
+    writes one summary line per event type that hit the limit, at the
+    highest level its events were logged at. Lines are
+    written as text or JSONL in batches of buffer_lines, and the file is
+    rotated to <file>.1, <file>.2, ... once it grows past max_bytes.
+    """
+
+    def __init__(self, agent, log_dir="logs", mode="w", level="INFO", log_format="text",
+                 detail_limit=DEFAULT_DETAIL_LIMIT, buffer_lines=DEFAULT_BUFFER_LINES,
+                 max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT):
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format '{log_format}', expected one of {', '.join(LOG_FORMATS)}")
+        self.agent = agent
+        self.path = os.path.join(log_dir, log_file_name(agent, log_format))
+        self.level = LOG_LEVELS[level]
+        self.log_format = log_format
+        self.detail_limit = detail_limit
+        self.buffer_lines = buffer_lines
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer = []
+        self.event_counts = {}
+        self.event_levels = {}
+        self._timestamp_second = None
+        self._timestamp = None
+        self.file = open(self.path, mode)
+
+    def log(self, message, level="INFO", event=None):
+        if LOG_LEVELS[level] < self.level:
+            return
+        if self.log_format == "jsonl":
+            record = {'time': self.timestamp(), 'level': level, 'agent': self.agent, 'message': message}
+            if event:
+                record['event'] = event
+            self.buffer.append(json.dumps(record))
+        else:
+            self.buffer.append(f"[{self.timestamp()}] [{level}] {message}")
+        if len(self.buffer) >= self.buffer_lines:
+            self.flush()
+
+    def info(self, message, event=None):
+        self.log(message, "INFO", event)
+
+    def warning(self, message, event=None):
+        self.log(message, "WARNING", event)
+
+    def detail_budget(self, event, count, level="INFO"):
+        """
+        Record count occurrences of a per-row event and return how many of
+        them should still be logged in detail (none if level is filtered out)
+        """
+        seen = self.event_counts.get(event, 0)
+        self.event_counts[event] = seen + count
+        if event not in self.event_levels or LOG_LEVELS[level] > LOG_LEVELS[self.event_levels[event]]:
+            self.event_levels[event] = level
+        if LOG_LEVELS[level] < self.level:
+            return 0
+        if self.detail_limit is None:
+            return count
+        return max(0, min(count, self.detail_limit - seen))
+
+    def timestamp(self):
+        """Current time as text, formatted once per second"""
+        now = int(time.time())
+        if now != self._timestamp_second:
+            self._timestamp_second = now
+            self._timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        return self._timestamp
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.file.write("\n".join(self.buffer) + "\n")
+        self.buffer = []
+        self.file.flush()
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        """Move the current file to <file>.1 (shifting older copies) and start a new one"""
+        self.file.close()
+        for number in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{number}"):
+                os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self.file = open(self.path, "w")
+
+    def close(self):
+        """Write a summary of the events that were only counted and close the file"""
+        if self.file.closed:
+            return
+        if self.detail_limit is not None:
+            for event, count in self.event_counts.items():
+                if count > self.detail_limit:
+                    self.log(f"{event}: {count} in total, first {self.detail_limit} logged",
+                             self.event_levels.get(event, "INFO"), event=event)
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def open_agent_loggers(agents, log_dir="logs", **options):
+    """One AgentLogger per agent name, all writing to log_dir with the same options"""
+    return {agent: AgentLogger(agent, log_dir, **options) for agent in agents}
@@ -0,0 +1,198 @@
+import contextvars
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from agents.schema import frame_memory
+
+# Record of the stage the current thread is timing, for the worker threads it starts
+_active_record = contextvars.ContextVar('active_stage_record', default=None)
+
+class PeakRssSampler:
+    """
+    Samples the resident set size of this process from /proc in a background
+    thread and keeps the peak, so each stage gets its own peak instead of
+    the process-wide high-water mark
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current_rss():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (FileNotFoundError, ValueError, OSError):
+            # No /proc (e.g. macOS): fall back to the process-wide peak
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current_rss())
+
+    def __enter__(self):
+        self.peak = self.current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current_rss())
+
+class StageRecord:
+    """
+    Rows going into and out of one run of a stage (rows_out defaults to
+    rows_in) and the size of the frame it produced, if measured
+    """
+
+    def __init__(self, rows_in=None):
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.frame_bytes = 0
+        self.worker_cpu = 0.0
+        self._lock = threading.Lock()
+
+    def add_worker_cpu(self, seconds):
+        """CPU time the stage spent in worker threads (see count_thread_cpu)"""
+        with self._lock:
+            self.worker_cpu += seconds
+
+    def measure(self, df):
+        """Record the in-memory size of the frame this stage produced"""
+        self.frame_bytes = frame_memory(df)
+
+def count_thread_cpu(function):
+    """
+    Wrap function, in the thread timing a stage, so the CPU time it takes
+    in a worker thread is added to that stage. Without a stage being timed
+    function is returned as is.
+    """
+    record = _active_record.get()
+    if record is None:
+        return function
+
+    def counted(*args, **kwargs):
+        start = time.thread_time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record.add_worker_cpu(time.thread_time() - start)
+    return counted
+
+class PipelineMetrics:
+    """
+    Wall time, CPU time, rows in/out, peak RSS and frame size of every
+    pipeline stage.
+    
+    A stage that runs several times (once per chunk or partition) is
+    summed, with the peak RSS being the highest seen. CPU time is that of
+    the calling thread plus the worker threads it runs functions wrapped by
+    count_thread_cpu on (e.g. StageGraph nodes), so concurrent web jobs do
+    not count each other.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        record = StageRecord(rows_in)
+        token = _active_record.set(record)
+        with PeakRssSampler() as sampler:
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            try:
+                yield record
+            finally:
+                wall = time.perf_counter() - wall_start
+                cpu = time.thread_time() - cpu_start + record.worker_cpu
+                _active_record.reset(token)
+        rows_out = record.rows_in if record.rows_out is None else record.rows_out
+        self.add(name, wall, cpu, record.rows_in or 0, rows_out or 0, sampler.peak, frame_bytes=record.frame_bytes)
+
+    def timed_iter(self, name, iterable):
+        """Yield the items of iterable (e.g. CSV chunks), timing each fetch as a run of stage name"""
+        items = iter(iterable)
+        while True:
+            with self.stage(name) as record:
+                item = next(items, None)
+                record.rows_in = 0 if item is None else len(item)
+                if item is not None:
+                    record.measure(item)
+            if item is None:
+                return
+            yield item
+
+    def add(self, name, wall_seconds, cpu_seconds, rows_in, rows_out, peak_rss_bytes, runs=1, frame_bytes=0):
+        stage = self.stages.setdefault(name, {
+            'runs': 0,
+            'wall_seconds': 0.0,
+            'cpu_seconds': 0.0,
+            'rows_in': 0,
+            'rows_out': 0,
+            'peak_rss_bytes': 0,
+            'frame_bytes': 0
+        })
+        stage['runs'] += runs
+        stage['wall_seconds'] += wall_seconds
+        stage['cpu_seconds'] += cpu_seconds
+        stage['rows_in'] += int(rows_in)
+        stage['rows_out'] += int(rows_out)
+        stage['peak_rss_bytes'] = max(stage['peak_rss_bytes'], int(peak_rss_bytes))
+        # Largest frame of any run (chunk or partition) of the stage
+        stage['frame_bytes'] = max(stage['frame_bytes'], int(frame_bytes))
+
+    def merge(self, other):
+        """Add the stages of another PipelineMetrics (e.g. from a worker process)"""
+        for name, stage in other.stages.items():
+            self.add(name, stage['wall_seconds'], stage['cpu_seconds'], stage['rows_in'], stage['rows_out'],
+                     stage['peak_rss_bytes'], runs=stage['runs'], frame_bytes=stage['frame_bytes'])
+
+    def to_dict(self):
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = {
+                'runs': stage['runs'],
+                'wall_seconds': round(stage['wall_seconds'], 4),
+                'cpu_seconds': round(stage['cpu_seconds'], 4),
+                'rows_in': stage['rows_in'],
+                'rows_out': stage['rows_out'],
+                'rows_per_sec': round(stage['rows_in'] / stage['wall_seconds'], 1) if stage['wall_seconds'] > 0 else None,
+                'peak_rss_mb': round(stage['peak_rss_bytes'] / 2**20, 1),
+                'frame_mb': round(stage['frame_bytes'] / 2**20, 1)
+            }
+        return {
+            'stages': stages,
+            'total_wall_seconds': round(sum(stage['wall_seconds'] for stage in self.stages.values()), 4),
+            'total_cpu_seconds': round(sum(stage['cpu_seconds'] for stage in self.stages.values()), 4)
+        }
+
+def render_prometheus(metrics):
+    """
+    Render metrics in the Prometheus text exposition format. metrics is a
+    list of (name, type, help, samples) where samples is a list of
+    (labels dict, value).
+    """
+    lines = []
+    for name, metric_type, help_text, samples in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            if labels:
+                label_text = ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+            else:
+                lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
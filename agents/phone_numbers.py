@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from agents.reference_data import get_reference_data
+
+# Byte -> whether it is an ASCII digit. E.164 numbers only hold ASCII digits,
+# and scanning string buffers with a table is far cheaper than a regex per row
+DIGIT_BYTES = np.zeros(256, dtype=bool)
+DIGIT_BYTES[ord('0'):ord('9') + 1] = True
+# Leading digits read as an integer to test calling codes and trunk prefixes
+HEAD_DIGITS = 6
+# Values of the phone_type column for E.164 numbers
+PHONE_TYPES = ['mobile', 'fixed', 'fixed_or_mobile', 'invalid', 'missing']
+# Digits of an E.164 number without a known calling code
+MIN_E164_DIGITS = 7
+MAX_E164_DIGITS = 15
+
+def extract_digits(text):
+    """
+    ASCII digits of every string of a Series without missing values.
+    
+    Returns the digits as a Series, their count and the first HEAD_DIGITS of
+    them as an int, right-padded with zeros ('0049151' -> 4915, '91' -> 910000).
+    The Arrow buffers of the strings are scanned with DIGIT_BYTES, so the
+    whole column takes a few numpy passes.
+    """
+    import pyarrow as pa
+    
+    array = pa.array(text.to_numpy(dtype=object) if text.dtype == object else text)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    array = array.cast(pa.large_string())
+    _, offset_buffer, data_buffer = array.buffers()
+    offsets = np.frombuffer(offset_buffer, dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    data = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.zeros(0, dtype=np.uint8)
+    data = data[offsets[0]:offsets[-1]]
+    
+    # 1. Keep the digit bytes; digits before each byte give the new string offsets
+    is_digit = DIGIT_BYTES[data]
+    digits_before = np.zeros(len(data) + 1, dtype=np.int64)
+    np.cumsum(is_digit, out=digits_before[1:])
+    digit_offsets = digits_before[offsets - offsets[0]]
+    kept = data[is_digit]
+    length = np.diff(digit_offsets)
+    
+    # 2. The leading digits as an int
+    head = np.zeros(len(length), dtype=np.int64)
+    for position in range(HEAD_DIGITS):
+        present = position < length
+        digit = kept[np.minimum(digit_offsets[:-1] + position, len(kept) - 1)] - ord('0') if len(kept) else 0
+        head = head * 10 + np.where(present, digit, 0)
+    
+    digits = pa.LargeStringArray.from_buffers(len(length), pa.py_buffer(digit_offsets), pa.py_buffer(kept.tobytes()))
+    values = pd.array(digits, dtype=text.dtype) if isinstance(text.dtype, pd.StringDtype) else digits.to_pylist()
+    return pd.Series(values, index=text.index, dtype=text.dtype), length, head
+
+def country_plan_indexes(countries, plans):
+    """Position in plans of the plan of every row's country, -1 when it has none"""
+    country_codes = get_reference_data().get('country_codes')
+    positions = {plan.code: index for index, plan in enumerate(plans)}
+    codes, distinct = pd.factorize(countries)
+    # Each distinct country is looked up once; code -1 (NaN) takes the trailing -1
+    table = [positions.get(country_codes.get(str(country).lower()), -1) for country in distinct]
+    return np.array(table + [-1], dtype=np.int64)[codes]
+
+def parse_phone_column(phones, countries, plans=None):
+    """
+    Parse a whole Series of phone numbers with the numbering rules of their
+    row's country (a Series of country names).
+    
+    Numbers written with + or 00 are international and their calling code
+    picks the plan, preferring the row's country when several countries
+    share one (+1). Other numbers must be a valid national number of the
+    row's country, as dialled at home (with the trunk prefix, e.g. 0) or
+    with the calling code but no +.
+    
+    The rules are evaluated once per plan on integer arrays (each number's
+    length and leading digits), never per row, and the results are
+    assembled with whole-column string operations.
+    
+    Returns a DataFrame with the plan's country code ('' for international
+    numbers of an unknown calling code), the national significant number
+    and the E.164 form; all three are NaN for numbers no rule accepts.
+    """
+    plans = list((get_reference_data().get('phone_plans') if plans is None else plans).values())
+    text = phones.astype(str).fillna('').str.strip()
+    digits, length, head = extract_digits(text)
+
+    def starts_with(prefix, offset=0):
+        """Rows whose digits continue with prefix after the first offset digits"""
+        if not prefix:
+            return np.ones(len(length), dtype=bool)
+        scale = 10 ** (HEAD_DIGITS - offset - len(prefix))
+        rest = head % 10 ** (HEAD_DIGITS - offset) if offset else head
+        return (rest >= int(prefix) * scale) & (rest < (int(prefix) + 1) * scale) & (length >= offset + len(prefix))
+    
+    # 1. International numbers start with + or 00, which the digits then skip
+    plus = text.str.startswith('+').to_numpy(dtype=bool)
+    double_zero = ~plus & starts_with('00')
+    international = plus | double_zero
+    offset = np.where(double_zero, 2, 0)
+    row_plan = country_plan_indexes(countries, plans)
+    
+    # Index into plans of each accepted number (len(plans) for unknown calling codes, -1 if
+    # rejected) and the digits before its national number; placeholders are never numbers
+    plan_index = np.full(len(length), -1, dtype=np.int64)
+    start = np.zeros(len(length), dtype=np.int64)
+    undecided = np.array(digits.str.strip('0').str.len() > 0, dtype=bool)
+
+    def accept(rows, index, prefix_length):
+        plan_index[rows] = index
+        start[rows] = offset[rows] + prefix_length
+        undecided[rows] = False
+    
+    # 2. International numbers, grouped by calling code
+    for dial_code in dict.fromkeys(plan.dial_code for plan in plans):
+        rows = international & undecided & np.where(double_zero, starts_with(dial_code, 2), starts_with(dial_code))
+        if not rows.any():
+            continue
+        national_length = length - offset - len(dial_code)
+        for own_country in [True, False]:
+            for index, plan in enumerate(plans):
+                if plan.dial_code != dial_code:
+                    continue
+                fits = rows & undecided & (national_length >= plan.min_length) & (national_length <= plan.max_length)
+                if own_country:
+                    fits &= row_plan == index
+                accept(fits, index, len(dial_code))
+    
+    # 3. National numbers of the row's country; the trunk prefix is tried first since
+    # national numbers do not start with it (030 is 30 in Germany, not 030)
+    for index, plan in enumerate(plans):
+        rows = ~international & undecided & (row_plan == index)
+        if not rows.any():
+            continue
+        for prefix in dict.fromkeys([plan.trunk_prefix, '', plan.dial_code]):
+            national_length = length - len(prefix)
+            fits = rows & undecided & (national_length >= plan.min_length) & (national_length <= plan.max_length)
+            accept(fits & starts_with(prefix), index, len(prefix))
+    
+    # 4. International numbers of other countries are kept if they look like E.164
+    e164_length = length - offset
+    other = international & undecided & (e164_length >= MIN_E164_DIGITS) & (e164_length <= MAX_E164_DIGITS)
+    accept(other & ~np.where(double_zero, starts_with('0', 2), starts_with('0')), len(plans), 0)
+    
+    # 5. Assemble the national and E.164 numbers: one slice per distinct start, one take of the prefixes
+    accepted = plan_index >= 0
+    national = pd.Series(np.nan, index=phones.index, dtype=digits.dtype)
+    for prefix_length in np.unique(start[accepted]).tolist():
+        rows = accepted & (start == prefix_length)
+        national = national.mask(rows, digits.str[prefix_length:])
+    # plan_index -1 takes the trailing NaN of each table
+    table = pd.Series([plan.code for plan in plans] + ['', np.nan], dtype=digits.dtype)
+    prefixes = pd.Series(["+" + plan.dial_code for plan in plans] + ["+", np.nan], dtype=digits.dtype)
+    codes = table.take(plan_index).set_axis(phones.index)
+    e164 = prefixes.take(plan_index).set_axis(phones.index) + national
+    return pd.DataFrame({'country_code': codes, 'national': national, 'e164': e164})
+
+def classify_phone_column(phones, countries, plans=None):
+    """
+    Phone type of every number, one of PHONE_TYPES: 'mobile' or 'fixed'
+    by the mobile pattern of its plan, 'fixed_or_mobile' where the plan
+    cannot tell them apart (e.g. +1) or the calling code is unknown,
+    'missing' for empty or all-zero placeholders and 'invalid' for numbers
+    parse_phone_column rejects
+    """
+    plans = get_reference_data().get('phone_plans') if plans is None else plans
+    parsed = parse_phone_column(phones, countries, plans)
+    types = np.where(parsed['e164'].notna().to_numpy(), PHONE_TYPES.index('fixed_or_mobile'), PHONE_TYPES.index('invalid'))
+    types[~phones.astype(str).str.contains('[1-9]', na=False).to_numpy(dtype=bool)] = PHONE_TYPES.index('missing')
+    
+    for plan in plans.values():
+        if not plan.mobile_pattern:
+            continue
+        positions = np.flatnonzero((parsed['country_code'] == plan.code).to_numpy(dtype=bool))
+        if len(positions) == 0:
+            continue
+        mobile = parsed['national'].iloc[positions].str.fullmatch(plan.mobile_pattern).to_numpy(dtype=bool)
+        types[positions] = np.where(mobile, PHONE_TYPES.index('mobile'), PHONE_TYPES.index('fixed'))
+    return pd.Series(PHONE_TYPES, dtype=str).take(types).set_axis(phones.index)
@@ -0,0 +1,154 @@
+import csv
+import os
+import threading
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+DEFAULT_DATA_DIR = "data"
+
+# Registries already created in this process, keyed by data directory
+_registries = {}
+_registries_lock = threading.Lock()
+
+class Vocabulary:
+    """
+    Entries of a one-per-line file in file order, plus their lowercase forms
+    as a frozenset for membership tests
+    """
+
+    def __init__(self, entries):
+        self.entries = tuple(entries)
+        self.lowercase = frozenset(entry.lower() for entry in self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, value):
+        return str(value).lower() in self.lowercase
+
+def read_vocabulary(path):
+    """One entry per non-empty line"""
+    with open(path, encoding="utf-8") as f:
+        return Vocabulary(line.strip() for line in f if line.strip())
+
+def read_mapping(path, key_column, value_column, lowercase_keys=False):
+    """key_column -> value_column of every CSV row with a key"""
+    mapping = {}
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            key = row[key_column].strip()
+            if key:
+                mapping[key.lower() if lowercase_keys else key] = row[value_column].strip()
+    return mapping
+
+# Numbering rules of a country: its calling code, the lengths of its national
+# (significant) numbers, the trunk prefix dialled before them at home and a
+# regex matching its mobile numbers ('' when mobiles cannot be told apart)
+PhonePlan = namedtuple('PhonePlan', ['code', 'dial_code', 'min_length', 'max_length', 'trunk_prefix', 'mobile_pattern'])
+
+def read_phone_plans(path):
+    """Country code -> PhonePlan of every CSV row"""
+    plans = {}
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            code = row['code'].strip().upper()
+            if code:
+                plans[code] = PhonePlan(code, row['dial_code'].strip(), int(row['min_length']), int(row['max_length']),
+                                        row['trunk_prefix'].strip(), row['mobile_pattern'].strip())
+    return plans
+
+# name: (file in the data directory, parser, default when the file is missing
+# or None if the file is required)
+REFERENCE_FILES = {
+    'valid_countries': ("valid_countries.txt", read_vocabulary, None),
+    'email_domains': ("email_domains.txt", read_vocabulary, None),
+    'country_aliases': ("country_aliases.csv", lambda path: read_mapping(path, 'alias', 'target'), dict),
+    'country_codes': ("country_codes.csv", lambda path: read_mapping(path, 'country', 'code', lowercase_keys=True), dict),
+    'email_providers': ("email_providers.csv", lambda path: read_mapping(path, 'domain', 'provider', lowercase_keys=True), dict),
+    'phone_plans': ("phone_plans.csv", read_phone_plans, dict)
+}
+
+class ReferenceData:
+    """
+    Registry of the reference files every agent looks values up in.
+    
+    Each file is parsed once into a lookup structure (a Vocabulary or a
+    dict) and shared by every caller in the process. get() compares the
+    file's size and mtime on each call and re-parses it when it changed, so
+    a long-running web server or worker picks up edits without a restart.
+    Parsed values are shared, not copied: treat them as read-only.
+    
+    Worker processes started by fork inherit everything loaded beforehand,
+    so load_all() before creating a pool avoids re-reading the files in
+    every worker.
+    """
+
+    def __init__(self, data_dir=DEFAULT_DATA_DIR):
+        self.data_dir = data_dir
+        self.loaded = {}
+        self.reloads = 0
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.data_dir, REFERENCE_FILES[name][0])
+
+    def get(self, name):
+        """
+        Parsed contents of a reference file. Raises FileNotFoundError for a
+        missing required file; optional files default to an empty mapping.
+        """
+        _, parse, default = REFERENCE_FILES[name]
+        path = self.path(name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if default is None:
+                raise
+            return default()
+        
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self.loaded.get(name)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        
+        value = parse(path)
+        with self._lock:
+            if name in self.loaded:
+                self.reloads += 1
+            self.loaded[name] = (signature, value)
+        return value
+
+    def load_all(self):
+        """Parse every reference file that exists, e.g. to warm up a server"""
+        for name in REFERENCE_FILES:
+            try:
+                self.get(name)
+            except FileNotFoundError:
+                pass
+        return self
+
+def get_reference_data(data_dir=DEFAULT_DATA_DIR):
+    """Return the process-wide registry for data_dir"""
+    with _registries_lock:
+        registry = _registries.get(data_dir)
+        if registry is None:
+            registry = ReferenceData(data_dir)
+            _registries[data_dir] = registry
+        return registry
+
+def lookup_values(values, mapping, default, missing=None):
+    """
+    Look up the lowercase form of every value in mapping, giving default for
+    unknown values and missing (default if None) for NaN. Each distinct
+    value is looked up once and the results are spread with an array take.
+    """
+    codes, distinct = pd.factorize(values)
+    results = [mapping.get(str(value).lower(), default) for value in distinct]
+    results.append(default if missing is None else missing)
+    # Code -1 (NaN) takes the last entry
+    return pd.Series(np.array(results, dtype=object)[codes], index=values.index, dtype=str)
@@ -0,0 +1,314 @@
+import hashlib
+import io
+import mmap
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from agents.data_io import format_for_path, read_table
+from agents.schema import OUTPUT_DTYPES
+
+# Bytes scanned at a time while building the row index
+SCAN_BLOCK_SIZE = 64 * 1024 * 1024
+# Rows parsed at a time while finding the dtypes of a CSV file's columns
+DTYPE_SCAN_ROWS = 1000000
+MAX_PAGE_SIZE = 1000
+# Filter masks kept in the index directory; the least recently used ones are removed beyond this
+MAX_CACHED_FILTERS = 64
+
+def find_row_boundaries(path, block_size=SCAN_BLOCK_SIZE):
+    """
+    Return the byte offset where every CSV record ends (one past its newline).
+    
+    Newlines inside quoted fields are skipped by tracking the parity of the
+    quote characters seen so far, so records with embedded line breaks stay
+    whole. The file is scanned in blocks to keep memory bounded.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return np.array([], dtype=np.int64)
+    
+    boundaries = []
+    quotes_seen = 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for start in range(0, size, block_size):
+            block = np.frombuffer(data, dtype=np.uint8, count=min(block_size, size - start), offset=start)
+            quotes = np.flatnonzero(block == ord('"'))
+            newlines = np.flatnonzero(block == ord('\n'))
+            outside_quotes = (quotes_seen + np.searchsorted(quotes, newlines)) % 2 == 0
+            boundaries.append(newlines[outside_quotes] + start + 1)
+            quotes_seen += len(quotes)
+            del block
+    
+    boundaries = np.concatenate(boundaries).astype(np.int64)
+    if len(boundaries) == 0 or boundaries[-1] != size:
+        boundaries = np.append(boundaries, size)
+    return boundaries
+
+def csv_column_dtypes(path, chunksize=DTYPE_SCAN_ROWS):
+    """
+    Dtype of every column of a CSV file as read_csv infers it for the whole
+    file, found chunk by chunk to keep memory bounded. Declared text columns
+    (OUTPUT_DTYPES) stay text. Pages parsed with these dtypes match the file
+    whatever rows they hold.
+    """
+    kinds = {}
+    missing = {}
+    for chunk in pd.read_csv(path, dtype=OUTPUT_DTYPES, chunksize=chunksize):
+        for column in chunk.columns:
+            values = chunk[column]
+            kinds.setdefault(column, set())
+            missing[column] = missing.get(column, False) or bool(values.isna().any())
+            # A chunk without values says nothing about the column's type
+            if not values.notna().any():
+                continue
+            kind = 'T' if isinstance(values.dtype, pd.StringDtype) else values.dtype.kind
+            # Booleans with gaps are read as objects
+            if kind == 'O' and pd.api.types.infer_dtype(values, skipna=True) == 'boolean':
+                kind = 'b'
+            kinds[column].add(kind)
+    
+    dtypes = {}
+    for column, found in kinds.items():
+        if column in OUTPUT_DTYPES:
+            dtypes[column] = OUTPUT_DTYPES[column]
+        elif not found or found <= {'i', 'f'}:
+            dtypes[column] = 'int64' if found == {'i'} and not missing[column] else 'float64'
+        elif found == {'b'}:
+            dtypes[column] = 'boolean' if missing[column] else 'bool'
+        else:
+            dtypes[column] = 'str'
+    return dtypes
+
+def save_array(path, array):
+    """Write a .npy file atomically, so concurrent readers never see a partial file"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(temp_path, path)
+
+def row_group_starts(path, output_format):
+    """First row of every Parquet row group / Feather record batch, plus the row count"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    if output_format == 'parquet':
+        metadata = pq.ParquetFile(path).metadata
+        sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    else:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            sizes = [reader.get_batch(i).num_rows for i in range(reader.num_record_batches)]
+    return np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)]).astype(np.int64)
+
+class ResultsIndex:
+    """
+    Random access to the rows of a cleaned output file.
+    
+    For CSV, offsets[i] is the byte offset where data row i starts and
+    offsets[-1] is the end of the file, so any page is one slice of the file.
+    For Parquet and Feather, offsets[i] is the first row of row group i, so a
+    page only decodes the row groups it touches. CSV pages are parsed with
+    the column dtypes of the whole file, so a column's values have the same
+    type on every page. The index, the dtypes and the sort orders and filter
+    matches computed from them are stored next to the file in <file>.index/
+    and rebuilt when the file changes. Only the max_filters most recently
+    used filter matches are kept, since every filter text adds one.
+    """
+
+    def __init__(self, path, max_filters=MAX_CACHED_FILTERS):
+        self.path = path
+        self.max_filters = max_filters
+        self.output_format = format_for_path(path)
+        self.index_dir = f"{path}.index"
+        self.offsets = None
+        self.header = None
+        self.columns = None
+        self.dtypes = None
+
+    @property
+    def total_rows(self):
+        if self.output_format != 'csv':
+            return int(self.offsets[-1])
+        return len(self.offsets) - 1
+
+    def build(self):
+        """Scan the file once and write the row offsets and, for CSV, the column dtypes"""
+        dtypes = np.empty((0, 2), dtype=str)
+        if self.output_format != 'csv':
+            offsets = row_group_starts(self.path, self.output_format)
+        else:
+            boundaries = find_row_boundaries(self.path)
+            offsets = boundaries if len(boundaries) > 0 else np.array([0], dtype=np.int64)
+            if len(offsets) > 1:
+                dtypes = np.array(list(csv_column_dtypes(self.path).items()), dtype=str).reshape(-1, 2)
+        
+        os.makedirs(self.index_dir, exist_ok=True)
+        for name in os.listdir(self.index_dir):
+            os.remove(os.path.join(self.index_dir, name))
+        save_array(os.path.join(self.index_dir, "offsets.npy"), offsets)
+        save_array(os.path.join(self.index_dir, "dtypes.npy"), dtypes)
+        save_array(os.path.join(self.index_dir, "source.npy"), self._source_signature())
+        return self._load_offsets(offsets, dtypes)
+
+    def load(self):
+        """Load the row offsets, building them if missing or out of date"""
+        try:
+            signature = np.load(os.path.join(self.index_dir, "source.npy"))
+            offsets = np.load(os.path.join(self.index_dir, "offsets.npy"))
+            dtypes = np.load(os.path.join(self.index_dir, "dtypes.npy"))
+        except (FileNotFoundError, ValueError):
+            return self.build()
+        if not np.array_equal(signature, self._source_signature()):
+            return self.build()
+        return self._load_offsets(offsets, dtypes)
+
+    def page(self, offset=0, limit=20, sort=None, filter=None):
+        """
+        Return (rows, matched_rows) for one page of results.
+        
+        sort is a column name, prefixed with '-' for descending order.
+        filter is 'column:text' and keeps rows whose column contains text
+        (case-insensitive).
+        """
+        if self.offsets is None:
+            self.load()
+        offset = max(0, int(offset))
+        limit = min(max(0, int(limit)), MAX_PAGE_SIZE)
+        
+        if not sort and not filter:
+            end = min(offset + limit, self.total_rows)
+            positions = np.arange(offset, max(offset, end))
+            return self.read_rows(positions), self.total_rows
+        
+        order = self.sort_order(sort) if sort else np.arange(self.total_rows)
+        if filter:
+            matches = self.filter_mask(filter)
+            order = order[matches[order]]
+        return self.read_rows(order[offset:offset + limit]), len(order)
+
+    def read_rows(self, positions):
+        """Parse the rows at the given positions into a DataFrame"""
+        if len(positions) == 0:
+            return pd.DataFrame(columns=self.columns)
+        if self.output_format != 'csv':
+            df = self._read_columnar_rows(positions)
+            return df.astype(object).where(df.notna(), None)
+        
+        with open(self.path, "rb") as f:
+            if np.all(np.diff(positions) == 1):
+                # Contiguous page: a single read
+                f.seek(self.offsets[positions[0]])
+                body = f.read(self.offsets[positions[-1] + 1] - self.offsets[positions[0]])
+            else:
+                parts = []
+                for position in positions.tolist():
+                    f.seek(self.offsets[position])
+                    parts.append(self._terminated(f.read(self.offsets[position + 1] - self.offsets[position])))
+                body = b"".join(parts)
+        
+        df = pd.read_csv(io.BytesIO(self._terminated(self.header) + body), dtype=self.dtypes)
+        return df.astype(object).where(df.notna(), None)
+
+    def sort_order(self, sort):
+        """Row positions in sort order, computed once per column and direction"""
+        descending = sort.startswith("-")
+        column = sort.lstrip("-")
+        if column not in self.columns:
+            raise ValueError(f"Unknown sort column '{column}'")
+        
+        path = os.path.join(self.index_dir, f"sort-{self._key(column)}-{'desc' if descending else 'asc'}.npy")
+        if os.path.exists(path):
+            return np.load(path)
+        
+        values = read_table(self.path, columns=[column], dtype=self.dtypes)[column]
+        order = values.sort_values(ascending=not descending, kind="stable", na_position="last").index.to_numpy()
+        save_array(path, order)
+        return order
+
+    def filter_mask(self, filter):
+        """Boolean mask of the rows matching 'column:text', cached on disk"""
+        column, _, text = filter.partition(":")
+        if column not in self.columns:
+            raise ValueError(f"Unknown filter column '{column}'")
+        
+        path = os.path.join(self.index_dir, f"filter-{self._key(filter)}.npy")
+        try:
+            packed = np.load(path)
+            self._touch(path)
+            return np.unpackbits(packed, count=self.total_rows).astype(bool)
+        except FileNotFoundError:
+            pass
+        
+        values = read_table(self.path, columns=[column], dtype=self.dtypes)[column].astype(str)
+        matches = values.str.contains(text, case=False, regex=False, na=False).to_numpy()
+        save_array(path, np.packbits(matches))
+        self._touch(path)
+        self._evict_filters()
+        return matches
+
+    @staticmethod
+    def _touch(path):
+        # The modification time orders the masks by last use for eviction; set from
+        # time_ns since file timestamps only advance with the coarse kernel clock
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    def _evict_filters(self):
+        """Remove the least recently used filter masks beyond max_filters"""
+        masks = []
+        for entry in os.scandir(self.index_dir):
+            if entry.name.startswith("filter-") and entry.name.endswith(".npy"):
+                try:
+                    masks.append((entry.stat().st_mtime_ns, entry.path))
+                except FileNotFoundError:
+                    pass
+        for _, path in sorted(masks)[:max(0, len(masks) - self.max_filters)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Evicted by another request at the same time
+                pass
+
+    def _read_columnar_rows(self, positions):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        groups = np.unique(np.searchsorted(self.offsets, positions, side="right") - 1)
+        if self.output_format == 'parquet':
+            table = pq.ParquetFile(self.path).read_row_groups(groups.tolist())
+        else:
+            with pa.memory_map(self.path) as source:
+                reader = pa.ipc.open_file(source)
+                table = pa.Table.from_batches([reader.get_batch(group) for group in groups.tolist()], reader.schema)
+        
+        # Map each file position to its row within the row groups that were read
+        group_sizes = self.offsets[groups + 1] - self.offsets[groups]
+        local_starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]])
+        group_of_row = np.searchsorted(self.offsets, positions, side="right") - 1
+        local = local_starts[np.searchsorted(groups, group_of_row)] + positions - self.offsets[group_of_row]
+        return table.take(pa.array(local)).to_pandas()
+
+    def _load_offsets(self, offsets, dtypes):
+        self.offsets = offsets
+        self.dtypes = {column: dtype for column, dtype in dtypes.tolist()} or None
+        if self.output_format != 'csv':
+            self.columns = list(read_table(self.path, nrows=0).columns)
+            return self
+        with open(self.path, "rb") as f:
+            self.header = f.read(offsets[0])
+        self.columns = list(pd.read_csv(io.BytesIO(self._terminated(self.header)), nrows=0).columns)
+        return self
+
+    def _source_signature(self):
+        stat = os.stat(self.path)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    @staticmethod
+    def _terminated(row):
+        return row if row.endswith(b"\n") else row + b"\n"
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+def hash_rows(df):
+    """
+    Hash every row of a DataFrame to a uint64 fingerprint.
+    
+    Values are hashed in their string form so that the same row read in two
+    different chunks (where pandas may infer different dtypes) still produces
+    the same fingerprint.
+    """
+    if len(df) == 0:
+        return np.array([], dtype='uint64')
+    return pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+
+def drop_seen_rows(df, seen_hashes):
+    """
+    Drop rows that are exact duplicates of an earlier row, either inside this
+    frame or in a previously processed frame whose hashes are in seen_hashes.
+    seen_hashes is updated in place with the hashes of the rows that are kept,
+    so it grows with the number of distinct rows (about 70 bytes each).
+    """
+    hashes = hash_rows(df)
+    keep = ~pd.Series(hashes).duplicated(keep='first').to_numpy()
+    if seen_hashes:
+        keep &= np.fromiter((h not in seen_hashes for h in hashes.tolist()), dtype=bool, count=len(hashes))
+    seen_hashes.update(hashes[keep].tolist())
+    return df[keep]
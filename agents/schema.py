@@ -0,0 +1,112 @@
+import pandas as pd
+from agents.data_io import format_for_path, read_csv_arrow, read_sqlite, read_table
+
+# Declared dtypes of the input columns; text columns stay text even when a
+# file only holds digits (e.g. phones), so leading zeros are kept
+INPUT_DTYPES = {
+    'name': 'str',
+    'email': 'str',
+    'phone': 'str',
+    'country': 'str'
+}
+REQUIRED_COLUMNS = ['name', 'email', 'phone', 'country']
+
+# Declared dtypes of an output file: the input columns plus the text columns
+# added by enrichment and near-duplicate flagging (e.g. E.164 phones keep their +)
+OUTPUT_DTYPES = {
+    **INPUT_DTYPES,
+    'email_domain': 'str',
+    'email_provider': 'str',
+    'phone_type': 'str',
+    'country_code': 'str',
+    'first_name': 'str',
+    'last_name': 'str',
+    'duplicate_of': 'str'
+}
+
+# Low-cardinality columns stored as pandas Categorical after enrichment
+CATEGORY_COLUMNS = [
+    'name',
+    'country',
+    'email_domain',
+    'email_provider',
+    'phone_type',
+    'country_code',
+    'first_name',
+    'last_name'
+]
+# A column is only made categorical when it has at most this many distinct values per row
+MAX_CATEGORY_RATIO = 0.5
+
+# Small integer columns added by enrichment
+SMALL_INTEGER_COLUMNS = ['name_length', 'name_word_count', 'data_quality_score']
+
+def read_input(path, chunksize=None, usecols=None, table=None, engine="pandas", memory_map=False):
+    """
+    Read an input CSV with the declared INPUT_DTYPES, loading only usecols
+    when given (which must include the REQUIRED_COLUMNS). A SQLite database
+    is read from table, a table name or a SELECT query, in cursor batches.
+    
+    engine 'pyarrow' parses the CSV with pyarrow's multi-threaded reader
+    into the same frames; memory_map maps the file instead of reading it.
+    """
+    if usecols is not None:
+        missing = [column for column in REQUIRED_COLUMNS if column not in usecols]
+        if missing:
+            raise ValueError(f"usecols must include {', '.join(missing)}")
+    dtype = {column: column_dtype for column, column_dtype in INPUT_DTYPES.items()
+             if usecols is None or column in usecols}
+    if format_for_path(path) == 'sqlite':
+        return read_sqlite(path, table, chunksize=chunksize, columns=usecols, dtype=dtype)
+    if engine == 'pyarrow':
+        return read_csv_arrow(path, chunksize=chunksize, usecols=usecols, dtype=dtype, memory_map=memory_map)
+    return pd.read_csv(path, dtype=dtype, usecols=usecols, chunksize=chunksize, memory_map=memory_map)
+
+def read_output(path, columns=None, nrows=None, table=None):
+    """
+    Read back an output file with the declared OUTPUT_DTYPES, so text
+    columns of a CSV or SQLite output are not inferred as numbers
+    """
+    return read_table(path, columns=columns, nrows=nrows, table=table, dtype=OUTPUT_DTYPES)
+
+def compact_dtypes(df, category_columns=CATEGORY_COLUMNS, max_category_ratio=MAX_CATEGORY_RATIO):
+    """
+    Store low-cardinality text columns as Categorical and small integer
+    columns in the narrowest integer type. Values are unchanged, so outputs
+    are identical; returns the frame and the names of the converted columns.
+    """
+    converted = []
+    updates = {}
+    for column in category_columns:
+        if column not in df.columns or isinstance(df[column].dtype, pd.CategoricalDtype):
+            continue
+        if df[column].nunique() <= max_category_ratio * len(df):
+            updates[column] = df[column].astype('category')
+            converted.append(column)
+    for column in SMALL_INTEGER_COLUMNS:
+        if column in df.columns and pd.api.types.is_integer_dtype(df[column]):
+            narrowed = pd.to_numeric(df[column], downcast='integer')
+            if narrowed.dtype != df[column].dtype:
+                updates[column] = narrowed
+                converted.append(column)
+    if updates:
+        df = df.assign(**updates)
+    return df, converted
+
+def expand_dtypes(df):
+    """
+    Undo compact_dtypes: Categorical columns back to their value dtype and
+    small integers back to int64, e.g. before writing Arrow files chunk by
+    chunk, whose schema must not depend on the values of each chunk
+    """
+    updates = {}
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            updates[column] = df[column].astype(df[column].cat.categories.dtype)
+        elif column in SMALL_INTEGER_COLUMNS and pd.api.types.is_integer_dtype(df[column]):
+            updates[column] = df[column].astype('int64')
+    return df.assign(**updates) if updates else df
+
+def frame_memory(df):
+    """Bytes held by a DataFrame, including the contents of text columns"""
+    return int(df.memory_usage(deep=True).sum())
@@ -0,0 +1,167 @@
+import math
+import numpy as np
+import pandas as pd
+
+# Counters kept for the most frequent values of each distribution
+DEFAULT_CAPACITY = 100
+# HyperLogLog registers per distribution are 2**precision bytes (16 KB at 14)
+DEFAULT_PRECISION = 14
+# Registers are filled from the hash bits left after the register index,
+# which must fit a float64 mantissa exactly for the rank computation
+MIN_PRECISION = 12
+MAX_PRECISION = 18
+
+def hash_values(values):
+    """
+    uint64 hash of the string form of every non-missing value. Categorical
+    columns hash each category once, so a value hashes the same whether a
+    chunk stored it as text or as a category.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        category_hashes = pd.util.hash_array(np.asarray(values.cat.categories.astype(str), dtype=object))
+        return category_hashes[codes[codes >= 0]]
+    return pd.util.hash_array(np.asarray(values.dropna().astype(str), dtype=object))
+
+class HyperLogLog:
+    """
+    Distinct-count estimate in 2**precision one-byte registers.
+    
+    Merging takes the register-wise maximum, so any split of the values
+    merged in any order gives the same registers as adding them all at
+    once. The estimate has a relative standard error of 1.04 / sqrt(2**precision).
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """Add uint64 value hashes, e.g. from hash_values"""
+        if len(hashes) == 0:
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        rest_bits = 64 - self.precision
+        # 1. The top precision bits pick the register
+        index = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        # 2. The rank is the position of the first 1 bit in the rest (rest_bits + 1 when all are 0)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (rest_bits + 1 - bit_length).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        merged = HyperLogLog(self.precision)
+        merged.registers = np.maximum(self.registers, other.registers)
+        return merged
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self):
+        registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / registers)
+        raw = alpha * registers ** 2 / float(np.ldexp(1.0, -self.registers.astype(np.int64)).sum())
+        empty = int(np.count_nonzero(self.registers == 0))
+        # Small cardinalities: linear counting over the empty registers is more accurate
+        if raw <= 2.5 * registers and empty > 0:
+            return int(round(registers * math.log(registers / empty)))
+        return int(round(raw))
+
+class HeavyHitters:
+    """
+    Counts of the most frequent values in at most capacity counters, as in
+    the Space-Saving algorithm.
+    
+    Each counter's count is an upper bound of the value's true count, at
+    most its error too high, and floor bounds the count of every value
+    without a counter. Counts stay exact (floor 0) as long as no more than
+    capacity distinct values were seen.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+        self.total = 0
+
+    @classmethod
+    def from_counts(cls, counts, capacity=DEFAULT_CAPACITY):
+        """Keep the capacity largest of exact per-value counts (a Series)"""
+        sketch = cls(capacity)
+        sketch.total = int(counts.sum())
+        counts = counts.groupby(counts.index.astype(str)).sum()
+        # Ties are broken by value so the kept counters do not depend on row order
+        ordered = counts.sort_index().sort_values(ascending=False, kind="stable")
+        sketch.counts = {value: int(count) for value, count in ordered.iloc[:capacity].items()}
+        sketch.errors = dict.fromkeys(sketch.counts, 0)
+        if len(ordered) > capacity:
+            sketch.floor = int(ordered.iloc[capacity])
+        return sketch
+
+    def merge(self, other):
+        """
+        A value missing from one side may still have occurred there up to
+        that side's floor, which is added to its count and error
+        """
+        merged = HeavyHitters(self.capacity)
+        merged.total = self.total + other.total
+        counts = {}
+        errors = {}
+        for value in list(self.counts) + [value for value in other.counts if value not in self.counts]:
+            counts[value] = self.counts.get(value, self.floor) + other.counts.get(value, other.floor)
+            errors[value] = self.errors.get(value, self.floor) + other.errors.get(value, other.floor)
+        ranked = sorted(counts, key=lambda value: (-counts[value], value))
+        merged.counts = {value: counts[value] for value in ranked[:self.capacity]}
+        merged.errors = {value: errors[value] for value in merged.counts}
+        dropped = counts[ranked[self.capacity]] if len(ranked) > self.capacity else 0
+        merged.floor = max(self.floor + other.floor, dropped)
+        return merged
+
+class DistributionSketch:
+    """
+    Bounded-memory replacement for the exact value counts of a column:
+    HeavyHitters for its most frequent values and a HyperLogLog for its
+    number of distinct values. Memory and report size depend on capacity
+    and precision only, not on the number of distinct values.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, precision=DEFAULT_PRECISION):
+        self.heavy_hitters = HeavyHitters(capacity)
+        self.distinct = HyperLogLog(precision)
+
+    @classmethod
+    def from_values(cls, values, capacity=DEFAULT_CAPACITY, precision=DEFAULT_PRECISION):
+        sketch = cls(capacity, precision)
+        counts = values.value_counts(sort=False)
+        # Categorical columns also count their unused categories
+        sketch.heavy_hitters = HeavyHitters.from_counts(counts[counts > 0], capacity)
+        sketch.distinct.add_hashes(hash_values(values))
+        return sketch
+
+    def merge(self, other):
+        merged = DistributionSketch.__new__(DistributionSketch)
+        merged.heavy_hitters = self.heavy_hitters.merge(other.heavy_hitters)
+        merged.distinct = self.distinct.merge(other.distinct)
+        return merged
+
+    def to_dict(self):
+        """The report entry, with the error bounds of both estimates"""
+        heavy_hitters = self.heavy_hitters
+        return {
+            'total_values': heavy_hitters.total,
+            'distinct_values': self.distinct.estimate(),
+            'distinct_values_relative_error': round(self.distinct.relative_error, 4),
+            'top_values': dict(heavy_hitters.counts),
+            'top_values_complete': heavy_hitters.floor == 0,
+            'max_overcount': max(heavy_hitters.errors.values(), default=0),
+            'untracked_max_count': heavy_hitters.floor
+        }
@@ -0,0 +1,117 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from agents.metrics import count_thread_cpu
+
+# Threads running the independent nodes of one wave at the same time
+DEFAULT_THREADS = min(4, os.cpu_count() or 1)
+
+# What a node's compute returns: a value for each of its outputs, a log
+# message (or None), how many changes it made and the message's log level
+NodeResult = namedtuple('NodeResult', ['outputs', 'message', 'count', 'level'], defaults=[0, "INFO"])
+
+class Node:
+    """
+    One step of an agent with explicit input and output columns.
+    
+    compute(df, context) must only read the inputs columns of df and return
+    a NodeResult with a value for each name in outputs. A column may be
+    both an input and an output of a node that replaces it (e.g. filling
+    missing values); later nodes reading it then depend on that node.
+    """
+
+    def __init__(self, name, inputs, outputs, compute):
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.compute = compute
+
+    def __repr__(self):
+        return f"Node({self.name!r}, inputs={self.inputs}, outputs={self.outputs})"
+
+class StageGraph:
+    """
+    Nodes of an agent in declaration order, which must be a valid order to
+    run them in. A node depends on the latest earlier node producing each
+    of its inputs; inputs no node produces are read from the frame.
+    
+    run() only computes the nodes the requested outputs need and runs
+    nodes that do not depend on each other concurrently, in waves.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = list(nodes)
+        self.dependencies = {}
+        producers = {}
+        for node in self.nodes:
+            if node.name in self.dependencies:
+                raise ValueError(f"Duplicate node '{node.name}'")
+            self.dependencies[node.name] = sorted({producers[column].name for column in node.inputs if column in producers},
+                                                  key=self.position)
+            for column in node.outputs:
+                producers[column] = node
+        self.producers = producers
+
+    def position(self, name):
+        return next(i for i, node in enumerate(self.nodes) if node.name == name)
+
+    def outputs(self):
+        """Every output name, in the order the nodes declare them"""
+        names = []
+        for node in self.nodes:
+            names.extend(column for column in node.outputs if column not in names)
+        return names
+
+    def plan(self, targets=None):
+        """Nodes needed for targets (all nodes if None), in declaration order"""
+        if targets is None:
+            return list(self.nodes)
+        unknown = [target for target in targets if target not in self.producers]
+        if unknown:
+            raise ValueError(f"Unknown outputs: {', '.join(unknown)} (expected some of {', '.join(self.outputs())})")
+        
+        needed = set()
+        pending = [self.producers[target].name for target in targets]
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.dependencies[name])
+        return [node for node in self.nodes if node.name in needed]
+
+    def waves(self, nodes):
+        """Group nodes so every node comes in a later wave than the nodes it depends on"""
+        depth = {}
+        for node in nodes:
+            depth[node.name] = 1 + max((depth[name] for name in self.dependencies[node.name] if name in depth), default=-1)
+        return [[node for node in nodes if depth[node.name] == level] for level in range(max(depth.values(), default=-1) + 1)]
+
+    def run(self, df, targets=None, context=None, threads=DEFAULT_THREADS, assign=True):
+        """
+        Compute the nodes needed for targets. With assign, the outputs of
+        each wave are added to the frame the next wave reads.
+        
+        Returns (df, results), results being (node, NodeResult) pairs in
+        declaration order, so logs do not depend on thread timing.
+        """
+        nodes = self.plan(targets)
+        results = {}
+        pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 and len(nodes) > 1 else None
+        try:
+            for wave in self.waves(nodes):
+                if pool is not None and len(wave) > 1:
+                    compute = count_thread_cpu(lambda node, frame=df: node.compute(frame, context))
+                    computed = list(pool.map(compute, wave))
+                else:
+                    computed = [node.compute(df, context) for node in wave]
+                for node, result in zip(wave, computed):
+                    missing = [column for column in node.outputs if column not in result.outputs]
+                    if missing and result.outputs:
+                        raise ValueError(f"Node '{node.name}' did not return {', '.join(missing)}")
+                    results[node.name] = result
+                if assign:
+                    df = df.assign(**{column: value for result in computed for column, value in result.outputs.items()})
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return df, [(node, results[node.name]) for node in nodes]
@@ -1,23 +1,170 @@
 import pandas as pd
 import re
-from datetime import datetime
+import os
 import json
 import numpy as np
+from agents.row_hashing import hash_rows
+from agents.validity_masks import VALIDATION_PATTERNS, match_format
+from agents.sketches import DistributionSketch
+from agents.logger import AgentLogger
 
-def log_entry(message, level="INFO"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    return f"[{timestamp}] [{level}] {message}"
-
-def validate_data(df):
+def validate_data(df, masks=None, log_dir="logs", logger=None, sketch_options=None):
     """
     Validation Agent: Performs final quality checks and generates comprehensive reports
     """
-    log_entries = []
-    log_entries.append(log_entry("Validation Agent Started"))
+    stats = collect_validation_stats(df, masks, sketch_options, mergeable=False)
+    return build_validation_report(stats, log_dir=log_dir, logger=logger)
+
+# Hash arrays kept before they are deduplicated into one
+MAX_HASH_CHUNKS = 64
+
+# Report key and column of every distribution
+DISTRIBUTIONS = [('countries', 'country'), ('email_providers', 'email_provider'), ('phone_types', 'phone_type')]
+# Sketches are bounded, so sketch mode also covers high-cardinality columns
+SKETCH_DISTRIBUTIONS = DISTRIBUTIONS + [('email_domains', 'email_domain'), ('last_names', 'last_name')]
+
+class ValidationStats:
+    """
+    Mergeable counts behind the validation report.
+    
+    from_frame collects the counts of one frame (a chunk, a partition or a
+    whole file) and merge combines two of them as if their frames had been
+    concatenated. merge is associative, so the stats of any split of a file,
+    merged in row order, give the report of the whole file, identical
+    barring 64-bit hash collisions (duplicates are counted by row hash).
+    
+    Row hashes are kept as uint64 arrays and only deduplicated when the
+    duplicates are counted (or every MAX_HASH_CHUNKS merges), so merging is
+    cheap and a partition's stats pickle compactly. Their memory grows with
+    the number of distinct rows (8 bytes each), not with the chunk size.
+    Stats of a frame that is never merged (mergeable=False) count its
+    duplicates with DataFrame.duplicated instead, which is several times
+    faster than hashing every row. Distributions are kept in order of first
+    occurrence so merged counts sort like value_counts.
+    
+    With sketch_options (e.g. {'capacity': 100, 'precision': 14}) every
+    distribution is a DistributionSketch instead of exact counts, so memory
+    and report size stay bounded however many distinct values a column has.
+    """
+
+    def __init__(self):
+        self.total_rows = 0
+        self.hash_chunks = []
+        # Duplicates counted up front by stats that cannot be merged
+        self.frame_duplicates = None
+        self.missing_data = {}
+        self.format_issues = {}
+        self.distributions = {}
+
+    @classmethod
+    def from_frame(cls, df, masks=None, sketch_options=None, mergeable=True):
+        """
+        Collect the counts of one frame. With a ValidityMasks object only the
+        rows modified since detection are re-checked for format issues.
+        """
+        stats = cls()
+        stats.total_rows = len(df)
+        if mergeable:
+            stats.hash_chunks = [np.unique(hash_rows(df))]
+        else:
+            stats.hash_chunks = None
+            stats.frame_duplicates = int(df.duplicated().sum())
+        
+        # Missing data
+        for column in ['name', 'email', 'phone', 'country']:
+            stats.missing_data[column] = int(df[column].isna().sum())
+        
+        # Format issues
+        for issue, column in [('invalid_emails', 'email'), ('invalid_phones', 'phone')]:
+            if masks is not None:
+                valid = masks.get(df, column)
+            else:
+                valid = match_format(df[column], VALIDATION_PATTERNS[column])
+            stats.format_issues[issue] = int((~valid).sum())
+        
+        # Distributions
+        if sketch_options is not None:
+            for key, column in SKETCH_DISTRIBUTIONS:
+                if column in df.columns:
+                    stats.distributions[key] = DistributionSketch.from_values(df[column], **sketch_options)
+            return stats
+        for key, column in DISTRIBUTIONS:
+            counts = {}
+            if column in df.columns:
+                for value, count in first_occurrence_counts(df[column]).items():
+                    counts[str(value)] = counts.get(str(value), 0) + int(count)
+            stats.distributions[key] = counts
+        
+        return stats
+
+    def merge(self, other):
+        """New stats for this frame followed by other's"""
+        if self.hash_chunks is None or other.hash_chunks is None:
+            raise ValueError("Stats collected with mergeable=False cannot be merged")
+        merged = ValidationStats()
+        merged.total_rows = self.total_rows + other.total_rows
+        merged.hash_chunks = self.hash_chunks + other.hash_chunks
+        if len(merged.hash_chunks) > MAX_HASH_CHUNKS:
+            merged.hash_chunks = [np.unique(np.concatenate(merged.hash_chunks))]
+        for section in ['missing_data', 'format_issues']:
+            counts = dict(getattr(self, section))
+            for key, count in getattr(other, section).items():
+                counts[key] = counts.get(key, 0) + count
+            setattr(merged, section, counts)
+        merged.distributions = {key: counts if isinstance(counts, DistributionSketch) else dict(counts)
+                                for key, counts in self.distributions.items()}
+        for key, counts in other.distributions.items():
+            if isinstance(counts, DistributionSketch):
+                target = merged.distributions.get(key)
+                merged.distributions[key] = counts if target is None else target.merge(counts)
+                continue
+            target = merged.distributions.setdefault(key, {})
+            for value, count in counts.items():
+                target[value] = target.get(value, 0) + count
+        return merged
+    
+    __add__ = merge
+
+    def unique_rows(self):
+        """Number of distinct rows"""
+        if self.hash_chunks is None:
+            return self.total_rows - self.frame_duplicates
+        if len(self.hash_chunks) > 1:
+            self.hash_chunks = [np.unique(np.concatenate(self.hash_chunks))]
+        return len(self.hash_chunks[0]) if self.hash_chunks else 0
+
+    @property
+    def duplicates(self):
+        return self.total_rows - self.unique_rows()
+
+def collect_validation_stats(df, masks=None, sketch_options=None, mergeable=True):
+    """The ValidationStats of one frame; see ValidationStats.from_frame"""
+    return ValidationStats.from_frame(df, masks, sketch_options, mergeable)
+
+def first_occurrence_counts(values):
+    """value_counts(sort=False), also in order of first occurrence for Categorical columns"""
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return values.value_counts(sort=False)
+    codes = pd.Series(values.cat.codes.to_numpy())
+    counts = codes[codes >= 0].value_counts(sort=False)
+    return pd.Series(counts.to_numpy(), index=values.cat.categories[counts.index.to_numpy()])
+
+def build_validation_report(stats, log_dir="logs", logger=None):
+    """
+    Turn collected validation statistics into the final report, write the
+    validation log and JSON report, and return the report.
+    
+    The log goes through logger when one is given (and is left open),
+    otherwise to validation_log.txt in log_dir.
+    """
+    own_logger = logger is None
+    if own_logger:
+        logger = AgentLogger("validation", log_dir)
+    logger.info("Validation Agent Started")
     
     # Initialize validation results
     validation_results = {
-        'total_rows': len(df),
+        'total_rows': stats.total_rows,
         'duplicates': 0,
         'missing_data': {},
         'format_issues': {},
@@ -27,45 +174,42 @@ def validate_data(df):
     }
     
     # 1. Check for remaining duplicates
-    duplicates = df[df.duplicated(keep='first')]
-    validation_results['duplicates'] = len(duplicates)
-    if len(duplicates) > 0:
-        log_entries.append(log_entry(f"WARNING: {len(duplicates)} duplicate rows still present", level="WARNING"))
+    duplicates = stats.duplicates
+    validation_results['duplicates'] = duplicates
+    if duplicates > 0:
+        logger.warning(f"WARNING: {duplicates} duplicate rows still present")
         validation_results['recommendations'].append("Remove remaining duplicate rows")
     else:
-        log_entries.append(log_entry("No duplicate rows found"))
+        logger.info("No duplicate rows found")
     
     # 2. Check for missing data
     for column in ['name', 'email', 'phone', 'country']:
-        missing_count = df[column].isna().sum()
-        validation_results['missing_data'][column] = int(missing_count)  # Convert to regular int
+        missing_count = stats.missing_data[column]
+        validation_results['missing_data'][column] = missing_count
         if missing_count > 0:
-            log_entries.append(log_entry(f"WARNING: {missing_count} missing values in {column}", level="WARNING"))
+            logger.warning(f"WARNING: {missing_count} missing values in {column}")
         else:
-            log_entries.append(log_entry(f"No missing values in {column}"))
+            logger.info(f"No missing values in {column}")
     
     # 3. Check format issues
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    invalid_emails = df[~df['email'].astype(str).str.match(email_pattern, na=False)]
-    validation_results['format_issues']['invalid_emails'] = int(len(invalid_emails))
-    
-    phone_pattern = r'^\d{3}-\d{3}-\d{4}$'
-    invalid_phones = df[~df['phone'].astype(str).str.match(phone_pattern, na=False)]
-    validation_results['format_issues']['invalid_phones'] = int(len(invalid_phones))
+    invalid_emails = stats.format_issues['invalid_emails']
+    invalid_phones = stats.format_issues['invalid_phones']
+    validation_results['format_issues']['invalid_emails'] = invalid_emails
+    validation_results['format_issues']['invalid_phones'] = invalid_phones
     
-    if len(invalid_emails) > 0:
-        log_entries.append(log_entry(f"WARNING: {len(invalid_emails)} invalid email formats", level="WARNING"))
+    if invalid_emails > 0:
+        logger.warning(f"WARNING: {invalid_emails} invalid email formats")
     else:
-        log_entries.append(log_entry("All email formats are valid"))
+        logger.info("All email formats are valid")
     
-    if len(invalid_phones) > 0:
-        log_entries.append(log_entry(f"WARNING: {len(invalid_phones)} invalid phone formats", level="WARNING"))
+    if invalid_phones > 0:
+        logger.warning(f"WARNING: {invalid_phones} invalid phone formats")
     else:
-        log_entries.append(log_entry("All phone formats are valid"))
+        logger.info("All phone formats are valid")
     
     # 4. Calculate quality metrics
     total_issues = sum(validation_results['missing_data'].values()) + sum(validation_results['format_issues'].values())
-    quality_score = max(0, 100 - (total_issues / len(df) * 100))
+    quality_score = max(0, 100 - (total_issues / validation_results['total_rows'] * 100))
     validation_results['quality_metrics']['overall_score'] = float(quality_score)
     validation_results['quality_metrics']['total_issues'] = int(total_issues)
     
@@ -79,40 +223,37 @@ def validate_data(df):
     if validation_results['missing_data']['phone'] > 0:
         validation_results['recommendations'].append("Consider phone number validation service")
     
-    # 6. Data distribution analysis
-    validation_results['distributions'] = {
-        'countries': df['country'].value_counts().to_dict(),
-        'email_providers': df['email_provider'].value_counts().to_dict() if 'email_provider' in df.columns else {},
-        'phone_types': df['phone_type'].value_counts().to_dict() if 'phone_type' in df.columns else {}
-    }
-    
-    # Convert numpy types to regular Python types for JSON serialization
-    for key in validation_results['distributions']:
-        if validation_results['distributions'][key]:
-            validation_results['distributions'][key] = {
-                str(k): int(v) for k, v in validation_results['distributions'][key].items()
-            }
+    # 6. Data distribution analysis (sorted the same way as value_counts)
+    validation_results['distributions'] = {}
+    for key, counts in stats.distributions.items():
+        if isinstance(counts, DistributionSketch):
+            sketch = counts.to_dict()
+            validation_results['distributions'][key] = sketch
+            logger.info(f"Estimated {sketch['distinct_values']} distinct {key} "
+                        f"(±{sketch['distinct_values_relative_error']:.1%}), top counts at most {sketch['max_overcount']} too high")
+            continue
+        ordered = pd.Series(list(counts.values()), index=list(counts.keys()), dtype='int64').sort_values(ascending=False, kind="stable")
+        validation_results['distributions'][key] = {str(k): int(v) for k, v in ordered.items()}
     
     # 7. Summary statistics
-    log_entries.append(log_entry("\n=== VALIDATION SUMMARY ==="))
-    log_entries.append(log_entry(f"Total rows: {validation_results['total_rows']}"))
-    log_entries.append(log_entry(f"Overall quality score: {quality_score:.1f}%"))
-    log_entries.append(log_entry(f"Total issues found: {total_issues}"))
-    log_entries.append(log_entry(f"Remaining duplicates: {validation_results['duplicates']}"))
+    logger.info("\n=== VALIDATION SUMMARY ===")
+    logger.info(f"Total rows: {validation_results['total_rows']}")
+    logger.info(f"Overall quality score: {quality_score:.1f}%")
+    logger.info(f"Total issues found: {total_issues}")
+    logger.info(f"Remaining duplicates: {validation_results['duplicates']}")
     
     if validation_results['recommendations']:
-        log_entries.append(log_entry("\n=== RECOMMENDATIONS ==="))
+        logger.info("\n=== RECOMMENDATIONS ===")
         for rec in validation_results['recommendations']:
-            log_entries.append(log_entry(f"- {rec}"))
+            logger.info(f"- {rec}")
     
-    log_entries.append(log_entry("Validation Agent Completed"))
+    logger.info("Validation Agent Completed")
     
-    # Write detailed log
-    with open("logs/validation_log.txt", "w") as f:
-        f.write("\n".join(log_entries))
+    if own_logger:
+        logger.close()
     
     # Write validation report as JSON
-    with open("logs/validation_report.json", "w") as f:
+    with open(os.path.join(log_dir, "validation_report.json"), "w") as f:
         json.dump(validation_results, f, indent=2)
     
     # After calculating quality_score, total_issues, etc.
@@ -124,3 +265,12 @@ def validate_data(df):
     }
     
     return validation_results 
+
+def add_runtime_metrics(runtime_metrics, log_dir="logs"):
+    """Add the per-stage runtime metrics of a run to the saved validation report"""
+    report_path = os.path.join(log_dir, "validation_report.json")
+    with open(report_path) as f:
+        validation_results = json.load(f)
+    validation_results['runtime_metrics'] = runtime_metrics
+    with open(report_path, "w") as f:
+        json.dump(validation_results, f, indent=2)
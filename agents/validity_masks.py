@@ -0,0 +1,87 @@
+import pandas as pd
+from agents.job_options import PHONE_FORMATS
+
+# Final format checks shared by the enrichment and validation agents
+VALIDATION_PATTERNS = {
+    'email': r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$',
+    'phone': r'^\d{3}-\d{3}-\d{4}$'
+}
+# Final phone format of each of the PHONE_FORMATS: the historic XXX-XXX-XXXX or E.164 (+ and up to 15 digits)
+PHONE_FORMAT_PATTERNS = {
+    'national': VALIDATION_PATTERNS['phone'],
+    'e164': r'^\+[1-9]\d{6,14}$'
+}
+
+def validation_patterns(phone_format="national"):
+    """VALIDATION_PATTERNS with the phone pattern of phone_format"""
+    return {**VALIDATION_PATTERNS, 'phone': PHONE_FORMAT_PATTERNS[phone_format]}
+
+def match_format(values, pattern):
+    """Check a Series against a format pattern, treating missing values as invalid"""
+    return values.astype(str).str.match(pattern, na=False)
+
+class ValidityMasks:
+    """
+    Per-column format validity carried from agent to agent.
+    
+    The detection agent computes the masks once over every row. Agents that
+    modify cells record the rows they changed, and later agents only re-check
+    those rows, so the final validation costs O(changes) instead of O(rows).
+    """
+
+    def __init__(self, patterns=None):
+        self.patterns = dict(patterns or VALIDATION_PATTERNS)
+        self.valid = {}
+        self.changed = {}
+        self.stale = {}
+        self.rechecked = 0
+
+    def compute(self, df, column):
+        """Check every row of a column and store the result"""
+        self.valid[column] = match_format(df[column], self.patterns[column])
+        self.stale[column] = pd.Index([])
+        return self.valid[column]
+
+    def mark_changed(self, column, rows):
+        """Record the row labels whose value in column was modified"""
+        rows = pd.Index(rows)
+        if len(rows) == 0:
+            return
+        self.changed[column] = self.changed[column].union(rows) if column in self.changed else rows
+        if column in self.valid:
+            self.stale[column] = self.stale[column].union(rows)
+
+    def mark_changed_values(self, column, before, after):
+        """Record the rows where after differs from before (aligned Series)"""
+        differs = (before != after) & ~(before.isna() & after.isna())
+        self.mark_changed(column, before.index[differs.to_numpy()])
+
+    def get(self, df, column):
+        """
+        Return the validity of column aligned to df, re-checking only the rows
+        that changed since the mask was computed
+        """
+        if column not in self.valid:
+            return self.compute(df, column)
+        
+        valid = self.valid[column]
+        stale = self.stale[column]
+        
+        # Rows dropped by earlier agents disappear, rows never seen are checked
+        if not valid.index.equals(df.index):
+            stale = stale.union(df.index.difference(valid.index))
+            valid = valid.reindex(df.index, fill_value=False)
+        
+        stale = stale.intersection(df.index)
+        if len(stale) > 0:
+            valid = valid.copy()
+            valid.loc[stale] = match_format(df.loc[stale, column], self.patterns[column])
+            self.rechecked += len(stale)
+        
+        self.valid[column] = valid
+        self.stale[column] = pd.Index([])
+        return valid
+
+    def changed_counts(self):
+        """Number of modified cells per column"""
+        return {column: len(rows) for column, rows in self.changed.items()}
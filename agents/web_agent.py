@@ -1,29 +1,243 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-import pandas as pd
-from datetime import datetime
-import json
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, render_template, request, jsonify, send_file
 import tempfile
+from agents.results_index import ResultsIndex, MAX_PAGE_SIZE
+from agents.data_io import OUTPUT_FORMATS, resolve_output
+from agents.metrics import PipelineMetrics, render_prometheus
 
 app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), '../templates'))
 
-# Global variable to store current session data
-session_data = {
-    'input_file': None,
-    'output_file': None,
-    'validation_results': None,
-    'logs': {}
-}
+# Jobs run on a bounded pool so one large upload cannot block the web server
+MAX_JOB_WORKERS = 4
+MAX_QUEUED_JOBS = 32
+LOG_FILES = ['detection_log.txt', 'correction_log.txt', 'enrichment_log.txt', 'validation_log.txt']
+
+# Finished jobs (and uploads never processed) are kept for JOB_TTL_SECONDS, and at most
+# MAX_FINISHED_JOBS of them, before their entry and directory are removed
+JOB_TTL_SECONDS = 3600
+MAX_FINISHED_JOBS = 100
+
+job_executor = ThreadPoolExecutor(max_workers=MAX_JOB_WORKERS, thread_name_prefix='pipeline-job')
+
+# Every upload is a job with its own directory for input, output and logs
+jobs = {}
+jobs_lock = threading.Lock()
+
+# Stage metrics summed over all completed jobs, plus those of the latest job, for /metrics
+pipeline_metrics = PipelineMetrics()
+latest_stage_metrics = {}
+
+def create_job(temp_dir, filename):
+    """Register a new job for an uploaded file and return its id"""
+    evict_jobs()
+    job_id = uuid.uuid4().hex
+    with jobs_lock:
+        jobs[job_id] = {
+            'id': job_id,
+            'filename': filename,
+            'status': 'uploaded',
+            'temp_dir': temp_dir,
+            'input_file': os.path.join(temp_dir, 'input.csv'),
+            'output_file': os.path.join(temp_dir, 'cleaned.csv'),
+            'output_format': 'csv',
+            'log_dir': os.path.join(temp_dir, 'logs'),
+            'stage': None,
+            'stages': [],
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'validation_results': None,
+            'results_index': None,
+            'error': None
+        }
+    return job_id
+
+def evict_jobs(now=None):
+    """
+    Remove expired jobs and their directories: finished jobs past JOB_TTL_SECONDS or beyond
+    the newest MAX_FINISHED_JOBS, and uploads that were not processed within JOB_TTL_SECONDS.
+    Queued and running jobs are never removed. Returns the ids of the removed jobs.
+    """
+    now = now or time.time()
+    with jobs_lock:
+        # finished_at is set once run_job is done with the job, after its final status
+        finished = sorted((job for job in jobs.values()
+                           if job['status'] in ('completed', 'failed') and job['finished_at'] is not None),
+                          key=lambda job: job['finished_at'], reverse=True)
+        expired = [job for i, job in enumerate(finished)
+                   if i >= MAX_FINISHED_JOBS or now - job['finished_at'] > JOB_TTL_SECONDS]
+        expired += [job for job in jobs.values()
+                    if job['status'] == 'uploaded' and now - job['created_at'] > JOB_TTL_SECONDS]
+        for job in expired:
+            del jobs[job['id']]
+    
+    # Delete the files outside the lock so status requests are not held up by the disk
+    for job in expired:
+        shutil.rmtree(job['temp_dir'], ignore_errors=True)
+    return [job['id'] for job in expired]
+
+def get_job(job_id):
+    with jobs_lock:
+        return jobs.get(job_id)
+
+def update_job(job_id, **fields):
+    with jobs_lock:
+        jobs[job_id].update(fields)
+
+def record_stage(job_id, stage, chunk=None):
+    """Progress callback for main(): closes the running stage and starts the next one"""
+    now = time.time()
+    with jobs_lock:
+        job = jobs[job_id]
+        if job['stages'] and job['stages'][-1]['finished_at'] is None:
+            job['stages'][-1]['finished_at'] = now
+        job['stages'].append({'stage': stage, 'chunk': chunk, 'started_at': now, 'finished_at': None})
+        job['stage'] = stage
+
+def run_job(job_id):
+    """Run the pipeline for one job on a pool thread"""
+    # Import here to avoid circular imports
+    from main import main
+    
+    job = get_job(job_id)
+    update_job(job_id, status='running', started_at=time.time())
+    try:
+        validation_results = main(job['input_file'], job['output_file'], log_dir=job['log_dir'],
+                                  progress=lambda stage, chunk=None: record_stage(job_id, stage, chunk))
+        if validation_results is None:
+            raise ValueError('Could not read the uploaded file')
+        
+        # Index the row offsets once so /results can serve any page without re-reading the file
+        record_stage(job_id, 'index')
+        results_index = ResultsIndex(job['output_file']).build()
+        update_job(job_id, status='completed', validation_results=validation_results, results_index=results_index)
+        record_job_metrics(validation_results['runtime_metrics'])
+    except Exception as e:
+        update_job(job_id, status='failed', error=str(e))
+    finally:
+        now = time.time()
+        with jobs_lock:
+            if job['stages'] and job['stages'][-1]['finished_at'] is None:
+                job['stages'][-1]['finished_at'] = now
+            job['finished_at'] = now
+            job['stage'] = None
+
+def record_job_metrics(runtime_metrics):
+    """Add the stage metrics of a completed job to the totals served by /metrics"""
+    with jobs_lock:
+        for name, stage in runtime_metrics['stages'].items():
+            pipeline_metrics.add(name, stage['wall_seconds'], stage['cpu_seconds'], stage['rows_in'],
+                                 stage['rows_out'], stage['peak_rss_mb'] * 2**20, runs=stage['runs'])
+            latest_stage_metrics[name] = stage
+
+def prometheus_metrics():
+    """Job counts and pipeline stage metrics as (name, type, help, samples) for render_prometheus"""
+    with jobs_lock:
+        statuses = {'uploaded': 0, 'queued': 0, 'running': 0, 'completed': 0, 'failed': 0}
+        for job in jobs.values():
+            statuses[job['status']] = statuses.get(job['status'], 0) + 1
+        stages = {name: dict(stage) for name, stage in pipeline_metrics.stages.items()}
+        latest = {name: dict(stage) for name, stage in latest_stage_metrics.items()}
+
+    def per_stage(values, key):
+        return [({'stage': name}, stage[key]) for name, stage in values.items()]
+    
+    return [
+        ('datafix_jobs', 'gauge', 'Jobs by status',
+         [({'status': status}, count) for status, count in statuses.items()]),
+        ('datafix_jobs_in_progress', 'gauge', 'Jobs queued or running',
+         [({}, statuses['queued'] + statuses['running'])]),
+        ('datafix_stage_runs_total', 'counter', 'Runs of each pipeline stage (one per chunk or partition)',
+         per_stage(stages, 'runs')),
+        ('datafix_stage_seconds_total', 'counter', 'Wall time spent in each pipeline stage',
+         per_stage(stages, 'wall_seconds')),
+        ('datafix_stage_cpu_seconds_total', 'counter', 'CPU time spent in each pipeline stage',
+         per_stage(stages, 'cpu_seconds')),
+        ('datafix_stage_rows_in_total', 'counter', 'Rows passed into each pipeline stage',
+         per_stage(stages, 'rows_in')),
+        ('datafix_stage_rows_out_total', 'counter', 'Rows coming out of each pipeline stage',
+         per_stage(stages, 'rows_out')),
+        ('datafix_stage_rows_per_second', 'gauge', 'Throughput of each stage in the latest completed job',
+         [({'stage': name}, stage['rows_per_sec'] or 0) for name, stage in latest.items()]),
+        ('datafix_stage_peak_rss_bytes', 'gauge', 'Peak resident memory of each stage in the latest completed job',
+         [({'stage': name}, int(stage['peak_rss_mb'] * 2**20)) for name, stage in latest.items()]),
+        ('datafix_stage_frame_bytes', 'gauge', 'Size of the largest frame produced by each stage in the latest completed job',
+         [({'stage': name}, int(stage['frame_mb'] * 2**20)) for name, stage in latest.items()])
+    ]
+
+def job_status(job):
+    """JSON-friendly view of a job"""
+    with jobs_lock:
+        now = time.time()
+        stages = [
+            {
+                'stage': stage['stage'],
+                'chunk': stage['chunk'],
+                'elapsed_seconds': round((stage['finished_at'] or now) - stage['started_at'], 3),
+                'finished': stage['finished_at'] is not None
+            }
+            for stage in job['stages']
+        ]
+        status = {
+            'job_id': job['id'],
+            'filename': job['filename'],
+            'status': job['status'],
+            'stage': job['stage'],
+            'stages': stages,
+            'error': job['error']
+        }
+        if job['started_at']:
+            status['elapsed_seconds'] = round((job['finished_at'] or now) - job['started_at'], 3)
+    if job['status'] == 'completed':
+        status['summary'] = summarize_validation(job['validation_results'])
+    return status
+
+def summarize_validation(validation):
+    """Extract summary from validation results"""
+    summary = {}
+    if validation and 'summary' in validation:
+        summary = validation['summary']
+    elif validation and 'quality_metrics' in validation:
+        summary = {
+            'total_rows': validation.get('total_rows'),
+            'quality_score': validation['quality_metrics'].get('overall_score'),
+            'total_issues': validation['quality_metrics'].get('total_issues'),
+            'remaining_duplicates': validation.get('duplicates')
+        }
+    return summary
+
+def read_job_logs(job):
+    logs = {}
+    for log_file in LOG_FILES:
+        log_path = os.path.join(job['log_dir'], log_file)
+        if os.path.exists(log_path):
+            with open(log_path, 'r') as f:
+                logs[log_file] = f.read()
+    return logs
+
+def completed_job(job_id):
+    """Look up a job whose results can be served, or return an error response"""
+    job = get_job(job_id) if job_id else None
+    if job is None:
+        return None, (jsonify({'error': 'Unknown job'}), 404)
+    if job['status'] != 'completed' or not os.path.exists(job['output_file']):
+        return None, (jsonify({'error': 'No results available', 'status': job['status']}), 400)
+    return job, None
 
 def create_web_interface():
     """Create a simple web interface for the data fixing system"""
-    
+
     @app.route('/')
     def index():
         return render_template('index.html')
-    
+
     @app.route('/upload', methods=['POST'])
     def upload_file():
         if 'file' not in request.files:
@@ -36,108 +250,101 @@ def create_web_interface():
         if not file.filename.endswith('.csv'):
             return jsonify({'error': 'Please upload a CSV file'}), 400
         
-        # Save uploaded file
-        temp_dir = tempfile.mkdtemp()
-        input_path = os.path.join(temp_dir, 'input.csv')
-        file.save(input_path)
-        
-        session_data['input_file'] = input_path
-        session_data['output_file'] = os.path.join(temp_dir, 'cleaned.csv')
+        # Save uploaded file into its own job directory
+        temp_dir = tempfile.mkdtemp(prefix='job-')
+        job_id = create_job(temp_dir, file.filename)
+        file.save(get_job(job_id)['input_file'])
         
-        return jsonify({'message': 'File uploaded successfully', 'filename': file.filename})
-    
+        return jsonify({'message': 'File uploaded successfully', 'filename': file.filename, 'job_id': job_id})
+
     @app.route('/process', methods=['POST'])
     def process_data():
-        if not session_data['input_file']:
+        options = request.get_json(silent=True) or {}
+        job_id = options.get('job_id') or request.args.get('job_id')
+        job = get_job(job_id) if job_id else None
+        if job is None:
             return jsonify({'error': 'No file uploaded'}), 400
         
-        try:
-            # Import here to avoid circular imports
-            from main import main
-            
-            # Process the data
-            main(session_data['input_file'], session_data['output_file'])
-            
-            # Read results
-            df = pd.read_csv(session_data['output_file'])
-            
-            # Load validation results
-            validation_path = os.path.join('logs', 'validation_report.json')
-            if os.path.exists(validation_path):
-                with open(validation_path, 'r') as f:
-                    session_data['validation_results'] = json.load(f)
-            
-            # Load logs
-            log_files = ['detection_log.txt', 'correction_log.txt', 'enrichment_log.txt', 'validation_log.txt']
-            for log_file in log_files:
-                log_path = os.path.join('logs', log_file)
-                if os.path.exists(log_path):
-                    with open(log_path, 'r') as f:
-                        session_data['logs'][log_file] = f.read()
-            
-            # Extract summary from validation results
-            summary = {}
-            validation = session_data['validation_results']
-            if validation and 'summary' in validation:
-                summary = validation['summary']
-            elif validation and 'quality_metrics' in validation:
-                summary = {
-                    'total_rows': validation.get('total_rows'),
-                    'quality_score': validation['quality_metrics'].get('overall_score'),
-                    'total_issues': validation['quality_metrics'].get('total_issues'),
-                    'remaining_duplicates': validation.get('duplicates')
-                }
-            
-            return jsonify({
-                'message': 'Processing completed successfully',
-                'rows_processed': len(df),
-                'columns': list(df.columns),
-                'validation': session_data['validation_results'],
-                'logs': session_data['logs'],
-                'summary': summary
-            })
-            
-        except Exception as e:
-            return jsonify({'error': f'Processing failed: {str(e)}'}), 500
-    
+        output_format = options.get('output_format') or request.args.get('output_format') or 'csv'
+        if output_format not in OUTPUT_FORMATS:
+            return jsonify({'error': f"Unknown output format '{output_format}'"}), 400
+        if output_format == 'sqlite':
+            # The results pages read files by row offsets; databases are cleaned with main.py or cli.py
+            return jsonify({'error': 'SQLite output is not available in the web interface'}), 400
+        
+        with jobs_lock:
+            if job['status'] != 'uploaded':
+                return jsonify({'error': f"Job is already {job['status']}", 'job_id': job_id}), 409
+            queued = sum(1 for other in jobs.values() if other['status'] in ('queued', 'running'))
+            if queued >= MAX_QUEUED_JOBS:
+                return jsonify({'error': 'Too many jobs in progress, try again later'}), 503
+            job['status'] = 'queued'
+            job['output_file'], job['output_format'] = resolve_output(job['output_file'], output_format)
+        
+        job_executor.submit(run_job, job_id)
+        return jsonify({'message': 'Processing started', 'job_id': job_id, 'status_url': f'/jobs/{job_id}'}), 202
+
+    @app.route('/jobs/<job_id>')
+    def get_job_status(job_id):
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Unknown job'}), 404
+        return jsonify(job_status(job))
+
+    @app.route('/jobs/<job_id>/logs')
+    def get_job_logs(job_id):
+        # Served apart from /results so paging through rows does not re-read every log
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Unknown job'}), 404
+        return jsonify({'job_id': job_id, 'status': job['status'], 'logs': read_job_logs(job)})
+
     @app.route('/results')
     def get_results():
-        if not session_data['output_file'] or not os.path.exists(session_data['output_file']):
-            return jsonify({'error': 'No results available'}), 400
+        job, error = completed_job(request.args.get('job_id'))
+        if error:
+            return error
         
         try:
-            df = pd.read_csv(session_data['output_file'])
+            offset = request.args.get('offset', 0, type=int)
+            limit = request.args.get('limit', 20, type=int)
+            sort = request.args.get('sort') or None
+            filter = request.args.get('filter') or None
             
-            # Extract summary from validation results
-            summary = {}
-            validation = session_data['validation_results']
-            if validation and 'summary' in validation:
-                summary = validation['summary']
-            elif validation and 'quality_metrics' in validation:
-                summary = {
-                    'total_rows': validation.get('total_rows'),
-                    'quality_score': validation['quality_metrics'].get('overall_score'),
-                    'total_issues': validation['quality_metrics'].get('total_issues'),
-                    'remaining_duplicates': validation.get('duplicates')
-                }
+            results_index = job['results_index']
+            try:
+                page, matched_rows = results_index.page(offset, limit, sort=sort, filter=filter)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
             return jsonify({
-                'data': df.head(20).to_dict('records'),
-                'total_rows': len(df),
-                'columns': list(df.columns),
-                'validation': session_data['validation_results'],
-                'logs': session_data['logs'],
-                'summary': summary
+                'job_id': job['id'],
+                'data': page.to_dict('records'),
+                'offset': offset,
+                'limit': min(limit, MAX_PAGE_SIZE),
+                'sort': sort,
+                'filter': filter,
+                'total_rows': results_index.total_rows,
+                'matched_rows': matched_rows,
+                'columns': results_index.columns,
+                'validation': job['validation_results'],
+                'summary': summarize_validation(job['validation_results'])
             })
         except Exception as e:
             return jsonify({'error': f'Error reading results: {str(e)}'}), 500
-    
+
     @app.route('/download')
     def download_results():
-        if not session_data['output_file'] or not os.path.exists(session_data['output_file']):
-            return jsonify({'error': 'No results available'}), 400
+        job, error = completed_job(request.args.get('job_id'))
+        if error:
+            return error
         
-        return send_file(session_data['output_file'], as_attachment=True, download_name='cleaned_data.csv')
+        extension = OUTPUT_FORMATS[job['output_format']]
+        return send_file(job['output_file'], as_attachment=True, download_name=f'cleaned_data{extension}')
+
+    @app.route('/metrics')
+    def metrics():
+        return app.response_class(render_prometheus(prometheus_metrics()), mimetype='text/plain; version=0.0.4')
     
     return app
 
@@ -299,6 +506,10 @@ def start_web_server(host='localhost', port=5050, debug=True):
     # with open('templates/index.html', 'w') as f:
     #     f.write(html_template)
     
+    # Load the pipeline and its reference data now rather than in the first job
+    from worker import warm_up
+    warm_up()
+    
     print(f"🌐 Starting web server at http://{host}:{port}")
     print("📁 Upload your CSV file and process it through the web interface")
     
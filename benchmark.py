@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the cleaning agents.
+
+Generates synthetic dirty data with configurable error rates, times every
+agent on it (wall time, rows/sec, peak RSS) and compares the results with a
+stored baseline:
+
+    python benchmark.py generate data/benchmark.csv --rows 1000000
+    python benchmark.py run data/benchmark.csv --output baseline.json
+    python benchmark.py run data/benchmark.csv --baseline baseline.json --threshold 0.15
+    python benchmark.py engines data/benchmark.csv data/input.csv
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from agents.data_io import CSV_ENGINES
+from agents.job_options import PHONE_FORMATS
+from agents.metrics import PeakRssSampler
+
+FIRST_NAMES = ["Alice", "Bob", "Charlie", "David", "Eva", "Frank", "Grace", "Henry", "Ivy", "Jack",
+               "Karen", "Leo", "Mia", "Noah", "Olivia", "Paul", "Quinn", "Rachel", "Sam", "Tina"]
+LAST_NAMES = ["Smith", "Johnson", "Brown", "Adams", "Green", "Moore", "Lee", "Wilson", "Taylor", "Clark",
+              "Lewis", "Walker", "Hall", "Young", "King", "Wright", "Lopez", "Hill", "Scott", "Bell"]
+EMAIL_DOMAINS = ["email.com", "gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "company.org"]
+FALLBACK_COUNTRIES = ["India", "United States", "USA", "Canada", "Mexico", "France", "Germany", "Brazil"]
+
+# Share of rows that get each kind of error
+DEFAULT_ERROR_RATES = {
+    'at_emails': 0.05,
+    'misspelled_countries': 0.10,
+    'malformed_phones': 0.10,
+    'blank_names': 0.02
+}
+DEFAULT_DUPLICATE_RATIO = 0.02
+GENERATE_CHUNK_ROWS = 1000000
+
+# Stages timed by run_benchmark, in pipeline order
+STAGES = ["load", "detection", "correction", "enrichment", "validation"]
+
+# Readers compared by compare_engines: name -> (engine, memory_map)
+READ_VARIANTS = {
+    'pandas': ("pandas", False),
+    'pyarrow': ("pyarrow", False),
+    'pyarrow_mmap': ("pyarrow", True)
+}
+
+def load_countries(path="data/valid_countries.txt"):
+    try:
+        with open(path) as f:
+            return [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        return FALLBACK_COUNTRIES
+
+def misspell(value, rng):
+    """Drop, swap or double one character of value"""
+    if len(value) < 3:
+        return value.lower()
+    i = int(rng.integers(1, len(value) - 1))
+    kind = rng.integers(3)
+    if kind == 0:
+        return value[:i] + value[i + 1:]
+    if kind == 1:
+        return value[:i - 1] + value[i] + value[i - 1] + value[i + 1:]
+    return value[:i] + value[i] + value[i:]
+
+def malformed_phone(digits, rng):
+    """A phone number in one of the messy formats seen in real inputs"""
+    kind = rng.integers(4)
+    if kind == 0:
+        return f"({digits[:3]}) {digits[3:6]} {digits[6:]}"
+    if kind == 1:
+        return f"{digits[:3]}.{digits[3:6]}.{digits[6:]}"
+    if kind == 2:
+        return digits[:int(rng.integers(4, 9))]
+    return f"+1 {digits[:3]}-{digits[3:6]}-{digits[6:]}x"
+
+def generate_chunk(start_id, rows, error_rates, duplicate_ratio, countries, rng):
+    """One chunk of synthetic rows with errors injected at the given rates"""
+    # Built with NumPy's vectorized string functions, which are much faster than
+    # per-row Python formatting at tens of millions of rows
+    ids = np.arange(start_id, start_id + rows)
+    first = np.array(FIRST_NAMES)[rng.integers(len(FIRST_NAMES), size=rows)]
+    last = np.array(LAST_NAMES)[rng.integers(len(LAST_NAMES), size=rows)]
+    domains = np.array(EMAIL_DOMAINS)[rng.integers(len(EMAIL_DOMAINS), size=rows)]
+    phone_parts = [np.char.zfill(rng.integers(0, 10**width, size=rows).astype(str), width) for width in (3, 3, 4)]
+    names = np.char.add(np.char.add(first, " "), last)
+    emails = np.char.add(np.char.add(np.char.lower(first), "."), np.char.lower(last))
+    emails = np.char.add(np.char.add(np.char.add(emails, ids.astype(str)), "@"), domains)
+    digits = np.char.add(np.char.add(phone_parts[0], phone_parts[1]), phone_parts[2])
+    phones = np.char.add(np.char.add(np.char.add(np.char.add(phone_parts[0], "-"), phone_parts[1]), "-"), phone_parts[2])
+    df = pd.DataFrame({
+        'id': ids,
+        'name': names.astype(object),
+        'email': emails.astype(object),
+        'phone': phones.astype(object),
+        'country': np.array(countries, dtype=object)[rng.integers(len(countries), size=rows)]
+    })
+    
+    # 1. [at] emails
+    rows_hit = rng.random(rows) < error_rates['at_emails']
+    df.loc[rows_hit, 'email'] = df.loc[rows_hit, 'email'].str.replace("@", "[at]", regex=False)
+    
+    # 2. Misspelled countries
+    rows_hit = np.flatnonzero(rng.random(rows) < error_rates['misspelled_countries'])
+    df.loc[df.index[rows_hit], 'country'] = [misspell(value, rng) for value in df['country'].to_numpy()[rows_hit]]
+    
+    # 3. Malformed phones
+    rows_hit = np.flatnonzero(rng.random(rows) < error_rates['malformed_phones'])
+    df.loc[df.index[rows_hit], 'phone'] = [malformed_phone(value, rng) for value in digits[rows_hit].tolist()]
+    
+    # 4. Blank names
+    rows_hit = rng.random(rows) < error_rates['blank_names']
+    df.loc[rows_hit, 'name'] = None
+    
+    # 5. Exact duplicates of earlier rows in the chunk
+    duplicates = np.flatnonzero(rng.random(rows) < duplicate_ratio)
+    duplicates = duplicates[duplicates > 0]
+    take = np.arange(rows)
+    take[duplicates] = (rng.random(len(duplicates)) * duplicates).astype(np.int64)
+    return df.iloc[take].reset_index(drop=True)
+
+def generate_dirty_data(path, rows, error_rates=None, duplicate_ratio=DEFAULT_DUPLICATE_RATIO, seed=42,
+                        chunk_rows=GENERATE_CHUNK_ROWS):
+    """
+    Write rows of synthetic dirty data to path in chunks, so files of tens
+    of millions of rows can be generated in bounded memory
+    """
+    error_rates = {**DEFAULT_ERROR_RATES, **(error_rates or {})}
+    rng = np.random.default_rng(seed)
+    countries = load_countries()
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    for start in range(0, rows, chunk_rows):
+        chunk = generate_chunk(start + 1, min(chunk_rows, rows - start), error_rates, duplicate_ratio, countries, rng)
+        chunk.to_csv(path, index=False, mode="w" if start == 0 else "a", header=(start == 0))
+    return path
+
+def run_benchmark(input_file, repeat=1, phone_format="national", csv_engine="pandas"):
+    """
+    Run every agent on input_file repeat times and return the timings as a
+    dict. Each stage reports its fastest run and its lowest peak RSS, which
+    damps timing noise and memory the allocator kept from earlier runs.
+    phone_format and csv_engine are the main() options of the same name.
+    """
+    runs = []
+    for run in range(repeat):
+        print(f"🔁 Run {run + 1}/{repeat}")
+        runs.append(run_agents_once(input_file, phone_format, csv_engine))
+        gc.collect()
+    
+    stages = {}
+    for stage in STAGES:
+        timings = [timings[stage] for timings in runs]
+        stages[stage] = dict(min(timings, key=lambda timing: timing['seconds']))
+        stages[stage]['peak_rss_mb'] = min(timing['peak_rss_mb'] for timing in timings)
+    return {
+        'input_file': input_file,
+        'rows': stages["load"]['rows'],
+        'repeat': repeat,
+        'phone_format': phone_format,
+        'csv_engine': csv_engine,
+        'timestamp': datetime.now().isoformat(timespec="seconds"),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'stages': stages,
+        'total_seconds': round(sum(stage['seconds'] for stage in stages.values()), 4)
+    }
+
+def run_agents_once(input_file, phone_format="national", csv_engine="pandas"):
+    """
+    Run every agent once on input_file, loaded and checked the way a
+    whole-file main() run does, and return the timings of each stage
+    """
+    # Imported here so `benchmark.py generate` does not need the agents' dependencies
+    from agents.detection_agent import detect_issues
+    from agents.correction_agent import correct_issues
+    from agents.enrichment_agent import enrich_data
+    from agents.schema import read_input
+    from agents.validation_agent import validate_data
+    from agents.validity_masks import ValidityMasks, validation_patterns
+    
+    log_dir = tempfile.mkdtemp(prefix="benchmark-logs-")
+    stages = {}
+
+    def timed(stage, rows, function, *args, **kwargs):
+        """Run one stage; rows=None counts the rows of its result"""
+        with PeakRssSampler() as sampler:
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            seconds = time.perf_counter() - start
+        if rows is None:
+            rows = len(result)
+        stages[stage] = {
+            'seconds': round(seconds, 4),
+            'rows': rows,
+            'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+            'peak_rss_mb': round(sampler.peak / 2**20, 1)
+        }
+        print(f"  {stage:<11} {seconds:9.3f}s  {stages[stage]['rows_per_sec'] or 0:>12,.0f} rows/s  "
+              f"{stages[stage]['peak_rss_mb']:>8.1f} MB")
+        return result
+    
+    try:
+        df = timed("load", None, read_input, input_file, engine=csv_engine)
+        masks = ValidityMasks(validation_patterns(phone_format))
+        issues = timed("detection", len(df), detect_issues, df, masks=masks, log_dir=log_dir)
+        df = timed("correction", len(df), correct_issues, df, issues, masks=masks, log_dir=log_dir,
+                   phone_format=phone_format)
+        df = timed("enrichment", len(df), enrich_data, df, masks=masks, log_dir=log_dir, phone_format=phone_format)
+        timed("validation", len(df), validate_data, df, masks=masks, log_dir=log_dir)
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+    return stages
+
+def fastest_run(function, repeat, *args, **kwargs):
+    """Run function repeat times; returns its last result, the fastest time and the lowest peak RSS"""
+    seconds = []
+    peaks = []
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        with PeakRssSampler() as sampler:
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            seconds.append(time.perf_counter() - start)
+        peaks.append(sampler.peak)
+    return result, min(seconds), min(peaks)
+
+def engine_timing(seconds, peak, rows, **checks):
+    timing = {
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': round(peak / 2**20, 1)
+    }
+    timing.update(checks)
+    return timing
+
+def compare_engines(input_files, repeat=3):
+    """
+    Time reading each CSV with every READ_VARIANTS entry and writing the
+    loaded frame back with every CSV engine. Each result also records
+    whether it matches the pandas engine: the same frame after reading, the
+    same bytes after writing.
+    """
+    # Imported here so `benchmark.py generate` does not need the agents' dependencies
+    from agents.data_io import CSV_ENGINES, write_csv
+    from agents.schema import read_input
+    
+    files = []
+    output_dir = tempfile.mkdtemp(prefix="benchmark-engines-")
+    try:
+        for input_file in input_files:
+            print(f"📄 {input_file}")
+            reads = {}
+            reference = None
+            for name, (engine, memory_map) in READ_VARIANTS.items():
+                df, seconds, peak = fastest_run(read_input, repeat, input_file, engine=engine, memory_map=memory_map)
+                if reference is None:
+                    reference = df
+                reads[name] = engine_timing(seconds, peak, len(df), same_as_pandas=bool(df.equals(reference)))
+                print(f"  read  {name:<13} {seconds:9.3f}s  {reads[name]['rows_per_sec'] or 0:>12,.0f} rows/s  "
+                      f"{reads[name]['peak_rss_mb']:>8.1f} MB  {'✅' if reads[name]['same_as_pandas'] else '❌'}")
+                del df
+            
+            writes = {}
+            reference_bytes = None
+            for engine in CSV_ENGINES:
+                path = os.path.join(output_dir, f"{engine}.csv")
+                _, seconds, peak = fastest_run(write_csv, repeat, reference, path, engine=engine)
+                with open(path, "rb") as f:
+                    written = f.read()
+                if reference_bytes is None:
+                    reference_bytes = written
+                writes[engine] = engine_timing(seconds, peak, len(reference), same_as_pandas=written == reference_bytes)
+                print(f"  write {engine:<13} {seconds:9.3f}s  {writes[engine]['rows_per_sec'] or 0:>12,.0f} rows/s  "
+                      f"{writes[engine]['peak_rss_mb']:>8.1f} MB  {'✅' if writes[engine]['same_as_pandas'] else '❌'}")
+            files.append({'input_file': input_file, 'rows': len(reference), 'read': reads, 'write': writes})
+            reference = None
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    
+    import pyarrow
+    return {
+        'repeat': repeat,
+        'timestamp': datetime.now().isoformat(timespec="seconds"),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'pyarrow': pyarrow.__version__,
+        'cpus': os.cpu_count(),
+        'files': files
+    }
+
+def compare_to_baseline(results, baseline, threshold=0.10, memory_threshold=0.20):
+    """
+    List the regressions of results against a baseline: stages whose wall time
+    grew by more than threshold or whose peak RSS grew by more than
+    memory_threshold (both relative)
+    """
+    regressions = []
+    for stage, timing in results['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        if not before:
+            continue
+        if before['seconds'] > 0 and timing['seconds'] > before['seconds'] * (1 + threshold):
+            regressions.append(f"{stage}: {before['seconds']:.3f}s -> {timing['seconds']:.3f}s "
+                               f"(+{timing['seconds'] / before['seconds'] - 1:.0%})")
+        if before['peak_rss_mb'] > 0 and timing['peak_rss_mb'] > before['peak_rss_mb'] * (1 + memory_threshold):
+            regressions.append(f"{stage}: peak RSS {before['peak_rss_mb']:.1f} MB -> {timing['peak_rss_mb']:.1f} MB")
+    if baseline.get('rows') != results['rows']:
+        print(f"⚠️  Baseline was measured on {baseline.get('rows')} rows, this run on {results['rows']}")
+    for option in ['phone_format', 'csv_engine']:
+        if baseline.get(option, results[option]) != results[option]:
+            print(f"⚠️  Baseline was measured with {option} {baseline[option]}, this run with {results[option]}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Agent-Based Data Fixing System")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    generate = commands.add_parser("generate", help="Write a synthetic dirty CSV")
+    generate.add_argument("output_file")
+    generate.add_argument("--rows", type=int, default=10000)
+    generate.add_argument("--seed", type=int, default=42)
+    generate.add_argument("--at-email-rate", type=float, default=DEFAULT_ERROR_RATES['at_emails'])
+    generate.add_argument("--misspelled-country-rate", type=float, default=DEFAULT_ERROR_RATES['misspelled_countries'])
+    generate.add_argument("--malformed-phone-rate", type=float, default=DEFAULT_ERROR_RATES['malformed_phones'])
+    generate.add_argument("--blank-name-rate", type=float, default=DEFAULT_ERROR_RATES['blank_names'])
+    generate.add_argument("--duplicate-ratio", type=float, default=DEFAULT_DUPLICATE_RATIO)
+    
+    run = commands.add_parser("run", help="Time every agent on a CSV")
+    run.add_argument("input_file")
+    run.add_argument("--output", default="benchmark_results.json", help="Where to write the results JSON")
+    run.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest one is reported")
+    run.add_argument("--phone-format", choices=PHONE_FORMATS, default="national",
+                     help="Phone format the agents correct to and validate, as in main.py")
+    run.add_argument("--csv-engine", choices=CSV_ENGINES, default="pandas", help="CSV engine of the load stage")
+    run.add_argument("--baseline", default=None, help="Results JSON to compare against")
+    run.add_argument("--threshold", type=float, default=0.10,
+                     help="Allowed relative slowdown per stage before it counts as a regression")
+    run.add_argument("--memory-threshold", type=float, default=0.20,
+                     help="Allowed relative growth of peak RSS per stage")
+    
+    engines = commands.add_parser("engines", help="Compare the pandas and pyarrow CSV engines")
+    engines.add_argument("input_file", nargs="+")
+    engines.add_argument("--output", default="engine_results.json", help="Where to write the results JSON")
+    engines.add_argument("--repeat", type=int, default=3, help="Runs per reader and writer; the fastest one is reported")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.command == "generate":
+        error_rates = {
+            'at_emails': args.at_email_rate,
+            'misspelled_countries': args.misspelled_country_rate,
+            'malformed_phones': args.malformed_phone_rate,
+            'blank_names': args.blank_name_rate
+        }
+        start = time.perf_counter()
+        generate_dirty_data(args.output_file, args.rows, error_rates, args.duplicate_ratio, args.seed)
+        print(f"📊 Wrote {args.rows} rows to {args.output_file} in {time.perf_counter() - start:.1f}s")
+        sys.exit(0)
+
+    if args.command == "engines":
+        print(f"⏱️  Comparing CSV engines on {len(args.input_file)} file(s)")
+        results = compare_engines(args.input_file, args.repeat)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+        mismatches = [f"{entry['input_file']} {step} {name}" for entry in results['files'] for step in ["read", "write"]
+                      for name, timing in entry[step].items() if not timing['same_as_pandas']]
+        if mismatches:
+            print("❌ Engines disagree with pandas:")
+            for mismatch in mismatches:
+                print(f"  - {mismatch}")
+            sys.exit(1)
+        print("✅ Every engine matches pandas")
+        sys.exit(0)
+
+    print(f"⏱️  Benchmarking agents on {args.input_file}")
+    results = run_benchmark(args.input_file, args.repeat, args.phone_format, args.csv_engine)
+    print(f"  {'total':<11} {results['total_seconds']:9.3f}s")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold, args.memory_threshold)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
@@ -1,7 +1,7 @@
 import os
-import pandas as pd
+import argparse
 import json
-from main import main
+from agents.data_io import OUTPUT_FORMATS, find_output, read_table, table_info
 
 def display_banner():
     """Display system banner"""
@@ -64,22 +64,25 @@ def view_validation_report():
     else:
         print("❌ Validation report not found. Run the pipeline first.")
 
-def compare_data():
+def compare_data(input_file="data/input.csv", output_file="data/cleaned.csv", input_table=None, output_table=None):
     """Compare original vs cleaned data"""
     try:
-        original = pd.read_csv("data/input.csv")
-        cleaned = pd.read_csv("data/cleaned.csv")
+        cleaned_file = find_output(os.path.splitext(output_file)[0])
+        if cleaned_file is None:
+            raise FileNotFoundError(output_file)
+        original_rows, _ = table_info(input_file, table=input_table)
+        cleaned_rows, _ = table_info(cleaned_file, table=output_table)
         
         print("\n📊 DATA COMPARISON")
         print("-" * 40)
-        print(f"Original rows: {len(original)}")
-        print(f"Cleaned rows: {len(cleaned)}")
-        print(f"Rows removed: {len(original) - len(cleaned)}")
+        print(f"Original rows: {original_rows}")
+        print(f"Cleaned rows: {cleaned_rows}")
+        print(f"Rows removed: {original_rows - cleaned_rows}")
         
         # Show sample of cleaned data
         print("\n📋 Sample of cleaned data:")
-        print(cleaned.head(5).to_string(index=False))
-        
+        print(read_table(cleaned_file, nrows=5, table=output_table).to_string(index=False))
+    
     except FileNotFoundError:
         print("❌ Data files not found. Run the pipeline first.")
 
@@ -97,8 +100,40 @@ def start_web_interface():
     except KeyboardInterrupt:
         print("\n👋 Web server stopped.")
 
-def cli():
-    """Main CLI interface"""
+def run_pipeline(workers=None, output_format=None, worker_socket=None, input_file="data/input.csv",
+                 output_file="data/cleaned.csv", input_table=None, output_table=None):
+    """
+    Run the cleaning pipeline in this process, or in the resident worker
+    listening on worker_socket (see worker.py), which skips the imports and
+    reference data loading
+    """
+    tables = {'input_table': input_table, 'output_table': output_table}
+    if worker_socket is None:
+        # Imported on first use so the menu appears without loading pandas
+        from main import main
+        main(input_file, output_file, workers=workers, output_format=output_format, **tables)
+        return
+    
+    from worker import submit_job
+    try:
+        response = submit_job(input_file, output_file, socket_path=worker_socket, workers=workers,
+                              output_format=output_format, **tables)
+    except OSError as e:
+        print(f"❌ Could not reach the worker on {worker_socket}: {e}")
+        print("💡 Start one with: python worker.py serve")
+        return
+    print(response.get('output', ''), end='')
+    if response['status'] != 'completed':
+        print(f"❌ Job failed: {response['error']}")
+
+def cli(workers=None, output_format=None, worker_socket=None, input_file="data/input.csv",
+        output_file="data/cleaned.csv", input_table=None, output_table=None):
+    """
+    Main CLI interface. The input and output may be SQLite databases, with
+    input_table the table or SELECT query to clean and output_table the
+    table to write.
+    """
+    tables = {'input_table': input_table, 'output_table': output_table}
     display_banner()
     
     while True:
@@ -110,46 +145,63 @@ def cli():
         print("5. 📁 View Sample Data")
         print("6. 🌐 Start Web Interface")
         print("7. ❌ Exit")
-
+        
         choice = input("\nChoose an option (1-7): ").strip()
         
         if choice == "1":
             print("\n🚀 Starting pipeline...")
-            main()
-            
+            run_pipeline(workers, output_format, worker_socket, input_file, output_file, **tables)
+        
         elif choice == "2":
             view_logs()
-            
+        
         elif choice == "3":
             view_validation_report()
-            
+        
         elif choice == "4":
-            compare_data()
-            
+            compare_data(input_file, output_file, **tables)
+        
         elif choice == "5":
             try:
                 print("\n📁 SAMPLE INPUT DATA:")
                 print("-" * 40)
-                df = pd.read_csv("data/input.csv")
-                print(df.head(10).to_string(index=False))
+                df = read_table(input_file, nrows=10, table=input_table)
+                print(df.to_string(index=False))
                 
-                if os.path.exists("data/cleaned.csv"):
+                cleaned_file = find_output(os.path.splitext(output_file)[0])
+                if cleaned_file:
                     print("\n📁 SAMPLE CLEANED DATA:")
                     print("-" * 40)
-                    cleaned_df = pd.read_csv("data/cleaned.csv")
-                    print(cleaned_df.head(10).to_string(index=False))
+                    cleaned_df = read_table(cleaned_file, nrows=10, table=output_table)
+                    print(cleaned_df.to_string(index=False))
             except FileNotFoundError:
                 print("❌ Data files not found")
-                
+        
         elif choice == "6":
             start_web_interface()
-            
+        
         elif choice == "7":
             print("\n👋 Goodbye! Thanks for using the Agent-Based Data Fixing System!")
             break
-            
+        
         else:
             print("❌ Invalid choice. Please try again.")
 
 if __name__ == "__main__":
-    cli()
+    parser = argparse.ArgumentParser(description="Interactive CLI for the Agent-Based Data Fixing System")
+    parser.add_argument("input_file", nargs="?", default="data/input.csv")
+    parser.add_argument("output_file", nargs="?", default="data/cleaned.csv")
+    parser.add_argument("--input-table", default=None,
+                        help="Table or SELECT query to clean when the input is a SQLite database")
+    parser.add_argument("--output-table", default=None,
+                        help="Table to write when the output is a SQLite database (default: cleaned)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Run the cleaning pipeline in this many worker processes")
+    parser.add_argument("--output-format", choices=list(OUTPUT_FORMATS), default=None,
+                        help="Write the cleaned data as csv, parquet, feather or a SQLite table")
+    parser.add_argument("--worker-socket", default=None,
+                        help="Run the pipeline in the resident worker listening on this socket (see worker.py)")
+    args = parser.parse_args()
+    cli(workers=args.workers, output_format=args.output_format, worker_socket=args.worker_socket,
+        input_file=args.input_file, output_file=args.output_file, input_table=args.input_table,
+        output_table=args.output_table)
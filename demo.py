@@ -10,6 +10,7 @@ import os
 import pandas as pd
 import json
 from datetime import datetime
+from agents.data_io import find_output, read_table, table_info
 
 def print_header(title):
     """Print a formatted header"""
@@ -53,11 +54,17 @@ def demo_system():
     # 3. Show cleaned data
     print_section("CLEANED DATA SAMPLE")
     try:
-        cleaned_df = pd.read_csv("data/cleaned.csv")
-        print(f"📊 Cleaned data: {len(cleaned_df)} rows")
-        print(f"📈 New columns added: {len(cleaned_df.columns) - len(original_df.columns)}")
+        cleaned_file = find_output("data/cleaned")
+        if cleaned_file is None:
+            raise FileNotFoundError("data/cleaned")
+        cleaned_rows, cleaned_columns = table_info(cleaned_file)
+        # Only the columns summarised below are loaded
+        summary_columns = [col for col in ['email_provider', 'country_code', 'data_quality_score'] if col in cleaned_columns]
+        cleaned_df = read_table(cleaned_file, columns=summary_columns)
+        print(f"📊 Cleaned data: {cleaned_rows} rows")
+        print(f"📈 New columns added: {len(cleaned_columns) - len(original_df.columns)}")
         print("\nSample of cleaned data:")
-        print(cleaned_df.head(5).to_string(index=False))
+        print(read_table(cleaned_file, nrows=5).to_string(index=False))
     except FileNotFoundError:
         print("❌ Cleaned data not found")
         return
@@ -109,13 +116,13 @@ def demo_system():
     # 6. Show data comparison
     print_section("DATA COMPARISON")
     print(f"📊 Original rows: {len(original_df)}")
-    print(f"📊 Cleaned rows: {len(cleaned_df)}")
-    print(f"📈 Rows removed: {len(original_df) - len(cleaned_df)}")
-    print(f"✨ New columns: {len(cleaned_df.columns) - len(original_df.columns)}")
+    print(f"📊 Cleaned rows: {cleaned_rows}")
+    print(f"📈 Rows removed: {len(original_df) - cleaned_rows}")
+    print(f"✨ New columns: {len(cleaned_columns) - len(original_df.columns)}")
     
     # 7. Show enriched features
     print_section("ENRICHED FEATURES")
-    new_columns = [col for col in cleaned_df.columns if col not in original_df.columns]
+    new_columns = [col for col in cleaned_columns if col not in original_df.columns]
     print("New columns added:")
     for col in new_columns:
         print(f"  📊 {col}")
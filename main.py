@@ -1,59 +1,168 @@
 import pandas as pd
 import os
+import shutil
+import tempfile
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from agents.detection_agent import detect_issues
 from agents.correction_agent import correct_issues
-from agents.enrichment_agent import enrich_data
-from agents.validation_agent import validate_data
+from agents.dedup_agent import deduplicate_records
+from agents.enrichment_agent import ENRICHMENT_GRAPH, enrich_data
+from agents.validation_agent import validate_data, collect_validation_stats, build_validation_report, add_runtime_metrics
+from agents.row_hashing import drop_seen_rows
+from agents.validity_masks import PHONE_FORMATS, ValidityMasks, validation_patterns
+from agents.schema import read_input, read_output
+from agents.reference_data import get_reference_data
+from agents.data_io import (CSV_ENGINES, DEFAULT_TABLE, OUTPUT_FORMATS, TableWriter, format_for_path, resolve_output,
+                           write_csv, write_table)
+from agents.metrics import PipelineMetrics
+from agents.incremental import RowManifest, fingerprint_rows, merge_rows
+from agents.job_options import add_job_arguments, job_options
+from agents.logger import AgentLogger, log_file_name, open_agent_loggers, rotated_log_files
 
-def main(input_file="data/input.csv", output_file="data/cleaned.csv"):
+# Agents that run on every chunk or partition, each with its own log
+ROW_AGENTS = ["detection", "correction", "enrichment"]
+
+def row_agents(dedup_options=None):
+    """ROW_AGENTS plus the deduplication agent when near-duplicate handling is on"""
+    if dedup_options:
+        return ["detection", "correction", "dedup", "enrichment"]
+    return ROW_AGENTS
+
+def no_progress(stage, chunk=None):
+    """Default progress callback: does nothing"""
+
+def main(input_file="data/input.csv", output_file="data/cleaned.csv", chunksize=None, workers=None,
+         log_dir="logs", progress=None, output_format=None, compression=None, log_options=None,
+         incremental=False, dedup_options=None, usecols=None, enrich_columns=None, sketch_options=None,
+         phone_format="national", input_table=None, output_table=None, csv_engine="pandas", memory_map=False,
+         fix_email_domains=False):
     """
-    Main pipeline that orchestrates all agents in sequence
+    Main pipeline that orchestrates all agents in sequence.
+    
+    When chunksize is given the input is streamed in chunks of that many rows,
+    so peak memory is bounded by the chunk size instead of the file size,
+    apart from a hash of every distinct row (see run_streaming).
+    When workers is greater than 1 the rows are split into partitions that are
+    cleaned in a pool of that many processes.
+    
+    Agent logs and the validation report are written to log_dir. progress, if
+    given, is called as progress(stage, chunk=None) whenever a stage starts.
+    
+    output_format is 'csv', 'parquet' or 'feather' (taken from the output
+    file extension when not given). The columnar formats keep the column
+    dtypes and are compressed with compression (the format default if None).
+    
+    log_options are passed to every AgentLogger, e.g. {'level': 'WARNING',
+    'log_format': 'jsonl', 'detail_limit': 1000}.
+    
+    Wall time, CPU time, rows and peak memory of every stage are added to
+    the validation report under 'runtime_metrics'.
+    
+    With incremental=True only rows that are new or changed since the last
+    incremental run into the same output file with the same options are
+    cleaned; the other rows are reused from that output (chunksize and
+    workers are not used).
+    
+    dedup_options turns on near-duplicate handling after correction, e.g.
+    {'mode': 'merge', 'threshold': 85}; see deduplicate_records. Rows are
+    only compared within the same chunk or partition. It cannot be combined
+    with incremental, whose cleaned rows would not be compared with the
+    reused ones.
+    
+    Input columns are read with the dtypes declared in agents/schema.py;
+    usecols limits reading to those columns. Low-cardinality columns are
+    kept as Categorical after enrichment, and the in-memory size of the
+    frame after each stage is reported with the stage timings.
+    
+    enrich_columns limits enrichment to those output columns and the
+    enrichments they depend on, e.g. ['email_domain', 'country_code'];
+    all enrichments run when it is None.
+    
+    sketch_options reports the value distributions as bounded sketches
+    (top values and an estimated distinct count, with their error bounds)
+    instead of exact counts, e.g. {'capacity': 100, 'precision': 14}.
+    
+    phone_format 'e164' corrects phone numbers to E.164 by the numbering
+    plan of each row's country (data/phone_plans.csv) instead of the
+    default 'national' XXX-XXX-XXXX format.
+    
+    A SQLite database (.db, .sqlite or .sqlite3) can be the input and the
+    output: input_table is the table or SELECT query to read and
+    output_table the table to write (default 'cleaned'), so the data goes
+    from database to database without intermediate files.
+    
+    csv_engine 'pyarrow' parses CSV input with pyarrow's multi-threaded
+    reader and writes CSV output with its writer; the frames and files are
+    the same as with the default 'pandas'. memory_map maps the input file
+    instead of reading it into a buffer.
+    
+    fix_email_domains replaces email domains that are not known
+    (data/email_domains.txt) with a known one a single typo away, e.g.
+    gmial.com -> gmail.com; it is off by default.
     """
     print("🚀 Starting Agent-Based Data Fixing System")
     print("=" * 50)
     
     # Ensure output directories exist
-    os.makedirs("logs", exist_ok=True)
+    os.makedirs(log_dir, exist_ok=True)
     os.makedirs("data", exist_ok=True)
     
-    # Load data
-    try:
-        df = pd.read_csv(input_file)
-        print(f"📊 Loaded {len(df)} rows from {input_file}")
-    except FileNotFoundError:
-        print(f"❌ Error: Could not find {input_file}")
+    if progress is None:
+        progress = no_progress
+    output_file, output_format = resolve_output(output_file, output_format)
+    if enrich_columns is not None:
+        try:
+            ENRICHMENT_GRAPH.plan(enrich_columns)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            return
+    if phone_format not in PHONE_FORMATS:
+        print(f"❌ Error: Unknown phone format '{phone_format}' (expected one of {', '.join(PHONE_FORMATS)})")
         return
-    except Exception as e:
-        print(f"❌ Error loading data: {e}")
+    if incremental and dedup_options:
+        print("❌ Error: --near-duplicates cannot be combined with --incremental, which only cleans changed rows "
+              "and would miss their near duplicates among the reused ones")
         return
+    if csv_engine not in CSV_ENGINES:
+        print(f"❌ Error: Unknown CSV engine '{csv_engine}' (expected one of {', '.join(CSV_ENGINES)})")
+        return
+    if format_for_path(input_file) == 'sqlite' and not input_table:
+        print(f"❌ Error: {input_file} is a SQLite database, name the table or query to read (--input-table)")
+        return
+    if (output_format == 'sqlite' and os.path.abspath(output_file) == os.path.abspath(input_file)
+            and (output_table or DEFAULT_TABLE) == input_table):
+        print(f"❌ Error: The output would replace table '{input_table}' while it is being read")
+        return
+    metrics = PipelineMetrics()
+    output = {'output_format': output_format, 'compression': compression, 'log_options': log_options,
+              'dedup_options': dedup_options, 'usecols': usecols, 'enrich_columns': enrich_columns,
+              'sketch_options': sketch_options, 'phone_format': phone_format, 'input_table': input_table,
+              'output_table': output_table, 'csv_engine': csv_engine, 'memory_map': memory_map,
+              'fix_email_domains': fix_email_domains, 'metrics': metrics}
     
-    # Agent 1: Detection
-    print("\n🔍 Detection Agent: Scanning for issues...")
-    issues = detect_issues(df)
-    
-    # Agent 2: Correction
-    print("🔧 Correction Agent: Fixing detected issues...")
-    df = correct_issues(df, issues)
-    
-    # Agent 3: Enrichment
-    print("✨ Enrichment Agent: Adding new attributes...")
-    df = enrich_data(df)
-    
-    # Agent 4: Validation
-    print("✅ Validation Agent: Final quality check...")
-    validation_results = validate_data(df)
-    
-    # Save cleaned data
-    df.to_csv(output_file, index=False)
-    print(f"\n💾 Cleaned data saved to {output_file}")
+    if incremental:
+        result = run_incremental(input_file, output_file, log_dir, progress, **output)
+    elif workers and workers > 1:
+        result = run_parallel(input_file, output_file, workers, chunksize, log_dir, progress, **output)
+    elif chunksize:
+        result = run_streaming(input_file, output_file, chunksize, log_dir, progress, **output)
+    else:
+        result = run_whole_file(input_file, output_file, log_dir, progress, **output)
+    if result is None:
+        return
+    original_rows, final_rows, validation_results = result
+    validation_results['runtime_metrics'] = metrics.to_dict()
+    add_runtime_metrics(validation_results['runtime_metrics'], log_dir)
     
     # Print summary
     print("\n" + "=" * 50)
     print("📈 CLEANING SUMMARY")
     print("=" * 50)
-    print(f"Original rows: {len(pd.read_csv(input_file))}")
-    print(f"Final rows: {len(df)}")
+    print(f"Original rows: {original_rows}")
+    print(f"Final rows: {final_rows}")
     print(f"Quality score: {validation_results['quality_metrics']['overall_score']:.1f}%")
     print(f"Total issues found: {validation_results['quality_metrics']['total_issues']}")
     
@@ -62,8 +171,443 @@ def main(input_file="data/input.csv", output_file="data/cleaned.csv"):
         for rec in validation_results['recommendations']:
             print(f"  - {rec}")
     
-    print(f"\n📋 Check logs/ directory for detailed agent logs")
+    print("\n⏱️  Stage timings:")
+    for stage, timing in validation_results['runtime_metrics']['stages'].items():
+        frame = f"  frame {timing['frame_mb']:>7.1f} MB" if timing['frame_mb'] else ""
+        print(f"  {stage:<15} {timing['wall_seconds']:8.3f}s  {timing['rows_per_sec'] or 0:>12,.0f} rows/s  "
+              f"peak {timing['peak_rss_mb']:>7.1f} MB{frame}")
+    
+    print(f"\n📋 Check {log_dir}/ directory for detailed agent logs")
     print("✅ Pipeline completed successfully!")
+    return validation_results
+
+def run_whole_file(input_file, output_file, log_dir="logs", progress=no_progress, output_format="csv",
+                   compression=None, log_options=None, dedup_options=None, usecols=None, enrich_columns=None,
+                   sketch_options=None, phone_format="national", input_table=None, output_table=None,
+                   csv_engine="pandas", memory_map=False, fix_email_domains=False, metrics=None):
+    """Load the whole input into memory and run every agent once"""
+    metrics = metrics or PipelineMetrics()
+    
+    # Load data
+    progress("load")
+    try:
+        with metrics.stage("load") as stage:
+            df = read_input(input_file, usecols=usecols, table=input_table, engine=csv_engine,
+                            memory_map=memory_map)
+            stage.rows_in = len(df)
+            stage.measure(df)
+        print(f"📊 Loaded {len(df)} rows from {input_file}")
+    except FileNotFoundError:
+        print(f"❌ Error: Could not find {input_file}")
+        return None
+    except Exception as e:
+        print(f"❌ Error loading data: {e}")
+        return None
+    original_rows = len(df)
+    
+    # Format masks computed by detection and carried through every agent
+    masks = ValidityMasks(validation_patterns(phone_format))
+    loggers = open_agent_loggers(row_agents(dedup_options) + ["validation"], log_dir, **(log_options or {}))
+    
+    try:
+        # Agent 1: Detection
+        progress("detection")
+        print("\n🔍 Detection Agent: Scanning for issues...")
+        with metrics.stage("detection", len(df)):
+            issues = detect_issues(df, masks=masks, log_dir=log_dir, logger=loggers["detection"])
+        
+        # Agent 2: Correction
+        progress("correction")
+        print("🔧 Correction Agent: Fixing detected issues...")
+        with metrics.stage("correction", len(df)) as stage:
+            df = correct_issues(df, issues, masks=masks, log_dir=log_dir, logger=loggers["correction"],
+                                phone_format=phone_format, fix_email_domains=fix_email_domains)
+            stage.rows_out = len(df)
+            stage.measure(df)
+        
+        # Near duplicates left after correction, e.g. the same person under two ids
+        if dedup_options:
+            progress("near_duplicates")
+            print("🧬 Deduplication Agent: Matching near-duplicate records...")
+            with metrics.stage("near_duplicates", len(df)) as stage:
+                df = deduplicate_records(df, masks=masks, log_dir=log_dir, logger=loggers["dedup"], **dedup_options)
+                stage.rows_out = len(df)
+                stage.measure(df)
+        
+        # Agent 3: Enrichment
+        progress("enrichment")
+        print("✨ Enrichment Agent: Adding new attributes...")
+        with metrics.stage("enrichment", len(df)) as stage:
+            df = enrich_data(df, masks=masks, log_dir=log_dir, logger=loggers["enrichment"], columns=enrich_columns,
+                             phone_format=phone_format)
+            stage.measure(df)
+        
+        # Agent 4: Validation
+        progress("validation")
+        print("✅ Validation Agent: Final quality check...")
+        with metrics.stage("validation", len(df)):
+            validation_results = validate_data(df, masks=masks, log_dir=log_dir, logger=loggers["validation"],
+                                               sketch_options=sketch_options)
+    finally:
+        for logger in loggers.values():
+            logger.close()
+    
+    # Save cleaned data
+    progress("save")
+    with metrics.stage("save", len(df)):
+        write_table(df, output_file, output_format, compression, output_table, csv_engine)
+    print(f"\n💾 Cleaned data saved to {output_file}")
+    
+    return original_rows, len(df), validation_results
+
+def run_incremental(input_file, output_file, log_dir="logs", progress=no_progress, output_format="csv",
+                    compression=None, log_options=None, dedup_options=None, usecols=None, enrich_columns=None,
+                    sketch_options=None, phone_format="national", input_table=None, output_table=None,
+                    csv_engine="pandas", memory_map=False, fix_email_domains=False, metrics=None):
+    """
+    Clean only the rows inserted or modified since the previous incremental
+    run and merge them into its output. Rows are matched on a fingerprint of
+    id plus content stored in a manifest next to the output file; without a
+    usable manifest, or when the cleaning options changed, every row is
+    cleaned.
+    """
+    metrics = metrics or PipelineMetrics()
+    
+    progress("load")
+    try:
+        with metrics.stage("load") as stage:
+            df = read_input(input_file, usecols=usecols, table=input_table, engine=csv_engine,
+                            memory_map=memory_map)
+            stage.rows_in = len(df)
+            stage.measure(df)
+        print(f"📊 Loaded {len(df)} rows from {input_file}")
+    except FileNotFoundError:
+        print(f"❌ Error: Could not find {input_file}")
+        return None
+    except Exception as e:
+        print(f"❌ Error loading data: {e}")
+        return None
+    original_rows = len(df)
+    
+    # Exact duplicates are dropped up front, so every remaining row maps to one output row
+    progress("fingerprint")
+    # Rows of the previous output are only reused when they were cleaned the same way
+    manifest = RowManifest(output_file, {'usecols': usecols, 'enrich_columns': enrich_columns,
+                                         'phone_format': phone_format, 'sketch_options': sketch_options,
+                                         'fix_email_domains': fix_email_domains})
+    with metrics.stage("fingerprint", len(df)) as stage:
+        hashes, keys = fingerprint_rows(df)
+        first = ~pd.Series(hashes).duplicated(keep='first').to_numpy()
+        df, hashes, keys = df[first], hashes[first], keys[first]
+        if not manifest.load():
+            print("🆕 No previous incremental run with these options found, cleaning every row")
+        previous_positions, changes = manifest.match(hashes, keys)
+        stage.rows_out = int((previous_positions < 0).sum())
+    print(f"🔁 {changes['unchanged']} unchanged, {changes['inserted']} inserted, "
+          f"{changes['modified']} modified, {changes['deleted']} deleted rows")
+    
+    delta = df[previous_positions < 0]
+    masks = ValidityMasks(validation_patterns(phone_format))
+    loggers = open_agent_loggers(ROW_AGENTS + ["validation"], log_dir, **(log_options or {}))
+    try:
+        if len(delta) > 0:
+            progress("detection")
+            with metrics.stage("detection", len(delta)):
+                issues = detect_issues(delta, masks=masks, log_dir=log_dir, logger=loggers["detection"])
+            progress("correction")
+            with metrics.stage("correction", len(delta)) as stage:
+                delta = correct_issues(delta, issues, masks=masks, log_dir=log_dir, logger=loggers["correction"],
+                                       phone_format=phone_format, fix_email_domains=fix_email_domains)
+                stage.rows_out = len(delta)
+                stage.measure(delta)
+            progress("enrichment")
+            with metrics.stage("enrichment", len(delta)) as stage:
+                delta = enrich_data(delta, masks=masks, log_dir=log_dir, logger=loggers["enrichment"],
+                                    columns=enrich_columns, phone_format=phone_format)
+                stage.measure(delta)
+        
+        progress("merge")
+        with metrics.stage("merge", len(df)) as stage:
+            previous = read_output(output_file, table=output_table) if changes['unchanged'] > 0 else None
+            df = merge_rows(previous, previous_positions, delta)
+            stage.measure(df)
+        
+        # Validation always covers the whole merged output, with fresh masks so every row is checked
+        progress("validation")
+        with metrics.stage("validation", len(df)):
+            validation_results = validate_data(df, masks=ValidityMasks(validation_patterns(phone_format)), log_dir=log_dir,
+                                               logger=loggers["validation"], sketch_options=sketch_options)
+    finally:
+        for logger in loggers.values():
+            logger.close()
+    
+    progress("save")
+    with metrics.stage("save", len(df)):
+        write_table(df, output_file, output_format, compression, output_table, csv_engine)
+        manifest.save(hashes, keys)
+    print(f"\n💾 Cleaned data saved to {output_file}")
+    
+    return original_rows, len(df), validation_results
+
+def run_streaming(input_file, output_file, chunksize, log_dir="logs", progress=no_progress, output_format="csv",
+                  compression=None, log_options=None, dedup_options=None, usecols=None, enrich_columns=None,
+                  sketch_options=None, phone_format="national", input_table=None, output_table=None,
+                  csv_engine="pandas", memory_map=False, fix_email_domains=False, metrics=None):
+    """
+    Stream the input in fixed-size chunks, run detection, correction and
+    enrichment on each chunk and append it to the output file. Validation
+    statistics are merged across chunks, so the final report matches a
+    whole-file run.
+    
+    Memory is bounded by the chunk size except for the hashes of the
+    distinct rows seen so far, which dropping duplicates across chunks and
+    the merged duplicate count need: they grow with the input, by about 80
+    bytes per distinct row.
+    """
+    metrics = metrics or PipelineMetrics()
+    progress("load")
+    try:
+        reader = read_input(input_file, chunksize=chunksize, usecols=usecols, table=input_table, engine=csv_engine,
+                            memory_map=memory_map)
+    except FileNotFoundError:
+        print(f"❌ Error: Could not find {input_file}")
+        return None
+    except Exception as e:
+        print(f"❌ Error loading data: {e}")
+        return None
+    
+    print(f"📊 Streaming {input_file} in chunks of {chunksize} rows")
+    original_rows = 0
+    final_rows = 0
+    seen_rows = set()
+    stats = None
+    writer = TableWriter(output_file, output_format, compression, output_table, csv_engine)
+    # One logger per agent for the whole run, so detail limits apply across chunks
+    loggers = open_agent_loggers(row_agents(dedup_options), log_dir, **(log_options or {}))
+    
+    try:
+        for chunk_number, df in enumerate(metrics.timed_iter("load", reader)):
+            original_rows += len(df)
+            
+            # Duplicates of rows from earlier chunks are dropped up front,
+            # the correction agent only sees duplicates inside its own chunk
+            with metrics.stage("dedup", len(df)) as stage:
+                df = drop_seen_rows(df, seen_rows)
+                stage.rows_out = len(df)
+                stage.measure(df)
+            
+            print(f"\n📦 Chunk {chunk_number + 1}: {len(df)} rows")
+            masks = ValidityMasks(validation_patterns(phone_format))
+            progress("detection", chunk=chunk_number + 1)
+            with metrics.stage("detection", len(df)):
+                issues = detect_issues(df, masks=masks, logger=loggers["detection"])
+            progress("correction", chunk=chunk_number + 1)
+            with metrics.stage("correction", len(df)) as stage:
+                df = correct_issues(df, issues, masks=masks, logger=loggers["correction"], phone_format=phone_format,
+                                    fix_email_domains=fix_email_domains)
+                stage.rows_out = len(df)
+                stage.measure(df)
+            if dedup_options:
+                progress("near_duplicates", chunk=chunk_number + 1)
+                with metrics.stage("near_duplicates", len(df)) as stage:
+                    df = deduplicate_records(df, masks=masks, logger=loggers["dedup"], **dedup_options)
+                    stage.rows_out = len(df)
+                    stage.measure(df)
+            progress("enrichment", chunk=chunk_number + 1)
+            with metrics.stage("enrichment", len(df)) as stage:
+                df = enrich_data(df, masks=masks, logger=loggers["enrichment"], columns=enrich_columns,
+                                 phone_format=phone_format)
+                stage.measure(df)
+            
+            with metrics.stage("validation", len(df)):
+                chunk_stats = collect_validation_stats(df, masks, sketch_options)
+                stats = chunk_stats if stats is None else stats.merge(chunk_stats)
+            
+            progress("save", chunk=chunk_number + 1)
+            with metrics.stage("save", len(df)):
+                writer.write(df)
+            final_rows += len(df)
+    finally:
+        writer.close()
+        for logger in loggers.values():
+            logger.close()
+    
+    if stats is None:
+        print(f"❌ Error: {input_file} contains no rows")
+        return None
+    
+    progress("validation")
+    print("\n✅ Validation Agent: Final quality check...")
+    with metrics.stage("validation", 0), AgentLogger("validation", log_dir, **(log_options or {})) as logger:
+        validation_results = build_validation_report(stats, log_dir=log_dir, logger=logger)
+    print(f"\n💾 Cleaned data saved to {output_file}")
+    
+    return original_rows, final_rows, validation_results
+
+def process_partition(df, partition_number, work_dir, write_header, output_format="csv", compression=None,
+                      log_options=None, dedup_options=None, enrich_columns=None, sketch_options=None,
+                      phone_format="national", csv_engine="pandas", fix_email_domains=False):
+    """
+    Worker for run_parallel: runs detection, correction and enrichment on one
+    row partition, writes the cleaned rows and agent logs into work_dir and
+    returns the partition's validation statistics and stage metrics
+    """
+    metrics = PipelineMetrics()
+    log_dir = os.path.join(work_dir, f"logs-{partition_number}")
+    os.makedirs(log_dir, exist_ok=True)
+    
+    masks = ValidityMasks(validation_patterns(phone_format))
+    loggers = open_agent_loggers(row_agents(dedup_options), log_dir, **(log_options or {}))
+    try:
+        with metrics.stage("detection", len(df)):
+            issues = detect_issues(df, masks=masks, logger=loggers["detection"])
+        with metrics.stage("correction", len(df)) as stage:
+            df = correct_issues(df, issues, masks=masks, logger=loggers["correction"], phone_format=phone_format,
+                                fix_email_domains=fix_email_domains)
+            stage.rows_out = len(df)
+            stage.measure(df)
+        if dedup_options:
+            with metrics.stage("near_duplicates", len(df)) as stage:
+                df = deduplicate_records(df, masks=masks, logger=loggers["dedup"], **dedup_options)
+                stage.rows_out = len(df)
+                stage.measure(df)
+        with metrics.stage("enrichment", len(df)) as stage:
+            df = enrich_data(df, masks=masks, logger=loggers["enrichment"], columns=enrich_columns,
+                             phone_format=phone_format)
+            stage.measure(df)
+    finally:
+        for logger in loggers.values():
+            logger.close()
+    
+    part_file = os.path.join(work_dir, f"part-{partition_number}{OUTPUT_FORMATS[output_format]}")
+    with metrics.stage("save", len(df)):
+        if output_format == "csv":
+            write_csv(df, part_file, header=write_header, engine=csv_engine)
+        else:
+            write_table(df, part_file, output_format, compression)
+    with metrics.stage("validation", len(df)):
+        stats = collect_validation_stats(df, masks, sketch_options)
+    return stats, metrics
+
+def run_parallel(input_file, output_file, workers, chunksize=None, log_dir="logs", progress=no_progress,
+                 output_format="csv", compression=None, log_options=None, dedup_options=None, usecols=None, enrich_columns=None,
+                 sketch_options=None, phone_format="national", input_table=None, output_table=None,
+                 csv_engine="pandas", memory_map=False, fix_email_domains=False, metrics=None):
+    """
+    Split the input into row partitions and clean them in a process pool.
+    
+    Exact duplicates are removed by row hash before the fan-out, so duplicates
+    spanning partitions are still caught. Partition outputs, logs and
+    validation statistics are combined in input order, so the cleaned file
+    and validation report match a single-process run. Stage metrics of the
+    workers are summed, so their wall time is the total across processes.
+    """
+    metrics = metrics or PipelineMetrics()
+    progress("load")
+    try:
+        if chunksize:
+            partitions = metrics.timed_iter("load", read_input(input_file, chunksize=chunksize, usecols=usecols,
+                                                               table=input_table, engine=csv_engine,
+                                                               memory_map=memory_map))
+            print(f"📊 Streaming {input_file} in partitions of {chunksize} rows across {workers} workers")
+        else:
+            with metrics.stage("load") as stage:
+                df = read_input(input_file, usecols=usecols, table=input_table, engine=csv_engine,
+                            memory_map=memory_map)
+                stage.rows_in = len(df)
+                stage.measure(df)
+            print(f"📊 Loaded {len(df)} rows from {input_file}")
+            partition_size = max(1, -(-len(df) // workers))
+            partitions = [df.iloc[start:start + partition_size] for start in range(0, len(df), partition_size)]
+            print(f"⚙️  Split into {len(partitions)} partitions across {workers} workers")
+    except FileNotFoundError:
+        print(f"❌ Error: Could not find {input_file}")
+        return None
+    except Exception as e:
+        print(f"❌ Error loading data: {e}")
+        return None
+    
+    original_rows = 0
+    seen_rows = set()
+    stats = None
+    partition_count = 0
+    work_dir = tempfile.mkdtemp(prefix="partitions-", dir=os.path.dirname(os.path.abspath(output_file)))
+    # Parsed before the pool starts, so forked workers inherit the reference data instead of re-reading it
+    get_reference_data().load_all()
+    
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for df in partitions:
+                original_rows += len(df)
+                with metrics.stage("dedup", len(df)) as stage:
+                    df = drop_seen_rows(df, seen_rows)
+                    stage.rows_out = len(df)
+                    stage.measure(df)
+                if len(df) == 0:
+                    continue
+                
+                print(f"📦 Partition {partition_count + 1}: {len(df)} rows")
+                progress("partitions", chunk=partition_count + 1)
+                pending.append(pool.submit(process_partition, df, partition_count, work_dir, partition_count == 0,
+                                           output_format, compression, log_options, dedup_options, enrich_columns,
+                                           sketch_options, phone_format, csv_engine, fix_email_domains))
+                partition_count += 1
+                
+                # Keep a bounded number of partitions in flight, merging in input order
+                while len(pending) >= 2 * workers:
+                    partition_stats, partition_metrics = pending.popleft().result()
+                    stats = partition_stats if stats is None else stats.merge(partition_stats)
+                    metrics.merge(partition_metrics)
+            
+            while pending:
+                partition_stats, partition_metrics = pending.popleft().result()
+                stats = partition_stats if stats is None else stats.merge(partition_stats)
+                metrics.merge(partition_metrics)
+        
+        if stats is None:
+            print(f"❌ Error: {input_file} contains no rows")
+            return None
+        
+        # Concatenate partition outputs and logs in input order
+        progress("save")
+        part_files = [os.path.join(work_dir, f"part-{partition_number}{OUTPUT_FORMATS[output_format]}")
+                      for partition_number in range(partition_count)]
+        with metrics.stage("save", stats.total_rows):
+            if output_format == "csv":
+                with open(output_file, "wb") as out:
+                    for part_file in part_files:
+                        with open(part_file, "rb") as part:
+                            shutil.copyfileobj(part, out)
+            else:
+                with TableWriter(output_file, output_format, compression, output_table) as writer:
+                    for part_file in part_files:
+                        writer.write(read_output(part_file))
+        
+        log_format = (log_options or {}).get("log_format", "text")
+        for agent in row_agents(dedup_options):
+            log_file = log_file_name(agent, log_format)
+            with open(os.path.join(log_dir, log_file), "w") as out:
+                for partition_number in range(partition_count):
+                    # Rotated parts first, so each partition's lines stay in order
+                    for part_file in rotated_log_files(os.path.join(work_dir, f"logs-{partition_number}", log_file)):
+                        with open(part_file) as part:
+                            shutil.copyfileobj(part, out)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    progress("validation")
+    print("\n✅ Validation Agent: Final quality check...")
+    with metrics.stage("validation", 0), AgentLogger("validation", log_dir, **(log_options or {})) as logger:
+        validation_results = build_validation_report(stats, log_dir=log_dir, logger=logger)
+    print(f"\n💾 Cleaned data saved to {output_file}")
+    
+    return original_rows, stats.total_rows, validation_results
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Agent-Based Data Fixing System")
+    parser.add_argument("input_file", nargs="?", default="data/input.csv")
+    parser.add_argument("output_file", nargs="?", default="data/cleaned.csv")
+    add_job_arguments(parser)
+    args = parser.parse_args()
+    main(args.input_file, args.output_file, **job_options(args))
@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from agents.correction_agent import (correct_email_domains, correct_issues, fix_email, fix_email_column, fix_name,
+                                     fix_name_column, fix_phone_column, fix_phone_number, load_email_domain_index)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(autouse=True)
+def repo_dir(monkeypatch):
+    # Reference data is read from data/ relative to the working directory
+    monkeypatch.chdir(REPO_DIR)
+
+def test_unknown_valid_email_domains_are_kept():
+    emails = pd.Series(['j@acme.com', 'i@mail.co', 'k@email.co', 'g@gmial.com', 'h@gmail.com', None])
+    original, fixed = correct_email_domains(emails, load_email_domain_index())
+    
+    assert fixed.to_dict() == {3: 'g@gmail.com'}
+    assert original.to_dict() == {3: 'g@gmial.com'}
+
+def test_email_domains_are_only_fixed_when_asked(tmp_path):
+    df = pd.DataFrame({
+        'id': [1, 2, 3, 4],
+        'name': ['Ann Lee', 'Bo Chan', 'Cy Park', 'Di Ross'],
+        'email': ['j@acme.com', 'i@mail.co', 'k@email.co', 'g@gmial.com'],
+        'phone': ['123-456-7890'] * 4,
+        'country': ['USA'] * 4
+    })
+    
+    kept = correct_issues(df.copy(), {}, log_dir=str(tmp_path))
+    fixed = correct_issues(df.copy(), {}, log_dir=str(tmp_path), fix_email_domains=True)
+    
+    assert kept['email'].tolist() == df['email'].tolist()
+    assert fixed['email'].tolist() == ['j@acme.com', 'i@mail.co', 'k@email.co', 'g@gmail.com']
+
+EMAILS = ['alice@email.com', 'alice[at]email.com', 'alice [at] email.com', ' alice@email.com ', 'alice@email',
+          'alice.email.com', 'alice@b@c.com', 'alice@@email.com', 'A.B@Mail.Co.Uk', 'alice\t@email.com', '[at]', '',
+          np.nan]
+PHONES = ['123-456-7890', '(123) 456 7890', '1-123-456-7890', '11234567890', '21234567890', '12345', '123456789',
+          '123456789012', '+1 (123) 456-7890 ext', '١٢٣٤٥٦٧٨٩٠', '000-000-0000', '', np.nan]
+NAMES = ['alice smith', '  BOB   jones ', "o'brien", 'mary-jane WATSON', 'dr. who', 'J', 'x1', 'josé álvarez',
+         'ǆemal', 'a b c d e', 'Unknown', ' ', '', np.nan]
+
+@pytest.mark.parametrize("dtype", [object, "str"])
+@pytest.mark.parametrize("values, fix_column, fix_value", [
+    (EMAILS, fix_email_column, fix_email),
+    (PHONES, fix_phone_column, fix_phone_number),
+    (NAMES, fix_name_column, fix_name)
+])
+def test_vectorized_fixes_match_scalar_reference(values, fix_column, fix_value, dtype):
+    column = pd.Series(values, index=range(10, 10 + len(values)), dtype=dtype)
+    
+    fixed = fix_column(column)
+    
+    assert fixed.index.equals(column.index)
+    assert fixed.tolist() == [fix_value(value) for value in column]
@@ -0,0 +1,47 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+from agents.enrichment_agent import QUALITY_SCORE_WEIGHTS, calculate_quality_score, calculate_quality_scores
+
+VALID_ROW = {'name': 'Ann Lee', 'email': 'ann.lee@email.com', 'phone': '123-456-7890', 'country': 'USA'}
+
+# Valid, missing (NaN and empty), placeholder and invalid values of every scored column
+VALUES = {
+    'name': ['Ann Lee', 'Unknown', '', np.nan],
+    'email': ['ann.lee@email.com', 'unknown@domain.com', 'invalid@domain.com', '', np.nan, 'ann[at]email.com',
+              'ann lee@email.com', 'ann@email.c', 'ann@email.com\n'],
+    'phone': ['123-456-7890', '000-000-0000', '', np.nan, '1234567890', '123-456-78901', '(123) 456-7890',
+              '１２３-４５６-７８９０'],
+    'country': ['USA', 'Unknown', '', np.nan]
+}
+
+# A row that only incurs each penalty
+PENALTY_ROWS = {
+    'missing_name': {'name': np.nan},
+    'missing_email': {'email': np.nan},
+    'missing_phone': {'phone': np.nan},
+    'missing_country': {'country': ''},
+    'invalid_email': {'email': 'ann[at]email.com'},
+    'invalid_phone': {'phone': '12345'}
+}
+
+@pytest.mark.parametrize("dtype", [object, "str"])
+def test_quality_scores_match_row_wise_reference(dtype):
+    df = pd.DataFrame(list(itertools.product(*VALUES.values())), columns=list(VALUES), dtype=dtype)
+    expected = df.apply(calculate_quality_score, axis=1)
+    
+    scores = calculate_quality_scores(df)
+    
+    assert scores.index.equals(df.index)
+    assert scores.tolist() == expected.tolist()
+    # Rows with every value missing or empty are clamped at 0
+    assert scores.min() == 0
+
+@pytest.mark.parametrize("penalty", list(QUALITY_SCORE_WEIGHTS))
+def test_quality_score_weights(penalty):
+    df = pd.DataFrame([VALID_ROW, {**VALID_ROW, **PENALTY_ROWS[penalty]}])
+    
+    assert calculate_quality_scores(df).tolist() == [100, 100 - QUALITY_SCORE_WEIGHTS[penalty]]
+    assert df.apply(calculate_quality_score, axis=1).tolist() == [100, 100 - QUALITY_SCORE_WEIGHTS[penalty]]
+    assert calculate_quality_scores(df, weights={penalty: 7}).tolist() == [100, 93]
@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from main import main
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INPUT_FILE = os.path.join(REPO_DIR, "data", "input.csv")
+
+@pytest.fixture(autouse=True)
+def repo_dir(monkeypatch):
+    # Reference data is read from data/ relative to the working directory
+    monkeypatch.chdir(REPO_DIR)
+
+def run_incremental(input_file, output_file, log_dir, **options):
+    return main(str(input_file), str(output_file), log_dir=str(log_dir), incremental=True, **options)
+
+def write_input(df, path):
+    df.to_csv(path, index=False)
+    return path
+
+def read_input_text():
+    return pd.read_csv(INPUT_FILE, dtype=str, keep_default_na=False)
+
+def test_incremental_run_twice(tmp_path):
+    output_file = tmp_path / "cleaned.csv"
+    first = run_incremental(INPUT_FILE, output_file, tmp_path / "logs")
+    first_output = output_file.read_bytes()
+    second = run_incremental(INPUT_FILE, output_file, tmp_path / "logs")
+    
+    assert first is not None and second is not None
+    assert output_file.read_bytes() == first_output
+    # Manifest entry i is the fingerprint behind output row i
+    hashes = np.load(f"{output_file}.manifest/hashes.npy")
+    assert len(hashes) == len(pd.read_csv(output_file))
+
+@pytest.mark.parametrize("mode", ["flag", "merge"])
+def test_incremental_near_duplicates_are_rejected(tmp_path, mode):
+    output_file = tmp_path / "cleaned.csv"
+    for _ in range(2):
+        assert run_incremental(INPUT_FILE, output_file, tmp_path / "logs",
+                               dedup_options={'mode': mode, 'threshold': 85}) is None
+    assert not output_file.exists()
+    assert not os.path.exists(f"{output_file}.manifest")
+
+def test_incremental_modified_and_deleted_rows_match_full_run(tmp_path, capsys):
+    df = read_input_text()
+    input_file = write_input(df, tmp_path / "input.csv")
+    output_file = tmp_path / "cleaned.csv"
+    run_incremental(input_file, output_file, tmp_path / "logs")
+    
+    df.loc[2, 'name'] = '  zed   QUINN '
+    write_input(df.drop(index=[5, 6]), input_file)
+    capsys.readouterr()
+    run_incremental(input_file, output_file, tmp_path / "logs")
+    assert "1 modified, 2 deleted rows" in capsys.readouterr().out
+    
+    main(str(input_file), str(tmp_path / "full.csv"), log_dir=str(tmp_path / "logs"))
+    assert output_file.read_bytes() == (tmp_path / "full.csv").read_bytes()
+
+def test_incremental_options_change_cleans_every_row(tmp_path, capsys):
+    input_file = write_input(read_input_text(), tmp_path / "input.csv")
+    output_file = tmp_path / "cleaned.csv"
+    run_incremental(input_file, output_file, tmp_path / "logs")
+    
+    capsys.readouterr()
+    run_incremental(input_file, output_file, tmp_path / "logs", phone_format="e164")
+    assert "0 unchanged" in capsys.readouterr().out
+    
+    main(str(input_file), str(tmp_path / "full.csv"), log_dir=str(tmp_path / "logs"), phone_format="e164")
+    assert output_file.read_bytes() == (tmp_path / "full.csv").read_bytes()
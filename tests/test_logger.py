@@ -0,0 +1,50 @@
+import os
+import re
+import pytest
+from agents.logger import AgentLogger, rotated_log_files
+from main import main
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INPUT_FILE = os.path.join(REPO_DIR, "data", "input.csv")
+
+@pytest.fixture(autouse=True)
+def repo_dir(monkeypatch):
+    # Reference data is read from data/ relative to the working directory
+    monkeypatch.chdir(REPO_DIR)
+
+def log_messages(path):
+    # Without the timestamps, which differ between runs
+    with open(path) as f:
+        return [re.sub(r"^\[[^]]*\] ", "", line) for line in f]
+
+def test_summary_of_warning_events_is_kept_at_warning_level(tmp_path):
+    with AgentLogger("correction", str(tmp_path), level="WARNING", detail_limit=2) as logger:
+        shown = logger.detail_budget("unmatched countries", 5, level="WARNING")
+        for row in range(shown):
+            logger.warning(f"Could not match row {row}", event="unmatched countries")
+        logger.detail_budget("fixed phones", 5)
+    
+    assert log_messages(tmp_path / "correction_log.txt") == [
+        "[WARNING] Could not match row 0\n",
+        "[WARNING] Could not match row 1\n",
+        "[WARNING] unmatched countries: 5 in total, first 2 logged\n"
+    ]
+
+def test_rotated_log_files_are_listed_oldest_first(tmp_path):
+    with AgentLogger("detection", str(tmp_path), buffer_lines=1, max_bytes=40, backup_count=5) as logger:
+        for line in range(4):
+            logger.info(f"line {line}")
+    
+    path = str(tmp_path / "detection_log.txt")
+    files = rotated_log_files(path)
+    assert files == [f"{path}.{number}" for number in range(len(files) - 1, 0, -1)] + [path]
+    assert len(files) > 2
+    assert [message for file in files for message in log_messages(file)] == [f"[INFO] line {line}\n" for line in range(4)]
+
+def test_parallel_run_merges_rotated_partition_logs(tmp_path):
+    main(INPUT_FILE, str(tmp_path / "plain.csv"), workers=2, log_dir=str(tmp_path / "plain"))
+    main(INPUT_FILE, str(tmp_path / "rotated.csv"), workers=2, log_dir=str(tmp_path / "rotated"),
+         log_options={'buffer_lines': 1, 'max_bytes': 200, 'backup_count': 100})
+    
+    for log_file in ["detection_log.txt", "correction_log.txt", "enrichment_log.txt"]:
+        assert log_messages(tmp_path / "rotated" / log_file) == log_messages(tmp_path / "plain" / log_file)
@@ -0,0 +1,26 @@
+import os
+import pandas as pd
+from agents.results_index import ResultsIndex
+
+def cached_filters(index):
+    return sorted(name for name in os.listdir(index.index_dir) if name.startswith("filter-"))
+
+def filter_file(index, filter):
+    return f"filter-{index._key(filter)}.npy"
+
+def test_filter_masks_are_evicted_least_recently_used_first(tmp_path):
+    path = tmp_path / "cleaned.csv"
+    pd.DataFrame({'name': ['Ann Lee', 'Bo Chan', 'Cy Park'], 'country': ['USA', 'India', 'USA']}).to_csv(path, index=False)
+    index = ResultsIndex(str(path), max_filters=2).build()
+    
+    index.page(filter="country:usa")
+    index.page(filter="name:bo")
+    index.page(filter="country:usa")
+    rows, matched_rows = index.page(filter="name:park")
+    
+    assert cached_filters(index) == sorted([filter_file(index, "country:usa"), filter_file(index, "name:park")])
+    assert rows['name'].tolist() == ['Cy Park'] and matched_rows == 1
+    # An evicted filter is computed again
+    rows, matched_rows = index.page(filter="name:bo")
+    assert rows['name'].tolist() == ['Bo Chan'] and matched_rows == 1
+    assert len(cached_filters(index)) == 2
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Resident worker for the cleaning pipeline.
+
+Starting Python and importing pandas, fuzzywuzzy and the agents takes
+several times longer than cleaning a small file. The worker pays for that
+once, loads the reference data (valid countries, aliases, email domains and
+the country cache) and then runs main() for every job sent to its local
+socket:
+
+    python worker.py serve
+    python worker.py run data/input.csv data/cleaned.csv
+    python worker.py stop
+
+The client side only uses the standard library, so submitting a job does
+not import pandas.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from agents.job_options import add_job_arguments, job_options
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "datafix-worker.sock")
+
+# Arguments of main() a job may set
+JOB_OPTIONS = ['input_file', 'output_file', 'chunksize', 'workers', 'log_dir', 'output_format', 'compression',
+               'log_options', 'incremental', 'dedup_options', 'usecols', 'enrich_columns', 'sketch_options',
+               'phone_format', 'input_table', 'output_table', 'csv_engine', 'memory_map', 'fix_email_domains']
+
+def warm_up():
+    """Import the pipeline and load its reference data; returns main()"""
+    from main import main
+    from agents.correction_agent import load_country_cache, load_email_domain_index
+    from agents.reference_data import get_reference_data
+    
+    get_reference_data().load_all()
+    for load in [load_country_cache, load_email_domain_index]:
+        try:
+            load()
+        except FileNotFoundError:
+            # The agents log the missing file when a job runs
+            pass
+    return main
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """One JSON request line in, one JSON response line out"""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.dispatch(request)
+        except Exception as e:
+            response = {'status': 'failed', 'error': str(e)}
+        self.wfile.write((json.dumps(response, default=str) + "\n").encode("utf-8"))
+
+class PipelineWorker(socketserver.UnixStreamServer):
+    """
+    Keeps the pipeline warm and runs the jobs of its clients one at a time,
+    in the order they connect
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH):
+        if os.path.exists(socket_path):
+            if ping(socket_path) is not None:
+                raise RuntimeError(f"A worker is already listening on {socket_path}")
+            # Left behind by a worker that did not shut down cleanly
+            os.unlink(socket_path)
+        
+        start = time.perf_counter()
+        self.run_pipeline = warm_up()
+        self.warm_up_seconds = time.perf_counter() - start
+        self.started_at = time.time()
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        super().__init__(socket_path, JobHandler)
+
+    def dispatch(self, request):
+        command = request.get('command')
+        if command == 'ping':
+            return {
+                'status': 'ok',
+                'pid': os.getpid(),
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'jobs_completed': self.jobs_completed,
+                'jobs_failed': self.jobs_failed
+            }
+        if command == 'stop':
+            # shutdown() waits for serve_forever() to return, so it cannot run on this thread
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {'status': 'stopping'}
+        if command == 'run':
+            return self.run_job(request.get('options', {}))
+        return {'status': 'failed', 'error': f"Unknown command '{command}'"}
+
+    def run_job(self, options):
+        unknown = [option for option in options if option not in JOB_OPTIONS]
+        if unknown:
+            return {'status': 'failed', 'error': f"Unknown job options: {', '.join(unknown)}"}
+        
+        output = io.StringIO()
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                validation_results = self.run_pipeline(**options)
+            if validation_results is None:
+                raise ValueError('Could not read the input file')
+        except Exception as e:
+            self.jobs_failed += 1
+            return {'status': 'failed', 'error': str(e), 'output': output.getvalue()}
+        
+        self.jobs_completed += 1
+        return {
+            'status': 'completed',
+            'seconds': round(time.perf_counter() - start, 4),
+            'output': output.getvalue(),
+            'validation_results': validation_results
+        }
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+def send_request(request, socket_path=DEFAULT_SOCKET_PATH, timeout=None):
+    """Send one request to the worker and return its response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        with client.makefile("rwb") as stream:
+            stream.write((json.dumps(request) + "\n").encode("utf-8"))
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise ConnectionError(f"The worker on {socket_path} closed the connection")
+    return json.loads(line)
+
+def submit_job(input_file="data/input.csv", output_file="data/cleaned.csv", socket_path=DEFAULT_SOCKET_PATH,
+               log_dir="logs", **options):
+    """
+    Run main() in the worker with these arguments. Paths are made absolute
+    since the worker has its own working directory.
+    """
+    options.update({
+        'input_file': os.path.abspath(input_file),
+        'output_file': os.path.abspath(output_file),
+        'log_dir': os.path.abspath(log_dir)
+    })
+    return send_request({'command': 'run', 'options': options}, socket_path)
+
+def ping(socket_path=DEFAULT_SOCKET_PATH):
+    """The worker's status, or None if no worker is listening"""
+    try:
+        return send_request({'command': 'ping'}, socket_path, timeout=1.0)
+    except (OSError, ValueError):
+        return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Resident worker for the Agent-Based Data Fixing System")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix socket the worker listens on")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    commands.add_parser("serve", help="Warm up and run jobs until stopped")
+    
+    run = commands.add_parser("run", help="Clean a file in the running worker")
+    run.add_argument("input_file", nargs="?", default="data/input.csv")
+    run.add_argument("output_file", nargs="?", default="data/cleaned.csv")
+    add_job_arguments(run)
+    run.add_argument("--log-dir", default="logs")
+    
+    commands.add_parser("ping", help="Show whether a worker is running")
+    commands.add_parser("stop", help="Stop the running worker")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.command == "serve":
+        print("🔥 Warming up the pipeline...")
+        try:
+            server = PipelineWorker(args.socket)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ Worker ready on {args.socket} (warm-up {server.warm_up_seconds:.2f}s)")
+        print("⏹️  Stop with: python worker.py stop")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        print(f"👋 Worker stopped after {server.jobs_completed} jobs")
+        sys.exit(0)
+
+    if args.command == "ping":
+        status = ping(args.socket)
+        if status is None:
+            print(f"❌ No worker on {args.socket}")
+            sys.exit(1)
+        print(f"✅ Worker {status['pid']} up for {status['uptime_seconds']}s, "
+              f"{status['jobs_completed']} jobs completed, {status['jobs_failed']} failed")
+        sys.exit(0)
+
+    try:
+        if args.command == "stop":
+            send_request({'command': 'stop'}, args.socket)
+            print("👋 Worker stopping")
+            sys.exit(0)
+        response = submit_job(args.input_file, args.output_file, args.socket, log_dir=args.log_dir, **job_options(args))
+    except OSError as e:
+        print(f"❌ Could not reach the worker on {args.socket}: {e}")
+        print("💡 Start one with: python worker.py serve")
+        sys.exit(1)
+
+    print(response.get('output', ''), end='')
+    if response['status'] != 'completed':
+        print(f"❌ Job failed: {response['error']}")
+        sys.exit(1)